@@ -0,0 +1,163 @@
+import hashlib
+import json
+
+from flask import Response, request
+
+from cache import LRUCache
+from data_engine import COMPETENCIES_TABLE
+from projection import PROJECTION_SCENARIOS, projection_table, scenario_from_grades
+from risk import risk_table
+from scoring import competency_scores
+
+# Готовые тела ответов по ключу (набор данных, версия данных, путь, параметры)
+response_cache = LRUCache('api-responses', maxsize=1024)
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def _json_default(value):
+    # numpy-скаляры (int64, float64) из pandas
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def _request_key():
+    args = tuple(sorted((name, tuple(request.args.getlist(name))) for name in request.args))
+    return request.path, args
+
+def make_etag(version, key):
+    return hashlib.sha1(f'{version}:{key!r}'.encode('utf-8')).hexdigest()
+
+def cached_json(engine, compute):
+    """Отдает JSON с ETag от версии данных; при совпадении If-None-Match - 304 без расчета"""
+    key = (engine.dataset, engine.version, _request_key())
+    etag = make_etag(*key[1:])
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        try:
+            body = response_cache.get_or_compute(
+                key, lambda: json.dumps(compute(), ensure_ascii=False, default=_json_default))
+        except ApiError as error:
+            return Response(json.dumps({'error': error.message}, ensure_ascii=False),
+                            status=error.status, mimetype='application/json')
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Клиент кэширует ответ, но каждый раз сверяет ETag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _semesters(engine, group):
+    return (request.args.getlist('semester', type=int) or
+            engine.distinct(COMPETENCIES_TABLE, 'Семестр', {'Название': [group]}))
+
+def _types(engine):
+    return request.args.getlist('type') or engine.distinct(COMPETENCIES_TABLE, 'Тип_Компетенции')
+
+def student_scores(engine, student, group, semesters, types):
+    rows = engine.student_rows(student, group, semesters, types)
+    return [{
+        'code': score['last_word'],
+        'competency': score['Компетенция'],
+        'type': score['Тип_Компетенции'],
+        'score': score['Балл'],
+        'min_score': score['Минимальный балл'],
+    } for score in competency_scores(rows, with_min=True)]
+
+def register_api_routes(server, engine):
+    """Регистрирует JSON API только для чтения (/api/v1/...) на Flask-сервере приложения"""
+
+    @server.route('/api/v1/groups', endpoint='api_groups')
+    def api_groups():
+        def compute():
+            return {'groups': [{
+                'group': group,
+                'semesters': engine.distinct(COMPETENCIES_TABLE, 'Семестр', {'Название': [group]}),
+            } for group in engine.distinct(COMPETENCIES_TABLE, 'Название')]}
+        return cached_json(engine, compute)
+
+    @server.route('/api/v1/students/<int:student>/scores', endpoint='api_student_scores')
+    def api_student_scores(student):
+        def compute():
+            student_groups = engine.distinct(COMPETENCIES_TABLE, 'Название', {'Код_Студента': [student]})
+            if not student_groups:
+                raise ApiError(404, f'Студент {student} не найден')
+            group = request.args.get('group')
+            if group is None:
+                if len(student_groups) > 1:
+                    raise ApiError(400, f"Студент {student} есть в нескольких группах, "
+                                        f"укажите group: {', '.join(student_groups)}")
+                group = student_groups[0]
+            elif group not in student_groups:
+                raise ApiError(404, f'Студент {student} не найден в группе {group}')
+            semesters = _semesters(engine, group)
+            return {
+                'student': student,
+                'group': group,
+                'semesters': semesters,
+                'scores': student_scores(engine, student, group, semesters, _types(engine)),
+            }
+        return cached_json(engine, compute)
+
+    @server.route('/api/v1/groups/<group>/scores', endpoint='api_group_scores')
+    def api_group_scores(group):
+        def compute():
+            students = engine.group_students(group)
+            if not students:
+                raise ApiError(404, f'Группа {group} не найдена')
+            semesters = _semesters(engine, group)
+            types = _types(engine)
+            return {
+                'group': group,
+                'semesters': semesters,
+                'students': [{
+                    'student': student,
+                    'scores': student_scores(engine, student, group, semesters, types),
+                } for student in students],
+            }
+        return cached_json(engine, compute)
+
+    @server.route('/api/v1/groups/<group>/ratings', endpoint='api_group_ratings')
+    def api_group_ratings(group):
+        def compute():
+            semester = request.args.get('semester', type=int)
+            if semester is None:
+                raise ApiError(400, 'Укажите semester')
+            return {
+                'group': group,
+                'semester': semester,
+                'ratings': engine.ratings(group, semester).to_dict('records'),
+            }
+        return cached_json(engine, compute)
+
+    @server.route('/api/v1/risk', endpoint='api_risk')
+    def api_risk():
+        def compute():
+            risk_df = risk_table(engine)
+            groups = request.args.getlist('group')
+            if groups:
+                risk_df = risk_df[risk_df['Группа'].isin(groups)]
+            return {'students': risk_df.astype(object).where(risk_df.notna(), None).to_dict('records')}
+        return cached_json(engine, compute)
+
+    @server.route('/api/v1/projection', endpoint='api_projection')
+    def api_projection():
+        def compute():
+            # credit=Зачет&exam=Хор - ожидаемые оценки; без них - средний балл студента
+            credit, exam = request.args.get('credit'), request.args.get('exam')
+            try:
+                expected = scenario_from_grades(PROJECTION_SCENARIOS['expected'][0], credit, exam)
+            except KeyError as error:
+                raise ApiError(400, f'Неизвестная оценка: {error.args[0]}')
+            projection_df = projection_table(engine, {**PROJECTION_SCENARIOS, 'expected': expected})
+            groups = request.args.getlist('group')
+            if groups:
+                projection_df = projection_df[projection_df['Группа'].isin(groups)]
+            students = request.args.getlist('student', type=int)
+            if students:
+                projection_df = projection_df[projection_df['Код_Студента'].isin(students)]
+            return {'scores': projection_df.astype(object).where(projection_df.notna(), None).to_dict('records')}
+        return cached_json(engine, compute)
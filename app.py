@@ -1,577 +1,749 @@
+import os
+import threading
+from urllib.parse import parse_qs, urlencode
+
+# Замер фаз запуска (включается через STARTUP_PROFILE, см. startup.py)
+from startup import startup, report_startup
+
+import numpy as np
 import pandas as pd
+startup.mark('импорт numpy и pandas')
 import dash
 from dash import html, dcc, callback, Output, Input, dash_table, State
-import plotly.express as px
 from dash.exceptions import PreventUpdate
+startup.mark('импорт dash')
 
-def get_last_word(text):
-    if not isinstance(text, str):
-        return ""
-    words = text.strip().split()
-    return words[-1] if words else ""
-
-debt_grades = ['Незачет', 'Н/я', 'Неуд']
-
-def convert_semester(row):
-    """Преобразует семестр из формата 'курс, семестр' в стандартную нумерацию (1-8)"""
-    try:
-        course = int(row['Курс'])
-        semester_in_course = int(row['Семестр'])
-        return (course - 1) * 2 + semester_in_course
-    except (ValueError, KeyError):
-        return row['Семестр']  # Если не получается преобразовать, оставляем как есть
-    
-# Словарь для перевода текстовых оценок в числа
-grade_map = {
-    'Незачет': -1,
-    'NULL': 0,
-    'Н/я': 1,
-    'Неуд': 2,
-    'Удовл': 3,
-    'Хор': 4,
-    'Отл': 5,
-    'Не изуч.': 6,
-    'Зачет': 7,
-}
+from scoring import get_last_word, debt_grades, competency_scores
+from data_engine import watch_sources, COMPETENCIES_TABLE, ATTENDANCE_TABLE
+from datasets import DatasetRegistry, register_dataset_routes, DATASET_PARAM, DATASET_REQUEST_HOOK
+from cache import LRUCache
+from export import register_export_routes
+from api import register_api_routes
+from singleflight import coalesce
+from slowlog import slow_callback_recorder
+from memprofile import memory_recorder, register_memory_routes
+from score_matrix import group_score_matrix, group_trajectory, GROUP_STATS
+from attendance_cube import attendance_cube, RATE_COLUMN
+from risk import risk_table, RISK_COLUMNS, RISK_ABSENCE_PERCENT, RISK_LOW_SCORE
+from rating_history import (ratings_with_movement, SCORE_DELTA_COLUMN, SCORE_RANK_DELTA_COLUMN,
+                            ATTENDANCE_RANK_DELTA_COLUMN)
+from projection import (projection_table, projection_columns, scenario_from_grades, PROJECTION_SCENARIOS,
+                        CREDIT_POINTS, EXAM_POINTS)
+from grade_distribution import grade_distribution, DISTRIBUTION_KEYS, GRADE_COLUMNS, METRIC_COLUMNS
+from compact import compact_data_table, compact_table, register_compact_table
+from prewarm import access_recorder, Prewarmer
+from percentiles import (percentile_index, ratings_percentiles, PERCENTILE_COLUMNS, LEVELS, LEVEL_LABELS,
+                         METRIC_LABELS)
+from startup import lazy_import
 
-# Загрузка данных
-df = pd.read_csv('Компетенции.csv', encoding='cp1251', sep=';')
-df_attendance = pd.read_csv('Посещаемость.csv', encoding='cp1251', sep=';')  # Файл с посещаемостью
+# plotly.express нужен только при построении графиков - загружается при первом обращении
+px = lazy_import('plotly.express')
+startup.mark('импорт модулей приложения')
 
-df_attendance['Семестр'] = df_attendance.apply(convert_semester, axis=1)
+# Загрузка данных: движок выбирается переменной окружения DATA_ENGINE (pandas, sqlite, partitioned).
+# Несколько выгрузок оценок в DATA_SOURCES сводятся в одну таблицу без дублей.
+# Наборы факультетов из DATASETS_DIR выбираются параметром ?dataset= и загружаются при первом обращении;
+# engine - движок набора текущего запроса (см. datasets.py)
+registry = DatasetRegistry.from_environment()
+engine = registry.engine
+registry.get(registry.default)
+startup.mark('загрузка данных')
 
-# Преобразуем текстовые оценки в числа
-df['Числовая_оценка'] = df['Оценка'].map(grade_map)
+# Запись медленных вызовов callback'ов (включается через SLOW_CALLBACK_LOG, см. slowlog.py)
+record_slow = slow_callback_recorder(lambda: engine.version, dataset=registry.current_name)
+# Пиковые выделения памяти callback'ов (включается через MEMORY_PROFILE, см. memprofile.py)
+record_memory = memory_recorder()
+# Самые частые вызовы по наборам данных - для прогрева кэшей (PREWARM_LOG, см. prewarm.py)
+record_access = access_recorder(registry.current_name)
 
-def calculate_competency_score(competency_group, min_score=False):
-    if 'Описание' not in competency_group.columns:
-        raise ValueError("Для правильной обработки NULL нужен столбец 'Описание'")
-    
-    # Исключаем записи с "Не изуч." (6)
-    studied_group = competency_group[competency_group['Числовая_оценка'] != 6].copy()
-    
-    N = len(studied_group)  # Теперь считаем только изученные
-    if N == 0:
-        return 0
-    
-    # Разделяем зачеты и экзамены (уже без "Не изуч.")
-    credits = studied_group[(studied_group['ДиффенцированныйЗачет'] == 0)]
-    exams = studied_group[(studied_group['ДиффенцированныйЗачет'] == 1)]
-    
-    X = len(credits)  # Количество зачетов
-    Y = len(exams)    # Количество экзаменов
+# Одинаковые одновременные вызовы объединяются только в пределах одного набора данных и его версии
+def data_scope():
+    return engine.dataset, engine.version
 
-    total_score = 0
-    
-    if X > 0:
-        credit_weight = X / N  # Масса зачетов
-        per_credit = (credit_weight / X) * 100  # Вклад одного зачета
-        
-        for _, row in credits.iterrows():
-            grade = row['Числовая_оценка']
-            if min_score:
-                # Минимальный балл - считаем как "зачет"
-                total_score += per_credit
-            else:
-                # Реальный расчет
-                if grade == 7:  # Зачет
-                    total_score += per_credit
-                elif grade == -1:  # Незачет
-                    total_score += 0
-
-    if Y > 0:
-        exam_weight = Y / N  # Масса экзаменов
-        per_exam_max = (exam_weight / Y) * 100  # Макс вклад экзамена
-        
-        for _, row in exams.iterrows():
-            grade = row['Числовая_оценка']
-            if min_score:
-                # Минимальный балл - считаем как "удовл" (3)
-                total_score += 0.5 * per_exam_max
-            else:
-                # Реальный расчет
-                if grade == 3:  # Удовл
-                    total_score += 0.5 * per_exam_max
-                elif grade == 4:  # Хор
-                    total_score += 0.75 * per_exam_max
-                elif grade == 5:  # Отл
-                    total_score += per_exam_max
-    
-    return round(total_score, 2)
+# Инициализация Dash приложения. Содержимое страницы и таблицы деталей создаются callback'ами,
+# поэтому callback'и ссылаются на компоненты, которых нет в исходном макете.
+# Хук request_pre добавляет в каждый запрос callback'а набор данных из адреса страницы
+app = dash.Dash(__name__, suppress_callback_exceptions=True, hooks={'request_pre': DATASET_REQUEST_HOOK})
+# WSGI-приложение для gunicorn (app:server, см. gunicorn.conf.py)
+server = app.server
 
-# Инициализация Dash приложения
-app = dash.Dash(__name__)
+# Потоковая выгрузка рейтингов, баллов и посещаемости (/export/...)
+register_export_routes(app.server, engine)
+# JSON API для внешних систем (/api/v1/...)
+register_api_routes(app.server, engine)
+# Объем данных, кэшей и выделений в callback'ах (/diagnostics/memory, только при MEMORY_PROFILE)
+register_memory_routes(app.server, engine)
+# Список наборов данных (/api/v1/datasets)
+register_dataset_routes(app.server, registry)
 
-# Получаем уникальные типы компетенций, семестры и группы для фильтров
-competency_types = sorted(df['Тип_Компетенции'].dropna().unique())
-semesters = sorted(df['Семестр'].dropna().unique())
-groups = sorted(df['Название'].dropna().unique())  # Новый фильтр по группам
+startup.mark('приложение Dash и маршруты')
 
-# Получаем уникальные значения для фильтров посещаемости
-attendance_groups = sorted(df_attendance['Группа'].dropna().unique())
-attendance_courses = sorted(df_attendance['Курс'].dropna().unique())
-attendance_semesters = sorted(df_attendance['Семестр'].dropna().unique())  # Теперь здесь стандартные семестры 1-8
-attendance_teachers = sorted(df_attendance['Преподаватель'].dropna().unique())
-attendance_subjects = sorted(df_attendance['Дисциплина'].dropna().unique())
-attendance_types = sorted(df_attendance['ВидЗанятий'].dropna().unique())
-attendance_codes = sorted(df_attendance['Код'].dropna().unique())
+# Разрезы посещаемости, которые строятся из куба
+attendance_dimension_labels = {
+    'Преподаватель': 'Преподаватель',
+    'Дисциплина': 'Дисциплина',
+    'ВидЗанятий': 'Вид занятий',
+    'Группа': 'Группа',
+    'Курс': 'Курс',
+    'Семестр': 'Семестр',
+    'Код': 'Студент',
+}
+attendance_heatmap_axes = [
+    ('Преподаватель', 'Дисциплина'),
+    ('Дисциплина', 'ВидЗанятий'),
+    ('Преподаватель', 'ВидЗанятий'),
+    ('Код', 'Дисциплина'),
+    ('Группа', 'Семестр'),
+]
 
 # Получаем уникальные значения для фильтров успеваемости
-performance_filters = {
-    'Дисциплина': sorted(df['Дисциплина'].dropna().unique()),
-    'Курс': sorted(df['Курс'].dropna().unique()),
-    'Семестр': sorted(df['Семестр'].dropna().unique()),
-    'КодКомпетенции': sorted(df['КодКомпетенции'].dropna().unique()),
-    'Компетенция': sorted(df['Компетенция'].dropna().unique()),
-    'Тип_Компетенции': sorted(df['Тип_Компетенции'].dropna().unique()),
-    'Название': sorted(df['Название'].dropna().unique()),
-    'УчебныйГод': sorted(df['УчебныйГод'].dropna().unique()),
-    'Код_Студента': sorted(df['Код_Студента'].dropna().unique())
-}
+performance_filter_columns = ['Дисциплина', 'Курс', 'Семестр', 'КодКомпетенции', 'Компетенция',
+                              'Тип_Компетенции', 'Название', 'УчебныйГод', 'Код_Студента']
 
-# Макет страницы
-# Макет страницы
-app.layout = html.Div([
-    html.Div(className='row', children=[
-        html.Div(className='four columns div-user-controls', children=[
-            html.H2('График компетенций студентов'),
-            html.P('Выберите группу:'),
-            dcc.Dropdown(
-                id='group-dropdown',
-                options=[{'label': group, 'value': group} for group in groups],
-                value=groups[0] if groups else None,  # Выбираем первую группу по умолчанию
-                multi=False,  
-                style={'color': 'black'}
-            ),
-            html.P('Выберите студента:'),
-            dcc.Dropdown(
-                id='student-dropdown',
-                options=[],  # Будет заполнено через callback
-                value=None,
-                clearable=False,
-                style={'color': 'black'}
-            ),
-            html.P('Выберите семестр:'),
-            dcc.Dropdown(
-                id='semester-dropdown',
-                options=[{'label': f"Семестр {sem}", 'value': sem} for sem in semesters],
-                value=semesters,  # По умолчанию выбраны все семестры
-                multi=True,
-                style={'color': 'black'}
-            ),
-            html.P('Выберите тип компетенции:'),
-            dcc.Dropdown(
-                id='competency-type-dropdown',
-                options=[{'label': tp, 'value': tp} for tp in competency_types],
-                value=competency_types,  # По умолчанию выбраны все типы
-                multi=True,
-                style={'color': 'black'}
-            ),
-            dcc.Checklist(
-                id='show-min-score',
-                options=[{'label': ' Показать минимальный балл (тройки/зачеты)', 'value': 'show'}],
-                value=['show'],
-                style={'margin-top': '10px'}
-            ),
-            html.Div(id='student-grades-info', style={
-                'margin-top': '20px',
-                'max-height': '400px',
-                'overflow-y': 'auto',
-                'border': '1px solid #ddd',
-                'border-radius': '5px',
-                'padding': '10px'
-            })
-        ]),
-        html.Div(className='eight columns div-for-charts bg-grey', children=[
-            dcc.Tabs([
-                dcc.Tab(label='Компетенции', children=[
-                    dcc.Graph(id='radar-chart', style={'height': '70vh'}),
-                    html.Div(id='competency-details', style={
-                        'margin-top': '20px',
-                        'border': '1px solid #ddd',
-                        'border-radius': '5px',
-                        'padding': '10px',
-                        'display': 'none'  # Сначала скрываем
-                    })
+# Значения фильтров берутся из набора данных запроса; макет строится один раз на версию набора
+layout_cache = LRUCache('layouts', maxsize=16)
+
+def build_layout(engine, dataset):
+    # Получаем уникальные типы компетенций, семестры и группы для фильтров
+    competency_types = engine.distinct(COMPETENCIES_TABLE, 'Тип_Компетенции')
+    semesters = engine.distinct(COMPETENCIES_TABLE, 'Семестр')
+    groups = engine.distinct(COMPETENCIES_TABLE, 'Название')  # Новый фильтр по группам
+    years = engine.distinct(COMPETENCIES_TABLE, 'УчебныйГод')
+
+    # Получаем уникальные значения для фильтров посещаемости
+    attendance_groups = engine.distinct(ATTENDANCE_TABLE, 'Группа')
+    attendance_courses = engine.distinct(ATTENDANCE_TABLE, 'Курс')
+    attendance_semesters = engine.distinct(ATTENDANCE_TABLE, 'Семестр')  # Теперь здесь стандартные семестры 1-8
+    attendance_teachers = engine.distinct(ATTENDANCE_TABLE, 'Преподаватель')
+    attendance_subjects = engine.distinct(ATTENDANCE_TABLE, 'Дисциплина')
+    attendance_types = engine.distinct(ATTENDANCE_TABLE, 'ВидЗанятий')
+    attendance_codes = engine.distinct(ATTENDANCE_TABLE, 'Код')
+
+    performance_filters = engine.facets(COMPETENCIES_TABLE, performance_filter_columns)
+
+    # Макет страницы
+    return html.Div([
+        html.Div(className='row', children=[
+            html.Div(className='four columns div-user-controls', children=[
+                html.H2('График компетенций студентов'),
+                html.Div(style={} if len(registry.names) > 1 else {'display': 'none'}, children=[
+                    html.P('Выберите факультет:'),
+                    dcc.Dropdown(
+                        id='dataset-dropdown',
+                        options=[{'label': name, 'value': name} for name in registry.names],
+                        value=dataset,
+                        clearable=False,
+                        style={'color': 'black'}
+                    ),
                 ]),
-                dcc.Tab(label='Посещаемость и успеваемость', children=[
-                    html.Div([
-                        dcc.Tabs([
-                            dcc.Tab(label='Посещаемость', children=[
-                                html.Div([
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Группа:'),
-                                            dcc.Dropdown(
-                                                id='attendance-group-dropdown',
-                                                options=[{'label': group, 'value': group} for group in attendance_groups],
-                                                value=attendance_groups,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
+                html.P('Выберите группу:'),
+                dcc.Dropdown(
+                    id='group-dropdown',
+                    options=[{'label': group, 'value': group} for group in groups],
+                    value=groups[0] if groups else None,  # Выбираем первую группу по умолчанию
+                    multi=False,  
+                    style={'color': 'black'}
+                ),
+                html.P('Выберите студента:'),
+                dcc.Dropdown(
+                    id='student-dropdown',
+                    options=[],  # Будет заполнено через callback
+                    value=None,
+                    clearable=False,
+                    style={'color': 'black'}
+                ),
+                html.P('Выберите семестр:'),
+                dcc.Dropdown(
+                    id='semester-dropdown',
+                    options=[{'label': f"Семестр {sem}", 'value': sem} for sem in semesters],
+                    value=semesters,  # По умолчанию выбраны все семестры
+                    multi=True,
+                    style={'color': 'black'}
+                ),
+                html.P('Выберите тип компетенции:'),
+                dcc.Dropdown(
+                    id='competency-type-dropdown',
+                    options=[{'label': tp, 'value': tp} for tp in competency_types],
+                    value=competency_types,  # По умолчанию выбраны все типы
+                    multi=True,
+                    style={'color': 'black'}
+                ),
+                dcc.Checklist(
+                    id='show-min-score',
+                    options=[{'label': ' Показать минимальный балл (тройки/зачеты)', 'value': 'show'}],
+                    value=['show'],
+                    style={'margin-top': '10px'}
+                ),
+                html.P('Сравнить с группой:', style={'margin-top': '10px'}),
+                dcc.Checklist(
+                    id='group-overlay',
+                    options=[{'label': f' {label}', 'value': stat} for stat, (label, _) in GROUP_STATS.items()],
+                    value=[]
+                ),
+                html.Div(id='student-grades-info', style={
+                    'margin-top': '20px',
+                    'max-height': '400px',
+                    'overflow-y': 'auto',
+                    'border': '1px solid #ddd',
+                    'border-radius': '5px',
+                    'padding': '10px'
+                })
+            ]),
+            html.Div(className='eight columns div-for-charts bg-grey', children=[
+                dcc.Tabs([
+                    dcc.Tab(label='Компетенции', children=[
+                        dcc.Graph(id='radar-chart', style={'height': '70vh'}),
+                        html.Div(id='competency-details', style={
+                            'margin-top': '20px',
+                            'border': '1px solid #ddd',
+                            'border-radius': '5px',
+                            'padding': '10px',
+                            'display': 'none'  # Сначала скрываем
+                        })
+                    ]),
+                    dcc.Tab(label='Динамика', children=[
+                        dcc.Graph(id='trajectory-chart', style={'height': '75vh'})
+                    ]),
+                    dcc.Tab(label='Группа', children=[
+                        dcc.Graph(id='group-heatmap', style={'height': '75vh'})
+                    ]),
+                    dcc.Tab(label='Посещаемость и успеваемость', children=[
+                        html.Div([
+                            dcc.Tabs([
+                                dcc.Tab(label='Посещаемость', children=[
+                                    html.Div([
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Группа:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-group-dropdown',
+                                                    options=[{'label': group, 'value': group} for group in attendance_groups],
+                                                    value=attendance_groups,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Код:'),  # New filter for Код
+                                                dcc.Dropdown(
+                                                    id='attendance-code-dropdown',
+                                                    options=[{'label': code, 'value': code} for code in attendance_codes],
+                                                    value=attendance_codes,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
                                         ]),
-                                        html.Div(className='six columns', children=[
-                                            html.P('Код:'),  # New filter for Код
-                                            dcc.Dropdown(
-                                                id='attendance-code-dropdown',
-                                                options=[{'label': code, 'value': code} for code in attendance_codes],
-                                                value=attendance_codes,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Курс:'),
-                                            dcc.Dropdown(
-                                                id='attendance-course-dropdown',
-                                                options=[{'label': course, 'value': course} for course in attendance_courses],
-                                                value=attendance_courses,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Курс:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-course-dropdown',
+                                                    options=[{'label': course, 'value': course} for course in attendance_courses],
+                                                    value=attendance_courses,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Семестр:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-semester-dropdown',
+                                                    options=[{'label': semester, 'value': semester} for semester in attendance_semesters],
+                                                    value=attendance_semesters,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
                                         ]),
-                                        html.Div(className='six columns', children=[
-                                            html.P('Семестр:'),
-                                            dcc.Dropdown(
-                                                id='attendance-semester-dropdown',
-                                                options=[{'label': semester, 'value': semester} for semester in attendance_semesters],
-                                                value=attendance_semesters,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Преподаватель:'),
-                                            dcc.Dropdown(
-                                                id='attendance-teacher-dropdown',
-                                                options=[{'label': teacher, 'value': teacher} for teacher in attendance_teachers],
-                                                value=attendance_teachers,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Преподаватель:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-teacher-dropdown',
+                                                    options=[{'label': teacher, 'value': teacher} for teacher in attendance_teachers],
+                                                    value=attendance_teachers,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Дисциплина:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-subject-dropdown',
+                                                    options=[{'label': subject, 'value': subject} for subject in attendance_subjects],
+                                                    value=attendance_subjects,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
                                         ]),
-                                        html.Div(className='six columns', children=[
-                                            html.P('Дисциплина:'),
-                                            dcc.Dropdown(
-                                                id='attendance-subject-dropdown',
-                                                options=[{'label': subject, 'value': subject} for subject in attendance_subjects],
-                                                value=attendance_subjects,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Вид занятий:'),
-                                            dcc.Dropdown(
-                                                id='attendance-type-dropdown',
-                                                options=[{'label': type_, 'value': type_} for type_ in attendance_types],
-                                                value=attendance_types,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    dcc.Graph(id='attendance-pie-chart', style={'height': '60vh'}),
-                                    html.Div(id='attendance-details', style={
-                                        'margin-top': '20px',
-                                        'border': '1px solid #ddd',
-                                        'border-radius': '5px',
-                                        'padding': '10px'
-                                    })
-                                ])
-                            ]),
-                            dcc.Tab(label='Успеваемость', children=[
-                                html.Div([
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Дисциплина:'),
-                                            dcc.Dropdown(
-                                                id='performance-subject-dropdown',
-                                                options=[{'label': subj, 'value': subj} for subj in performance_filters['Дисциплина']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Вид занятий:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-type-dropdown',
+                                                    options=[{'label': type_, 'value': type_} for type_ in attendance_types],
+                                                    value=attendance_types,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
+                                        ]),
+                                        dcc.Graph(id='attendance-pie-chart', style={'height': '60vh'}),
+                                        html.Div(id='attendance-details', style={
+                                            'margin-top': '20px',
+                                            'border': '1px solid #ddd',
+                                            'border-radius': '5px',
+                                            'padding': '10px'
+                                        }),
+                                        html.Div(className='row', style={'margin-top': '20px'}, children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Пропуски в разрезе:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-breakdown-dropdown',
+                                                    options=[{'label': label, 'value': dimension}
+                                                             for dimension, label in attendance_dimension_labels.items()],
+                                                    value='Преподаватель',
+                                                    clearable=False,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Тепловая карта:'),
+                                                dcc.Dropdown(
+                                                    id='attendance-heatmap-dropdown',
+                                                    options=[{'label': f'{attendance_dimension_labels[rows]} / {attendance_dimension_labels[columns]}',
+                                                              'value': f'{rows}|{columns}'}
+                                                             for rows, columns in attendance_heatmap_axes],
+                                                    value='Преподаватель|Дисциплина',
+                                                    clearable=False,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
                                         ]),
-                                        html.Div(className='six columns', children=[
-                                            html.P('Курс:'),
-                                            dcc.Dropdown(
-                                                id='performance-course-dropdown',
-                                                options=[{'label': course, 'value': course} for course in performance_filters['Курс']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Семестр:'),
-                                            dcc.Dropdown(
-                                                id='performance-semester-dropdown',
-                                                options=[{'label': sem, 'value': sem} for sem in performance_filters['Семестр']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
+                                        dcc.Graph(id='attendance-breakdown-chart', style={'height': '60vh'}),
+                                        dcc.Graph(id='attendance-heatmap', style={'height': '70vh'})
+                                    ])
+                                ]),
+                                dcc.Tab(label='Успеваемость', children=[
+                                    html.Div([
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Дисциплина:'),
+                                                dcc.Dropdown(
+                                                    id='performance-subject-dropdown',
+                                                    options=[{'label': subj, 'value': subj} for subj in performance_filters['Дисциплина']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Курс:'),
+                                                dcc.Dropdown(
+                                                    id='performance-course-dropdown',
+                                                    options=[{'label': course, 'value': course} for course in performance_filters['Курс']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
                                         ]),
-                                        html.Div(className='six columns', children=[
-                                            html.P('Компетенция:'),
-                                            dcc.Dropdown(
-                                                id='performance-competency-dropdown',
-                                                options=[{'label': comp, 'value': comp} for comp in performance_filters['Компетенция']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Тип компетенции:'),
-                                            dcc.Dropdown(
-                                                id='performance-competency-type-dropdown',
-                                                options=[{'label': tp, 'value': tp} for tp in performance_filters['Тип_Компетенции']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Семестр:'),
+                                                dcc.Dropdown(
+                                                    id='performance-semester-dropdown',
+                                                    options=[{'label': sem, 'value': sem} for sem in performance_filters['Семестр']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Компетенция:'),
+                                                dcc.Dropdown(
+                                                    id='performance-competency-dropdown',
+                                                    options=[{'label': comp, 'value': comp} for comp in performance_filters['Компетенция']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
                                         ]),
-                                        html.Div(className='six columns', children=[
-                                            html.P('Группа:'),
-                                            dcc.Dropdown(
-                                                id='performance-group-dropdown',
-                                                options=[{'label': group, 'value': group} for group in performance_filters['Название']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    html.Div(className='row', children=[
-                                        html.Div(className='six columns', children=[
-                                            html.P('Учебный год:'),
-                                            dcc.Dropdown(
-                                                id='performance-year-dropdown',
-                                                options=[{'label': year, 'value': year} for year in performance_filters['УчебныйГод']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Тип компетенции:'),
+                                                dcc.Dropdown(
+                                                    id='performance-competency-type-dropdown',
+                                                    options=[{'label': tp, 'value': tp} for tp in performance_filters['Тип_Компетенции']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Группа:'),
+                                                dcc.Dropdown(
+                                                    id='performance-group-dropdown',
+                                                    options=[{'label': group, 'value': group} for group in performance_filters['Название']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
                                         ]),
-                                        html.Div(className='six columns', children=[
-                                            html.P('Код студента:'),
-                                            dcc.Dropdown(
-                                                id='performance-student-dropdown',
-                                                options=[{'label': stud, 'value': stud} for stud in performance_filters['Код_Студента']],
-                                                value=None,
-                                                multi=True,
-                                                style={'color': 'black'}
-                                            )
-                                        ])
-                                    ]),
-                                    html.Div([
-                                        html.Button('Сбросить фильтр по оценке', 
-                                                id='reset-grade-filter', 
-                                                style={'margin-top': '10px', 'margin-bottom': '10px'})
-                                    ]),
-                                    dcc.Graph(id='performance-pie-chart', style={'height': '60vh'}),
-                                    html.Div(id='performance-details', style={
-                                        'margin-top': '20px',
-                                        'border': '1px solid #ddd',
-                                        'border-radius': '5px',
-                                        'padding': '10px'
-                                    })
+                                        html.Div(className='row', children=[
+                                            html.Div(className='six columns', children=[
+                                                html.P('Учебный год:'),
+                                                dcc.Dropdown(
+                                                    id='performance-year-dropdown',
+                                                    options=[{'label': year, 'value': year} for year in performance_filters['УчебныйГод']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ]),
+                                            html.Div(className='six columns', children=[
+                                                html.P('Код студента:'),
+                                                dcc.Dropdown(
+                                                    id='performance-student-dropdown',
+                                                    options=[{'label': stud, 'value': stud} for stud in performance_filters['Код_Студента']],
+                                                    value=None,
+                                                    multi=True,
+                                                    style={'color': 'black'}
+                                                )
+                                            ])
+                                        ]),
+                                        html.Div([
+                                            html.Button('Сбросить фильтр по оценке', 
+                                                    id='reset-grade-filter', 
+                                                    style={'margin-top': '10px', 'margin-bottom': '10px'})
+                                        ]),
+                                        dcc.Graph(id='performance-pie-chart', style={'height': '60vh'}),
+                                        html.Div(id='performance-details', style={
+                                            'margin-top': '20px',
+                                            'border': '1px solid #ddd',
+                                            'border-radius': '5px',
+                                            'padding': '10px'
+                                        })
+                                    ])
                                 ])
                             ])
                         ])
-                    ])
-                ]),
-                # Выносим вкладку "Рейтинги" на верхний уровень
-                dcc.Tab(label='Рейтинги', children=[
-                    html.Div([
-                        html.H3('Рейтинг студентов'),
+                    ]),
+                    # Выносим вкладку "Рейтинги" на верхний уровень
+                    dcc.Tab(label='Рейтинги', children=[
                         html.Div([
-                            html.P('Выберите группу для рейтинга:'),
+                            html.H3('Рейтинг студентов'),
+                            html.Div([
+                                html.P('Выберите группу для рейтинга:'),
+                                dcc.Dropdown(
+                                    id='rating-group-dropdown',
+                                    options=[{'label': group, 'value': group} for group in groups],
+                                    value=None,
+                                    multi=False,
+                                    style={'color': 'black'}
+                                ),
+                                html.P('Выберите семестр:'),
+                                dcc.Dropdown(
+                                    id='rating-semester-dropdown',
+                                    options=[{'label': sem, 'value': sem} for sem in semesters],
+                                    value=None,
+                                    multi=False,
+                                    style={'color': 'black'}
+                                ),
+                                html.Button('Обновить рейтинги', id='update-ratings-button', 
+                                        style={'margin-top': '10px'})
+                            ], style={'margin-bottom': '20px'}),
+                        
+                            html.Div(id='ratings-container', children=[
+                                dash_table.DataTable(
+                                    id='ratings-table',
+                                    style_table={'overflowX': 'auto'},
+                                    style_cell={
+                                        'minWidth': '100px', 'width': '100px', 'maxWidth': '100px',
+                                        'whiteSpace': 'normal',
+                                        'textAlign': 'center',
+                                        'padding': '5px'
+                                    },
+                                    style_header={
+                                        'backgroundColor': 'rgb(230, 230, 230)',
+                                        'fontWeight': 'bold'
+                                    },
+                                    style_data_conditional=[
+                                        {
+                                            'if': {'row_index': 'odd'},
+                                            'backgroundColor': 'rgb(248, 248, 248)'
+                                        },
+                                        {
+                                            'if': {'column_id': 'Студент'},
+                                            'fontWeight': 'bold',
+                                            'textAlign': 'left'
+                                        },
+                                        # Движение относительно прошлого семестра: вверх - зеленым, вниз - красным
+                                        *[rule for column in (SCORE_DELTA_COLUMN, SCORE_RANK_DELTA_COLUMN,
+                                                              ATTENDANCE_RANK_DELTA_COLUMN)
+                                          for rule in (
+                                              {'if': {'filter_query': f'{{{column}}} > 0', 'column_id': column},
+                                               'color': 'green'},
+                                              {'if': {'filter_query': f'{{{column}}} < 0', 'column_id': column},
+                                               'color': 'red'})],
+                                            # Добавляем выделение строк с долгами
+                                        {
+                                            'if': {
+                                                'filter_query': '{Долги} > 0'
+                                            },
+                                            'backgroundColor': 'rgba(255, 0, 0, 0.1)',
+                                            'border': '1px solid rgba(255, 0, 0, 0.2)'
+                                        },
+                                        # Ярче выделяем ячейку с количеством долгов
+                                        {
+                                            'if': {
+                                                'column_id': 'Долги',
+                                                'filter_query': '{Долги} > 0'
+                                            },
+                                            'backgroundColor': 'rgba(255, 0, 0, 0.3)',
+                                            'fontWeight': 'bold',
+                                            'color': 'darkred'
+                                        }
+
+                                    ],
+                                    sort_action='native',  # Добавьте эту строку для включения сортировки
+                                    sort_mode='single'
+                                )
+                            ])
+                        ])
+                    ]),
+                    dcc.Tab(label='Группа риска', children=[
+                        html.Div([
+                            html.H3('Студенты группы риска'),
+                            html.P(f'Долги, пропуски по неуважительной причине больше {RISK_ABSENCE_PERCENT:g}% '
+                                   f'или компетенции с баллом ниже {RISK_LOW_SCORE:g}%'),
                             dcc.Dropdown(
-                                id='rating-group-dropdown',
+                                id='risk-group-dropdown',
                                 options=[{'label': group, 'value': group} for group in groups],
-                                value=None,
-                                multi=False,
-                                style={'color': 'black'}
+                                value=[],
+                                multi=True,
+                                placeholder='Все группы',
+                                style={'color': 'black', 'margin-bottom': '10px'}
                             ),
-                            html.P('Выберите семестр:'),
+                            dash_table.DataTable(
+                                id='risk-table',
+                                columns=[{'name': column, 'id': column,
+                                          'type': 'text' if column in ('Группа', 'Причины') else 'numeric'}
+                                         for column in RISK_COLUMNS],
+                                style_table={'overflowX': 'auto'},
+                                style_cell={'textAlign': 'center', 'padding': '5px', 'whiteSpace': 'normal'},
+                                style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
+                                style_data_conditional=[
+                                    {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'},
+                                    {'if': {'column_id': 'Причины'}, 'textAlign': 'left'},
+                                    {'if': {'filter_query': '{Риск} >= 50', 'column_id': 'Риск'},
+                                     'backgroundColor': 'rgba(255, 0, 0, 0.3)', 'fontWeight': 'bold'}
+                                ],
+                                sort_action='native',
+                                page_size=50
+                            )
+                        ])
+                    ]),
+                    dcc.Tab(label='Прогноз', children=[
+                        html.Div([
+                            html.H3('Прогноз баллов компетенций'),
+                            html.P('Неизученные дисциплины засчитываются по предположению об оценке: лучший случай - '
+                                   'отлично и зачет, минимум - удовлетворительно и зачет, ожидаемый - по выбору ниже'),
                             dcc.Dropdown(
-                                id='rating-semester-dropdown',
-                                options=[{'label': sem, 'value': sem} for sem in semesters],
-                                value=None,
-                                multi=False,
-                                style={'color': 'black'}
+                                id='projection-group-dropdown',
+                                options=[{'label': group, 'value': group} for group in groups],
+                                value=[],
+                                multi=True,
+                                placeholder='Выберите группы',
+                                style={'color': 'black', 'margin-bottom': '10px'}
                             ),
-                            html.Button('Обновить рейтинги', id='update-ratings-button', 
-                                    style={'margin-top': '10px'})
-                        ], style={'margin-bottom': '20px'}),
-                        
-                        html.Div(id='ratings-container', children=[
-                            dash_table.DataTable(
-                                id='ratings-table',
+                            html.Div(style={'display': 'flex', 'gap': '20px', 'margin-bottom': '10px'}, children=[
+                                html.Div(style={'width': '300px'}, children=[
+                                    html.P('Ожидаемая оценка за экзамен:'),
+                                    dcc.Dropdown(
+                                        id='projection-exam-dropdown',
+                                        options=[{'label': 'Средний балл студента', 'value': ''}] +
+                                                [{'label': grade, 'value': grade} for grade in EXAM_POINTS],
+                                        value='',
+                                        clearable=False,
+                                        style={'color': 'black'}
+                                    ),
+                                ]),
+                                html.Div(style={'width': '300px'}, children=[
+                                    html.P('Ожидаемая оценка за зачет:'),
+                                    dcc.Dropdown(
+                                        id='projection-credit-dropdown',
+                                        options=[{'label': 'Средний балл студента', 'value': ''}] +
+                                                [{'label': grade, 'value': grade} for grade in CREDIT_POINTS],
+                                        value='',
+                                        clearable=False,
+                                        style={'color': 'black'}
+                                    ),
+                                ]),
+                            ]),
+                            dcc.Checklist(
+                                id='projection-open-only',
+                                options=[{'label': ' Только компетенции с неизученными дисциплинами', 'value': 'open'}],
+                                value=['open'],
+                                style={'margin-bottom': '10px'}
+                            ),
+                            # Строки прогноза приходят в dcc.Store по столбцам (см. compact.py)
+                            compact_data_table(
+                                'projection-table',
+                                pd.DataFrame(columns=projection_columns()),
+                                columns=[{'name': column, 'id': column,
+                                          'type': 'text' if column in ('Группа', 'Компетенция', 'Тип_Компетенции')
+                                          else 'numeric'}
+                                         for column in projection_columns()],
                                 style_table={'overflowX': 'auto'},
-                                style_cell={
-                                    'minWidth': '100px', 'width': '100px', 'maxWidth': '100px',
-                                    'whiteSpace': 'normal',
-                                    'textAlign': 'center',
-                                    'padding': '5px'
-                                },
-                                style_header={
-                                    'backgroundColor': 'rgb(230, 230, 230)',
-                                    'fontWeight': 'bold'
-                                },
+                                style_cell={'textAlign': 'center', 'padding': '5px'},
+                                style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
                                 style_data_conditional=[
-                                    {
-                                        'if': {'row_index': 'odd'},
-                                        'backgroundColor': 'rgb(248, 248, 248)'
-                                    },
-                                    {
-                                        'if': {'column_id': 'Студент'},
-                                        'fontWeight': 'bold',
-                                        'textAlign': 'left'
-                                    },
-                                        # Добавляем выделение строк с долгами
-                                    {
-                                        'if': {
-                                            'filter_query': '{Долги} > 0'
-                                        },
-                                        'backgroundColor': 'rgba(255, 0, 0, 0.1)',
-                                        'border': '1px solid rgba(255, 0, 0, 0.2)'
-                                    },
-                                    # Ярче выделяем ячейку с количеством долгов
-                                    {
-                                        'if': {
-                                            'column_id': 'Долги',
-                                            'filter_query': '{Долги} > 0'
-                                        },
-                                        'backgroundColor': 'rgba(255, 0, 0, 0.3)',
-                                        'fontWeight': 'bold',
-                                        'color': 'darkred'
-                                    }
-
+                                    {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'}
                                 ],
-                                sort_action='native',  # Добавьте эту строку для включения сортировки
-                                sort_mode='single'
+                                sort_action='native',
+                                filter_action='native',
+                                page_size=50
                             )
                         ])
+                    ]),
+                    dcc.Tab(label='Распределение оценок', children=[
+                        html.Div([
+                            html.H3('Распределение оценок по дисциплинам'),
+                            html.P('Число студентов с каждой оценкой за выбранные учебные годы и группы. '
+                                   'Выберите ячейку дисциплины, чтобы увидеть распределение по годам и группам'),
+                            html.Div(style={'display': 'flex', 'gap': '20px', 'margin-bottom': '10px'}, children=[
+                                html.Div(style={'width': '300px'}, children=[
+                                    dcc.Dropdown(
+                                        id='distribution-year-dropdown',
+                                        options=[{'label': year, 'value': year} for year in years],
+                                        value=[],
+                                        multi=True,
+                                        placeholder='Все учебные годы',
+                                        style={'color': 'black'}
+                                    ),
+                                ]),
+                                html.Div(style={'width': '300px'}, children=[
+                                    dcc.Dropdown(
+                                        id='distribution-group-dropdown',
+                                        options=[{'label': group, 'value': group} for group in groups],
+                                        value=[],
+                                        multi=True,
+                                        placeholder='Все группы',
+                                        style={'color': 'black'}
+                                    ),
+                                ]),
+                            ]),
+                            dash_table.DataTable(
+                                id='distribution-table',
+                                columns=[{'name': column, 'id': column,
+                                          'type': 'text' if column == 'Дисциплина' else 'numeric'}
+                                         for column in ['Дисциплина'] + METRIC_COLUMNS],
+                                style_table={'overflowX': 'auto'},
+                                style_cell={'textAlign': 'center', 'padding': '5px'},
+                                style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
+                                style_data_conditional=[
+                                    {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'},
+                                    {'if': {'column_id': 'Дисциплина'}, 'textAlign': 'left'}
+                                ],
+                                sort_action='native',
+                                filter_action='native',
+                                page_size=30
+                            ),
+                            html.Div(id='distribution-details', style={'margin-top': '20px'})
+                        ])
                     ])
                 ])
             ])
         ])
     ])
+
+def page_layout(dataset):
+    dataset_engine = registry.get(dataset)
+    return layout_cache.get_or_compute((dataset, dataset_engine.version),
+                                       lambda: build_layout(dataset_engine, dataset))
+
+# Набор данных страницы берется из ее адреса: содержимое строит callback по url.search, а не
+# запрос макета по заголовку Referer, который прокси или Referrer-Policy могут обрезать
+app.layout = html.Div([
+    # Смена набора данных перезагружает страницу с ?dataset=<имя>
+    dcc.Location(id='url', refresh=True),
+    html.Div(id='page-content'),
 ])
+# Макет набора по умолчанию готов до первого запроса
+page_layout(registry.default)
+startup.mark('значения фильтров и макет страницы')
+
+
+# Содержимое страницы для набора из ?dataset= (неизвестный набор - ошибка 404, а не набор по умолчанию)
+@app.callback(
+    Output('page-content', 'children'),
+    Input('url', 'search')
+)
+def render_page(search):
+    return page_layout(parse_qs((search or '').lstrip('?')).get(DATASET_PARAM, [registry.default])[0])
+
+
+# Callback для выбора набора данных (факультета)
+@app.callback(
+    Output('url', 'search'),
+    Input('dataset-dropdown', 'value'),
+    prevent_initial_call=True
+)
+def select_dataset(dataset):
+    return f'?{urlencode({DATASET_PARAM: dataset})}'
 
+# Расчеты, результаты которых хранятся в кэшах. Их вызовы записываются в журнал прогрева
+# (record_access) и повторяются прогревом; callback'и берут из них готовые данные.
 
-# Функция для расчета рейтингов
+# Функция для расчета рейтингов (одинаковые одновременные запросы считаются один раз).
+# Рейтинги семестров хранятся между запросами вместе с изменением относительно прошлого семестра
+@record_access
+@coalesce(scope=data_scope)
 def calculate_ratings(selected_group, selected_semester):
     if not selected_group or not selected_semester:
         return pd.DataFrame()
     
-    # Создаем копию данных для безопасной модификации
-    group_df = df[df['Название'] == selected_group].copy()
-    semester_df = group_df[group_df['Семестр'] == selected_semester].copy()
-    
-    if semester_df.empty:
-        return pd.DataFrame()
-    
-    # Добавляем столбец с последним словом компетенции (используя .loc для избежания предупреждения)
-    semester_df.loc[:, 'last_word'] = semester_df['Компетенция'].apply(get_last_word)
-    
-    student_performance = {}
-    for student, student_data in semester_df.groupby('Код_Студента'):
-        # Создаем копию данных студента для безопасной работы
-        student_data = student_data.copy()
-        
-        total_score = 0
-        competency_count = 0
-        
-        for last_word, last_word_group in student_data.groupby('last_word'):
-            # Исключаем записи с "Не изуч." (6)
-            studied_group = last_word_group[last_word_group['Числовая_оценка'] != 6].copy()
-            
-            if studied_group.empty:
-                continue
-                
-            score = calculate_competency_score(studied_group)
-            total_score += score
-            competency_count += 1
-        
-        avg_score_percent = total_score / competency_count if competency_count > 0 else 0
-        avg_score_5 = (avg_score_percent / 100) * 5
-        
-        # Считаем долги (исключая "Не изуч.")
-        debts_df = student_data[
-            (student_data['Оценка'].isin(['Незачет', 'Н/я', 'Неуд'])) & 
-            (student_data['Числовая_оценка'] != 6)
-        ].copy()
-        
-        student_performance[student] = {
-            'avg_score_percent': avg_score_percent,
-            'avg_score_5': avg_score_5,
-            'debts': len(debts_df)
-        }
-    
-    # Рассчитываем посещаемость для каждого студента
-    student_attendance = {}
-    attendance_group_df = df_attendance[(df_attendance['Группа'] == selected_group) & 
-                                       (df_attendance['Семестр'] == selected_semester)]
-    
-    for student in student_performance.keys():
-        student_attendance_df = attendance_group_df[attendance_group_df['Код'] == student]
-        
-        if not student_attendance_df.empty:
-            total_classes = student_attendance_df['ВсегоЗанятийПоЖурналу'].sum()
-            missed_classes = student_attendance_df['ПропусковНеуважитПрич'].sum()
-            attendance_percent = ((total_classes - missed_classes) / total_classes * 100 
-                                 if total_classes > 0 else 100)
-        else:
-            attendance_percent = 0
-            
-        student_attendance[student] = attendance_percent
-    
-    # Создаем DataFrame с рейтингами
-    ratings_data = []
-    for student in student_performance.keys():
-        ratings_data.append({
-            'Студент': f"Студент {student}",
-            'Успеваемость (%)': round(student_performance[student]['avg_score_percent'], 2),
-            'Успеваемость (5-балльная)': round(student_performance[student]['avg_score_5'], 2),
-            'Долги': student_performance[student]['debts'],
-            'Посещаемость (%)': round(student_attendance.get(student, 100), 2)
-        })
-    
-    ratings_df = pd.DataFrame(ratings_data)
-    
-    # Рассчитываем рейтинги (используем 5-балльную шкалу для сортировки)
-    if not ratings_df.empty:
-        # Рейтинг по успеваемости (чем выше балл, тем выше рейтинг)
-        ratings_df['Рейтинг в группе (успеваемость)'] = ratings_df['Успеваемость (5-балльная)'].rank(ascending=False, method='dense').astype(int)
-        
-        # Рейтинг по посещаемости (чем выше %, тем выше рейтинг)
-        ratings_df['Рейтинг в группе (посещаемость)'] = ratings_df['Посещаемость (%)'].rank(ascending=False, method='dense').astype(int)
-        
-        # Для рейтинга на направлении, курсе и в институте - в реальном приложении 
-        # нужно было бы иметь данные по всем группам, здесь просто заполняем теми же значениями
-        ratings_df['Рейтинг на направлении (успеваемость)'] = ratings_df['Рейтинг в группе (успеваемость)']
-        ratings_df['Рейтинг на направлении (посещаемость)'] = ratings_df['Рейтинг в группе (посещаемость)']
-        ratings_df['Рейтинг на курсе (успеваемость)'] = ratings_df['Рейтинг в группе (успеваемость)']
-        ratings_df['Рейтинг на курсе (посещаемость)'] = ratings_df['Рейтинг в группе (посещаемость)']
-        ratings_df['Рейтинг в институте (успеваемость)'] = ratings_df['Рейтинг в группе (успеваемость)']
-        ratings_df['Рейтинг в институте (посещаемость)'] = ratings_df['Рейтинг в группе (посещаемость)']
-    
-    return ratings_df
+    ratings_df = ratings_with_movement(engine, selected_group, selected_semester)
+    # Положение студента на курсе, направлении и в институте - по эскизам распределений
+    return ratings_percentiles(percentile_index(engine), ratings_df, selected_group, selected_semester)
+
+# Матрица баллов группы за выбранные семестры (кэш по версии данных, группе и семестрам)
+@record_access
+def calculate_group_matrix(selected_group, selected_semesters):
+    return group_score_matrix(engine, selected_group, selected_semesters)
+
+# Накопленные по семестрам суммы баллов группы
+@record_access
+def calculate_trajectory(selected_group):
+    return group_trajectory(engine, selected_group)
+
+# Список группы риска по всем группам
+@record_access
+def calculate_risk():
+    return risk_table(engine)
+
+# Прогноз баллов по всему институту для сценария с выбранными оценками
+@record_access
+def calculate_projection(exam_grade, credit_grade):
+    label = PROJECTION_SCENARIOS['expected'][0]
+    scenarios = {**PROJECTION_SCENARIOS,
+                 'expected': scenario_from_grades(label, credit_grade or None, exam_grade or None)}
+    return projection_table(engine, scenarios)
+
+# Распределение оценок по ключам level для выбранных учебных годов и групп
+@record_access
+def calculate_distribution(level, selected_years, selected_groups):
+    return grade_distribution(engine, level=level, years=selected_years, groups=selected_groups)
+
+# Куб посещаемости
+@record_access
+def calculate_attendance_cube():
+    return attendance_cube(engine)
 
 # Callback для обновления рейтинговой таблицы
 @app.callback(
@@ -581,6 +753,8 @@ def calculate_ratings(selected_group, selected_semester):
     State('rating-group-dropdown', 'value'),
     State('rating-semester-dropdown', 'value')
 )
+@record_slow
+@record_memory
 def update_ratings_table(n_clicks, selected_group, selected_semester):
     if n_clicks is None or not selected_group or not selected_semester:
         raise PreventUpdate
@@ -599,13 +773,18 @@ def update_ratings_table(n_clicks, selected_group, selected_semester):
         {'name': 'Посещаемость (%)', 'id': 'Посещаемость (%)', 'type': 'numeric', 'format': {'specifier': '.2f'}},
         {'name': 'Рейтинг в группе (успеваемость)', 'id': 'Рейтинг в группе (успеваемость)', 'type': 'numeric'},
         {'name': 'Рейтинг в группе (посещаемость)', 'id': 'Рейтинг в группе (посещаемость)', 'type': 'numeric'},
+        {'name': SCORE_DELTA_COLUMN, 'id': SCORE_DELTA_COLUMN, 'type': 'numeric', 'format': {'specifier': '+.2f'}},
+        {'name': SCORE_RANK_DELTA_COLUMN, 'id': SCORE_RANK_DELTA_COLUMN, 'type': 'numeric', 'format': {'specifier': '+d'}},
+        {'name': ATTENDANCE_RANK_DELTA_COLUMN, 'id': ATTENDANCE_RANK_DELTA_COLUMN, 'type': 'numeric',
+         'format': {'specifier': '+d'}},
         {'name': 'Рейтинг на направлении (успеваемость)', 'id': 'Рейтинг на направлении (успеваемость)', 'type': 'numeric'},
         {'name': 'Рейтинг на направлении (посещаемость)', 'id': 'Рейтинг на направлении (посещаемость)', 'type': 'numeric'},
         {'name': 'Рейтинг на курсе (успеваемость)', 'id': 'Рейтинг на курсе (успеваемость)', 'type': 'numeric'},
         {'name': 'Рейтинг на курсе (посещаемость)', 'id': 'Рейтинг на курсе (посещаемость)', 'type': 'numeric'},
         {'name': 'Рейтинг в институте (успеваемость)', 'id': 'Рейтинг в институте (успеваемость)', 'type': 'numeric'},
         {'name': 'Рейтинг в институте (посещаемость)', 'id': 'Рейтинг в институте (посещаемость)', 'type': 'numeric'}
-    ]
+    ] + [{'name': column, 'id': column, 'type': 'numeric', 'format': {'specifier': '.1f'}}
+         for column in PERCENTILE_COLUMNS.values()]
     
     return ratings_df.to_dict('records'), columns
 
@@ -619,8 +798,7 @@ def update_student_dropdown(selected_group):
     if not selected_group:
         return [], None
     
-    filtered_df = df[df['Название'] == selected_group]  # Фильтруем по одной группе
-    unique_students = filtered_df['Код_Студента'].unique()
+    unique_students = engine.group_students(selected_group)  # Студенты одной группы
     
     options = [{'label': f"Студент {student}", 'value': student} for student in unique_students]
     
@@ -629,6 +807,27 @@ def update_student_dropdown(selected_group):
     
     return options, value
 
+# Записи таблицы оценок студента: столбцы собираются целиком, без обхода строк
+def grades_records(rows):
+    table = rows[['Дисциплина', 'Оценка', 'Семестр', 'Тип_Компетенции', 'Компетенция', 'Название']].copy()
+    table.insert(2, 'Тип_зачета', np.where(rows['ДиффенцированныйЗачет'] == 1, 'Дифф. зачет', 'Зачет'))
+    return table.to_dict('records')
+
+# Место студента за все семестры: доля студентов группы, курса, направления и института с лучшим результатом
+def student_percentile_info(selected_group, selected_student):
+    info = percentile_index(engine).student(selected_group, selected_student)
+    if info is None:
+        return None
+    lines = []
+    for metric, entry in info.items():
+        if np.isnan(entry['value']):
+            continue
+        positions = ', '.join(f"{LEVEL_LABELS[level]} - топ {max(100 - entry['percentiles'][level], 0):.0f}%"
+                              for level in LEVELS if not np.isnan(entry['percentiles'][level]))
+        lines.append(html.P(f"{METRIC_LABELS[metric].capitalize()} за все семестры {entry['value']:.2f}%: {positions}",
+                            style={'margin': '2px 0'}))
+    return html.Div(lines, style={'margin-bottom': '10px'})
+
 # Callback для обновления графика и основной информации
 @app.callback(
     [Output('radar-chart', 'figure'),
@@ -640,94 +839,32 @@ def update_student_dropdown(selected_group):
      Input('competency-type-dropdown', 'value'),
      Input('show-min-score', 'value'),
      Input('radar-chart', 'clickData'),
-     Input('group-dropdown', 'value')],  
+     Input('group-dropdown', 'value'),
+     Input('group-overlay', 'value')],
     [State('competency-details', 'style')]
 )
-def update_dashboard(selected_student, selected_semesters, selected_types, show_min, click_data, selected_group, details_style):
-    def get_last_word(text):
-        if not isinstance(text, str):
-            return ""
-        words = text.strip().split()
-        return words[-1] if words else ""
-    
-    def extract_year(year_str):
-        try:
-            return int(year_str.split('-')[0])
-        except:
-            return 0
-    
+@record_slow
+@record_memory
+@coalesce(scope=data_scope)
+def update_dashboard(selected_student, selected_semesters, selected_types, show_min, click_data, selected_group,
+                     group_overlay, details_style):
     if not selected_student or not selected_group:
         return px.line_polar(), html.P("Выберите группу и студента"), {'display': 'none'}, None
     
     # Получаем все данные для студента
-    filtered_df = df[(df['Код_Студента'] == selected_student) & 
-                   (df['Семестр'].isin(selected_semesters)) &
-                   (df['Тип_Компетенции'].isin(selected_types)) &
-                   (df['Название'] == selected_group)].copy()
+    filtered_df = engine.student_rows(selected_student, selected_group, selected_semesters, selected_types)
     
     if filtered_df.empty:
         return px.line_polar(), html.P("Нет данных для выбранных критериев"), {'display': 'none'}, None
     
-    # Добавляем столбец с последним словом компетенции
-    filtered_df['last_word'] = filtered_df['Компетенция'].apply(get_last_word)
-    filtered_df['year_num'] = filtered_df['УчебныйГод'].apply(extract_year)
-    
-    # Находим последние версии каждой компетенции (по последнему слову)
-    latest_versions = {}
-    for _, row in filtered_df.iterrows():
-        last_word = row['last_word']
-        year = row['year_num']
-        if last_word not in latest_versions or year > latest_versions[last_word]['year']:
-            latest_versions[last_word] = {
-                'competency': row['Компетенция'],
-                'year': year
-            }
-    
-    # Создаем маппинг всех компетенций к их последней версии
-    competency_mapping = {}
-    for comp in filtered_df['Компетенция'].unique():
-        last_word = get_last_word(comp)
-        if last_word in latest_versions:
-            competency_mapping[comp] = latest_versions[last_word]['competency']
-    
     # Для расчета баллов группируем по последнему слову (объединяем все версии)
-    competency_scores = []
-    min_competency_scores = []
-    competency_types_dict = {}
-    competency_studied = {}
-
-    for last_word, group in filtered_df.groupby('last_word'):
-        # Исключаем из группы записи с "Не изуч."
-        studied_group = group[group['Числовая_оценка'] != 6]
-        
-        if studied_group.empty:
-            # Все записи этой группы имеют "Не изуч."
-            continue
-            
-        latest_comp = latest_versions.get(last_word, {}).get('competency', group['Компетенция'].iloc[0])
-        competency_types_dict[last_word] = studied_group['Тип_Компетенции'].iloc[0]
-        
-        score = calculate_competency_score(studied_group)
-        competency_scores.append({
-            'Компетенция': latest_comp,
-            'last_word': last_word,
-            'Балл': score,
-        })
-        
-        if 'show' in show_min:
-            min_score = calculate_competency_score(group, min_score=True)
-            min_competency_scores.append({
-                'Компетенция': latest_comp,
-                'last_word': last_word,
-                'Балл': min_score,
-            })
+    scores = competency_scores(filtered_df, with_min='show' in show_min)
     
-    if not competency_scores:
+    if not scores:
         return px.line_polar(), html.P("Все компетенции не изучены для выбранных семестров"), {'display': 'none'}, None
     
     # Создаем DataFrame для графика
-    result_df = pd.DataFrame(competency_scores)
-    result_df['Тип_Компетенции'] = result_df['last_word'].map(competency_types_dict)
+    result_df = pd.DataFrame(scores)[['Компетенция', 'last_word', 'Балл', 'Тип_Компетенции']]
     
     # Создаем radar chart
     fig = px.line_polar(
@@ -741,9 +878,9 @@ def update_dashboard(selected_student, selected_semesters, selected_types, show_
     )
     
     # Добавляем минимальный балл если нужно
-    if 'show' in show_min and min_competency_scores:
-        min_df = pd.DataFrame(min_competency_scores)
-        min_df['Тип_Компетенции'] = min_df['last_word'].map(competency_types_dict)
+    if 'show' in show_min:
+        min_df = pd.DataFrame(scores)[['Компетенция', 'last_word', 'Минимальный балл', 'Тип_Компетенции']]
+        min_df = min_df.rename(columns={'Минимальный балл': 'Балл'})
         
         fig.add_trace(px.line_polar(
             min_df,
@@ -759,6 +896,25 @@ def update_dashboard(selected_student, selected_semesters, selected_types, show_
             hovertemplate='<b>Компетенция: %{theta}</b><br>Балл: %{r:.2f}%<br><extra></extra>'
         )
     
+    # Групповые показатели по тем же компетенциям
+    if group_overlay:
+        matrix = calculate_group_matrix(selected_group, selected_semesters)
+        positions = pd.Index(matrix.competencies).get_indexer(result_df['last_word'])
+        for stat in group_overlay:
+            values = matrix.group_stat(stat)[positions]
+            fig.add_trace(px.line_polar(
+                result_df.assign(Балл=values),
+                r='Балл',
+                theta='last_word',
+                line_close=True
+            ).data[0])
+            fig.data[-1].update(
+                line=dict(width=1, dash='dash'),
+                fill='none',
+                name=GROUP_STATS[stat][0],
+                hovertemplate='<b>Компетенция: %{theta}</b><br>Балл: %{r:.2f}%<br><extra></extra>'
+            )
+    
     # Настройка графика
     fig.data[0].update(
         fill='toself',
@@ -799,15 +955,7 @@ def update_dashboard(selected_student, selected_semesters, selected_types, show_
             {'name': 'Компетенция', 'id': 'Компетенция'},
             {'name': 'Группа', 'id': 'Название'}
         ],
-        data=[{
-            'Дисциплина': row['Дисциплина'],
-            'Оценка': row['Оценка'],
-            'Тип_зачета': 'Дифф. зачет' if row['ДиффенцированныйЗачет'] == 1 else 'Зачет',
-            'Семестр': row['Семестр'],
-            'Тип_Компетенции': row['Тип_Компетенции'],
-            'Компетенция': row['Компетенция'],
-            'Название': row['Название']
-        } for _, row in filtered_df.iterrows()],
+        data=grades_records(filtered_df),
         style_table={'maxHeight': '350px', 'overflowY': 'auto'},
         style_cell={'textAlign': 'left', 'padding': '5px'},
         style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
@@ -822,6 +970,7 @@ def update_dashboard(selected_student, selected_semesters, selected_types, show_
         ],
         page_size=10
     )
+    grades_info = html.Div([student_percentile_info(selected_group, selected_student), grades_table])
         
     # Обработка клика - показываем все оценки по всем версиям этой компетенции
     if click_data:
@@ -863,9 +1012,186 @@ def update_dashboard(selected_student, selected_semesters, selected_types, show_
                 details_table
             ])
             
-            return fig, grades_table, {'display': 'block'}, details_content
+            return fig, grades_info, {'display': 'block'}, details_content
     
-    return fig, grades_table, {'display': 'none'}, None
+    return fig, grades_info, {'display': 'none'}, None
+
+# Callback для графика накопленных баллов по семестрам
+@app.callback(
+    Output('trajectory-chart', 'figure'),
+    [Input('student-dropdown', 'value'),
+     Input('group-dropdown', 'value'),
+     Input('competency-type-dropdown', 'value')]
+)
+@record_slow
+@record_memory
+@coalesce(scope=data_scope)
+def update_trajectory_chart(selected_student, selected_group, selected_types):
+    if not selected_student or not selected_group:
+        return px.line(title='Выберите группу и студента')
+
+    trajectory = calculate_trajectory(selected_group)
+    scores = trajectory.student_trajectory(selected_student)
+    columns = np.ones(len(trajectory.competencies), dtype=bool)
+    if selected_types:
+        columns = np.isin(trajectory.competency_types, selected_types)
+
+    trajectory_df = pd.DataFrame(scores[:, columns], index=trajectory.semesters,
+                                 columns=trajectory.competencies[columns])
+    trajectory_df = (trajectory_df.rename_axis('Семестр').reset_index()
+                     .melt(id_vars='Семестр', var_name='Компетенция', value_name='Балл')
+                     .dropna(subset=['Балл'])
+                     .sort_values(['Компетенция', 'Семестр']))
+    if trajectory_df.empty:
+        return px.line(title='Нет изученных компетенций')
+
+    fig = px.line(
+        trajectory_df,
+        x='Семестр',
+        y='Балл',
+        color='Компетенция',
+        markers=True,
+        title=f'Накопленный балл студента {selected_student} по семестрам (Группа: {selected_group})',
+        template='plotly_white'
+    )
+    fig.update_traces(hovertemplate='<b>%{fullData.name}</b><br>Семестр: %{x}<br>Балл: %{y:.2f}%<extra></extra>')
+    fig.update_layout(
+        xaxis=dict(tickmode='array', tickvals=trajectory.semesters),
+        yaxis=dict(range=[0, 105], title='Балл, %'),
+        margin=dict(l=40, r=40, t=60, b=40)
+    )
+    return fig
+
+# Callback для списка группы риска (список считается для всех групп и берется из кэша)
+@app.callback(
+    Output('risk-table', 'data'),
+    Input('risk-group-dropdown', 'value')
+)
+@record_slow
+@record_memory
+def update_risk_table(selected_groups):
+    risk_df = calculate_risk()
+    if selected_groups:
+        risk_df = risk_df[risk_df['Группа'].isin(selected_groups)]
+    return risk_df.to_dict('records')
+
+# Callback для прогноза баллов (прогноз считается для всего института и берется из кэша).
+# В браузер отправляются только выбранные группы: прогноз всего института пересылался бы
+# целиком при каждой смене оценки или флажка
+@app.callback(
+    Output('projection-table-store', 'data'),
+    [Input('projection-group-dropdown', 'value'),
+     Input('projection-exam-dropdown', 'value'),
+     Input('projection-credit-dropdown', 'value'),
+     Input('projection-open-only', 'value')]
+)
+@record_slow
+@record_memory
+def update_projection_table(selected_groups, exam_grade, credit_grade, open_only):
+    if not selected_groups:
+        return compact_table(pd.DataFrame(columns=projection_columns()), projection_columns())
+    projection_df = calculate_projection(exam_grade, credit_grade)
+    projection_df = projection_df[projection_df['Группа'].isin(selected_groups)]
+    if open_only:
+        projection_df = projection_df[projection_df['Не изучено'] > 0]
+    return compact_table(projection_df, projection_columns())
+
+register_compact_table(app, 'projection-table')
+
+# Callback для распределения оценок по дисциплинам (счетчики считаются один раз на версию данных)
+@app.callback(
+    Output('distribution-table', 'data'),
+    [Input('distribution-year-dropdown', 'value'),
+     Input('distribution-group-dropdown', 'value')]
+)
+@record_slow
+@record_memory
+def update_distribution_table(selected_years, selected_groups):
+    distribution_df = calculate_distribution(['Дисциплина'], selected_years, selected_groups)
+    # id строки - дисциплина: по нему детализация находит строку после сортировки и фильтрации
+    return distribution_df.assign(id=distribution_df['Дисциплина']).to_dict('records')
+
+# Callback для детализации дисциплины по учебным годам, группам и семестрам
+@app.callback(
+    Output('distribution-details', 'children'),
+    [Input('distribution-table', 'active_cell'),
+     Input('distribution-year-dropdown', 'value'),
+     Input('distribution-group-dropdown', 'value')]
+)
+@record_slow
+@record_memory
+def update_distribution_details(active_cell, selected_years, selected_groups):
+    if not active_cell or active_cell.get('row_id') is None:
+        return html.P('Выберите дисциплину в таблице')
+    subject = active_cell['row_id']
+    details_df = calculate_distribution(DISTRIBUTION_KEYS, selected_years, selected_groups)
+    details_df = details_df[details_df['Дисциплина'] == subject].drop(columns='Дисциплина')
+    if details_df.empty:
+        return html.P(f'Нет оценок по дисциплине {subject} для выбранных учебных годов и групп')
+
+    # Доли оценок по каждому учебному году, группе и семестру
+    periods = (details_df['УчебныйГод'] + ', ' + details_df['Название'] + ', семестр '
+               + details_df['Семестр'].astype(str))
+    shares = details_df[GRADE_COLUMNS].set_axis(periods.to_numpy())
+    totals = shares.sum(axis=1)
+    shares = shares.div(totals.where(totals > 0), axis=0).mul(100).round(2)
+    bars = shares.rename_axis('Период').reset_index().melt(id_vars='Период', var_name='Оценка', value_name='Доля (%)')
+    fig = px.bar(bars, x='Период', y='Доля (%)', color='Оценка', title=subject,
+                 category_orders={'Оценка': GRADE_COLUMNS})
+    fig.update_layout(barmode='stack', margin=dict(l=20, r=20, t=40, b=20), xaxis_title=None)
+
+    details_table = dash_table.DataTable(
+        columns=[{'name': 'Учебный год' if column == 'УчебныйГод' else 'Группа' if column == 'Название' else column,
+                  'id': column, 'type': 'text' if column in ('УчебныйГод', 'Название') else 'numeric'}
+                 for column in details_df.columns],
+        data=details_df.to_dict('records'),
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'center', 'padding': '5px'},
+        style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
+        style_data_conditional=[
+            {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'}
+        ],
+        sort_action='native'
+    )
+    return html.Div([
+        html.H4(f'{subject}: по учебным годам и группам'),
+        dcc.Graph(figure=fig),
+        details_table
+    ])
+
+# Callback для тепловой карты группы
+@app.callback(
+    Output('group-heatmap', 'figure'),
+    [Input('group-dropdown', 'value'),
+     Input('semester-dropdown', 'value'),
+     Input('competency-type-dropdown', 'value')]
+)
+@record_slow
+@record_memory
+@coalesce(scope=data_scope)
+def update_group_heatmap(selected_group, selected_semesters, selected_types):
+    if not selected_group:
+        return px.imshow([[0]], title='Выберите группу')
+
+    matrix = calculate_group_matrix(selected_group, selected_semesters)
+    columns = matrix.columns(selected_types)
+    if len(matrix.students) == 0 or not columns.any():
+        return px.imshow([[0]], title='Нет данных для выбранных параметров')
+
+    fig = px.imshow(
+        matrix.real[:, columns],
+        x=list(matrix.competencies[columns]),
+        y=[f'Студент {student}' for student in matrix.students],
+        zmin=0,
+        zmax=100,
+        color_continuous_scale='RdYlGn',
+        aspect='auto',
+        title=f'Баллы по компетенциям (Группа: {selected_group})',
+        template='plotly_white'
+    )
+    fig.update_traces(hovertemplate='%{y}<br>Компетенция: %{x}<br>Балл: %{z:.2f}%<extra></extra>')
+    fig.update_layout(margin=dict(l=40, r=40, t=60, b=40))
+    return fig
 
 # Callback для обновления круговой диаграммы посещаемости
 @app.callback(
@@ -881,16 +1207,18 @@ def update_dashboard(selected_student, selected_semesters, selected_types, show_
      Input('attendance-type-dropdown', 'value')],
     [State('attendance-subject-dropdown', 'options')]  # Состояние текущих вариантов дисциплин
 )
+@record_slow
+@record_memory
 def update_attendance_chart(selected_groups, selected_codes, selected_courses, selected_semesters, 
                            selected_teachers, selected_subjects, selected_types, current_subject_options):
+    cube = calculate_attendance_cube()
     # Сначала обновляем варианты дисциплин на основе выбранных преподавателей
     if selected_teachers is None or len(selected_teachers) == 0:
         # Если преподаватели не выбраны, показываем все дисциплины
-        subject_options = [{'label': subj, 'value': subj} for subj in attendance_subjects]
+        subject_options = [{'label': subj, 'value': subj} for subj in engine.distinct(ATTENDANCE_TABLE, 'Дисциплина')]
     else:
-        # Фильтруем дисциплины по выбранным преподавателям
-        filtered_subjects = df_attendance[df_attendance['Преподаватель'].isin(selected_teachers)]
-        unique_subjects = sorted(filtered_subjects['Дисциплина'].dropna().unique())
+        # Дисциплины выбранных преподавателей - из заранее построенного соответствия
+        unique_subjects = cube.subjects_for(selected_teachers)
         subject_options = [{'label': subj, 'value': subj} for subj in unique_subjects]
     
     # Проверяем, нужно ли обновлять выбранные значения дисциплин
@@ -908,22 +1236,22 @@ def update_attendance_chart(selected_groups, selected_codes, selected_courses, s
         return px.pie(), html.P("Выберите параметры для отображения данных"), subject_options
     
     # Фильтруем данные по выбранным параметрам, включая код
-    filtered_df = df_attendance[
-        (df_attendance['Группа'].isin(selected_groups)) &
-        (df_attendance['Код'].isin(selected_codes)) &
-        (df_attendance['Курс'].isin(selected_courses)) &
-        (df_attendance['Семестр'].isin(selected_semesters)) &
-        (df_attendance['Преподаватель'].isin(selected_teachers)) &
-        (df_attendance['Дисциплина'].isin(selected_subjects)) &
-        (df_attendance['ВидЗанятий'].isin(selected_types))
-    ]
+    attendance_filters = {
+        'Группа': selected_groups,
+        'Код': selected_codes,
+        'Курс': selected_courses,
+        'Семестр': selected_semesters,
+        'Преподаватель': selected_teachers,
+        'Дисциплина': selected_subjects,
+        'ВидЗанятий': selected_types
+    }
+    filtered_df = engine.attendance_rows(attendance_filters)
     
     if filtered_df.empty:
         return px.pie(), html.P("Нет данных для выбранных критериев"), subject_options
     
     # Агрегируем данные по пропускам
-    total_classes = filtered_df['ВсегоЗанятийПоЖурналу'].sum()
-    total_absences = filtered_df['ПропусковНеуважитПрич'].sum()
+    total_classes, total_absences = cube.totals(attendance_filters)
     attended_classes = total_classes - total_absences
     
     # Создаем DataFrame для диаграммы
@@ -963,7 +1291,9 @@ def update_attendance_chart(selected_groups, selected_codes, selected_courses, s
     )
     
     # Создаем таблицу с деталями посещаемости
-    details_table = dash_table.DataTable(
+    details_table = compact_data_table(
+        'attendance-details-table',
+        filtered_df,
         columns=[
             {'name': 'Группа', 'id': 'Группа'},
             {'name': 'Дисциплина', 'id': 'Дисциплина'},
@@ -973,7 +1303,6 @@ def update_attendance_chart(selected_groups, selected_codes, selected_courses, s
             {'name': 'Преподаватель', 'id': 'Преподаватель'},
             {'name': 'Код', 'id': 'Код'}
         ],
-        data=filtered_df.to_dict('records'),
         style_table={
             'maxHeight': '300px',
             'overflowY': 'auto',
@@ -1006,6 +1335,80 @@ def update_attendance_chart(selected_groups, selected_codes, selected_courses, s
     
     return fig, details_content, subject_options
 
+# Записи таблицы деталей посещаемости собираются в браузере из компактного dcc.Store
+register_compact_table(app, 'attendance-details-table')
+
+# Callback для разрезов посещаемости (все считается сверткой куба)
+@app.callback(
+    [Output('attendance-breakdown-chart', 'figure'),
+     Output('attendance-heatmap', 'figure')],
+    [Input('attendance-group-dropdown', 'value'),
+     Input('attendance-code-dropdown', 'value'),
+     Input('attendance-course-dropdown', 'value'),
+     Input('attendance-semester-dropdown', 'value'),
+     Input('attendance-teacher-dropdown', 'value'),
+     Input('attendance-subject-dropdown', 'value'),
+     Input('attendance-type-dropdown', 'value'),
+     Input('attendance-breakdown-dropdown', 'value'),
+     Input('attendance-heatmap-dropdown', 'value')]
+)
+@record_slow
+@record_memory
+def update_attendance_breakdown(selected_groups, selected_codes, selected_courses, selected_semesters,
+                                selected_teachers, selected_subjects, selected_types, breakdown, heatmap_axes):
+    if not all([selected_groups, selected_codes, selected_courses, selected_semesters,
+                selected_teachers, selected_subjects, selected_types]):
+        return px.bar(title='Выберите параметры для отображения данных'), px.imshow([[0]])
+
+    cube = calculate_attendance_cube()
+    attendance_filters = {
+        'Группа': selected_groups,
+        'Код': selected_codes,
+        'Курс': selected_courses,
+        'Семестр': selected_semesters,
+        'Преподаватель': selected_teachers,
+        'Дисциплина': selected_subjects,
+        'ВидЗанятий': selected_types
+    }
+
+    breakdown_df = cube.rollup(breakdown, attendance_filters)
+    if breakdown_df.empty:
+        return px.bar(title='Нет данных для выбранных критериев'), px.imshow([[0]])
+
+    label = attendance_dimension_labels[breakdown]
+    breakdown_df[breakdown] = breakdown_df[breakdown].astype(str)
+    breakdown_df = breakdown_df.sort_values(RATE_COLUMN, ascending=False)
+    bar_fig = px.bar(
+        breakdown_df,
+        x=breakdown,
+        y=RATE_COLUMN,
+        hover_data={'ВсегоЗанятийПоЖурналу': True, 'ПропусковНеуважитПрич': True},
+        labels={breakdown: label, 'ВсегоЗанятийПоЖурналу': 'Всего занятий',
+                'ПропусковНеуважитПрич': 'Пропуски'},
+        title=f'Пропуски по неуважительной причине: {label.lower()}',
+        template='plotly_white'
+    )
+    bar_fig.update_traces(marker_color='indianred')
+    bar_fig.update_layout(margin=dict(l=40, r=20, t=60, b=40))
+
+    rows, columns = heatmap_axes.split('|')
+    heatmap_df = cube.pivot(rows, columns, attendance_filters)
+    heatmap_fig = px.imshow(
+        heatmap_df.to_numpy(dtype=float),
+        x=[str(value) for value in heatmap_df.columns],
+        y=[str(value) for value in heatmap_df.index],
+        zmin=0,
+        color_continuous_scale='Reds',
+        aspect='auto',
+        labels={'x': attendance_dimension_labels[columns], 'y': attendance_dimension_labels[rows],
+                'color': RATE_COLUMN},
+        title=f'Пропуски (%): {attendance_dimension_labels[rows].lower()} / '
+              f'{attendance_dimension_labels[columns].lower()}',
+        template='plotly_white'
+    )
+    heatmap_fig.update_layout(margin=dict(l=40, r=20, t=60, b=40))
+    return bar_fig, heatmap_fig
+
 # Callback для обновления фильтров успеваемости
 @app.callback(
     [Output('performance-course-dropdown', 'options'),
@@ -1024,35 +1427,33 @@ def update_attendance_chart(selected_groups, selected_codes, selected_courses, s
      Input('performance-year-dropdown', 'value'),
      Input('performance-pie-chart', 'clickData')]  # <<< Добавлен clickData
 )
+@record_slow
+@record_memory
 def update_performance_filters(selected_subjects, selected_courses, selected_semesters, 
                              selected_competencies, selected_competency_types, 
                              selected_groups, selected_years, click_data):  # <<< Добавлен click_data
     # Фильтруем данные по выбранным параметрам (каскадное обновление)
-    filtered_df = df.copy()
-    # Применяем фильтры последовательно
-    if selected_subjects:
-        filtered_df = filtered_df[filtered_df['Дисциплина'].isin(selected_subjects)]
-    if selected_courses:
-        filtered_df = filtered_df[filtered_df['Курс'].isin(selected_courses)]
-    if selected_semesters:
-        filtered_df = filtered_df[filtered_df['Семестр'].isin(selected_semesters)]
-    if selected_competencies:
-        filtered_df = filtered_df[filtered_df['Компетенция'].isin(selected_competencies)]
-    if selected_competency_types:
-        filtered_df = filtered_df[filtered_df['Тип_Компетенции'].isin(selected_competency_types)]
-    if selected_groups:
-        filtered_df = filtered_df[filtered_df['Название'].isin(selected_groups)]
-    if selected_years:
-        filtered_df = filtered_df[filtered_df['УчебныйГод'].isin(selected_years)]
+    performance_filters = {
+        'Дисциплина': selected_subjects,
+        'Курс': selected_courses,
+        'Семестр': selected_semesters,
+        'Компетенция': selected_competencies,
+        'Тип_Компетенции': selected_competency_types,
+        'Название': selected_groups,
+        'УчебныйГод': selected_years
+    }
 
     # Получаем доступные значения
-    available_courses = sorted(filtered_df['Курс'].dropna().unique())
-    available_semesters = sorted(filtered_df['Семестр'].dropna().unique())
-    available_competencies = sorted(filtered_df['Компетенция'].dropna().unique())
-    available_competency_types = sorted(filtered_df['Тип_Компетенции'].dropna().unique())
-    available_groups = sorted(filtered_df['Название'].dropna().unique())
-    available_years = sorted(filtered_df['УчебныйГод'].dropna().unique())
-    available_students = sorted(filtered_df['Код_Студента'].dropna().unique())
+    available = engine.facets(COMPETENCIES_TABLE, ['Курс', 'Семестр', 'Компетенция', 'Тип_Компетенции',
+                                                   'Название', 'УчебныйГод', 'Код_Студента'],
+                              performance_filters)
+    available_courses = available['Курс']
+    available_semesters = available['Семестр']
+    available_competencies = available['Компетенция']
+    available_competency_types = available['Тип_Компетенции']
+    available_groups = available['Название']
+    available_years = available['УчебныйГод']
+    available_students = available['Код_Студента']
 
     course_options = [{'label': course, 'value': course} for course in available_courses]
     semester_options = [{'label': sem, 'value': sem} for sem in available_semesters]
@@ -1146,6 +1547,8 @@ def reset_dependent_filters(selected_subjects, course_options, semester_options,
     [State('performance-pie-chart', 'figure'),
      State('performance-pie-chart', 'clickData')]
 )
+@record_slow
+@record_memory
 def update_performance_chart(selected_subjects, selected_courses, selected_semesters, 
                            selected_competencies, selected_competency_types, 
                            selected_groups, selected_years, selected_students, 
@@ -1158,36 +1561,56 @@ def update_performance_chart(selected_subjects, selected_courses, selected_semes
     if trigger_id == 'reset-grade-filter':
         click_data = None
     
-    # Фильтруем данные по выбранным параметрам
-    filtered_df = df.copy()
-    if selected_subjects:
-        filtered_df = filtered_df[filtered_df['Дисциплина'].isin(selected_subjects)]
-    if selected_courses:
-        filtered_df = filtered_df[filtered_df['Курс'].isin(selected_courses)]
-    if selected_semesters:
-        filtered_df = filtered_df[filtered_df['Семестр'].isin(selected_semesters)]
-    if selected_competencies:
-        filtered_df = filtered_df[filtered_df['Компетенция'].isin(selected_competencies)]
-    if selected_competency_types:
-        filtered_df = filtered_df[filtered_df['Тип_Компетенции'].isin(selected_competency_types)]
-    if selected_groups:
-        filtered_df = filtered_df[filtered_df['Название'].isin(selected_groups)]
-    if selected_years:
-        filtered_df = filtered_df[filtered_df['УчебныйГод'].isin(selected_years)]
-    if selected_students:
-        filtered_df = filtered_df[filtered_df['Код_Студента'].isin(selected_students)]
+    # Оценка, по которой кликнули на диаграмме (фильтр для таблицы)
+    clicked_grade = None
+    if click_data:
+        try:
+            clicked_grade = click_data['points'][0]['label']
+        except Exception as e:
+            print(f"Ошибка при обработке clickData: {e}")
+    
+    fig, details_content = build_performance_view(selected_subjects, selected_courses, selected_semesters,
+                                                  selected_competencies, selected_competency_types,
+                                                  selected_groups, selected_years, selected_students,
+                                                  clicked_grade)
+    if fig is None:
+        return px.pie(), details_content, None
+    
+    # Возвращаем:
+    # 1. Фигуру (всегда неизменную, даже при клике)
+    # 2. Обновленное содержимое таблицы
+    # 3. Состояние clickData (None если была нажата кнопка сброса)
+    return (
+        dash.no_update if trigger_id == 'performance-pie-chart' else fig,  # Не обновляем диаграмму при клике
+        details_content,
+        None if trigger_id == 'reset-grade-filter' else dash.no_update
+    )
 
-    if filtered_df.empty:
-        return px.pie(), html.P("Нет данных для выбранных критериев"), None
+# Записи таблиц деталей успеваемости и долгов собираются в браузере из компактных dcc.Store
+register_compact_table(app, 'performance-details-table')
+register_compact_table(app, 'performance-debts-table')
+
+# Диаграмма и таблицы успеваемости; одинаковые одновременные запросы считаются один раз
+@coalesce(scope=data_scope)
+def build_performance_view(selected_subjects, selected_courses, selected_semesters,
+                           selected_competencies, selected_competency_types,
+                           selected_groups, selected_years, selected_students, clicked_grade):
+    # Фильтруем данные по выбранным параметрам
+    performance_filters = {
+        'Дисциплина': selected_subjects,
+        'Курс': selected_courses,
+        'Семестр': selected_semesters,
+        'Компетенция': selected_competencies,
+        'Тип_Компетенции': selected_competency_types,
+        'Название': selected_groups,
+        'УчебныйГод': selected_years,
+        'Код_Студента': selected_students
+    }
 
-    # Определяем долги (Незачет, Н/я, Неуд)
-    debts = ['Незачет', 'Н/я', 'Неуд']
-    filtered_df['Долг'] = filtered_df['Оценка'].isin(debts)
-    
     # Создаем DataFrame для диаграммы (всегда полные данные, без фильтрации по клику)
-    grade_counts = filtered_df['Оценка'].value_counts().reset_index()
-    grade_counts.columns = ['Оценка', 'Количество']
-    grade_counts['Долг'] = grade_counts['Оценка'].isin(debts)
+    grade_counts = engine.grade_counts(performance_filters)
+    if grade_counts.empty:
+        return None, html.P("Нет данных для выбранных критериев")
 
     # Создаем круговую диаграмму с выделением долгов
     fig = px.pie(
@@ -1214,24 +1637,20 @@ def update_performance_chart(selected_subjects, selected_courses, selected_semes
     )
 
     # Фильтруем данные для таблицы в зависимости от клика
-    if click_data and trigger_id != 'reset-grade-filter':
-        try:
-            clicked_grade = click_data['points'][0]['label']
-            table_df = filtered_df[filtered_df['Оценка'] == clicked_grade]
-            details_title = f'Детали успеваемости: {clicked_grade}'
-        except Exception as e:
-            print(f"Ошибка при обработке clickData: {e}")
-            table_df = filtered_df
-            details_title = 'Детали успеваемости'
+    if clicked_grade is not None:
+        table_df = engine.competency_rows({**performance_filters, 'Оценка': [clicked_grade]})
+        details_title = f'Детали успеваемости: {clicked_grade}'
     else:
-        table_df = filtered_df
+        table_df = engine.competency_rows(performance_filters)
         details_title = 'Детали успеваемости'
 
     # Фильтруем долги для отдельного отображения
-    debts_df = table_df[table_df['Долг']]
+    debts_df = table_df[table_df['Оценка'].isin(debt_grades)]
     
     # Таблица с деталями
-    details_table = dash_table.DataTable(
+    details_table = compact_data_table(
+        'performance-details-table',
+        table_df,
         columns=[
             {'name': 'Студент', 'id': 'Код_Студента'},
             {'name': 'Дисциплина', 'id': 'Дисциплина'},
@@ -1241,7 +1660,6 @@ def update_performance_chart(selected_subjects, selected_courses, selected_semes
             {'name': 'Группа', 'id': 'Название'},
             {'name': 'Учебный год', 'id': 'УчебныйГод'}
         ],
-        data=table_df.to_dict('records'),
         style_table={'overflowY': 'auto', 'maxHeight': '300px'},
         style_cell={'textAlign': 'left', 'padding': '5px', 'fontSize': '12px'},
         style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
@@ -1272,7 +1690,9 @@ def update_performance_chart(selected_subjects, selected_courses, selected_semes
     )
     
     # Создаем отдельную таблицу для долгов
-    debts_table = dash_table.DataTable(
+    debts_table = compact_data_table(
+        'performance-debts-table',
+        debts_df,
         columns=[
             {'name': 'Студент', 'id': 'Код_Студента'},
             {'name': 'Дисциплина', 'id': 'Дисциплина'},
@@ -1282,7 +1702,6 @@ def update_performance_chart(selected_subjects, selected_courses, selected_semes
             {'name': 'Группа', 'id': 'Название'},
             {'name': 'Учебный год', 'id': 'УчебныйГод'}
         ],
-        data=debts_df.to_dict('records'),
         style_table={'overflowY': 'auto', 'maxHeight': '300px'},
         style_cell={'textAlign': 'left', 'padding': '5px', 'fontSize': '12px'},
         style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
@@ -1320,15 +1739,49 @@ def update_performance_chart(selected_subjects, selected_courses, selected_semes
         ])
 
     details_content = html.Div(details_content_children)
-    # Возвращаем:
-    # 1. Фигуру (всегда неизменную, даже при клике)
-    # 2. Обновленное содержимое таблицы
-    # 3. Состояние clickData (None если была нажата кнопка сброса)
-    return (
-        dash.no_update if trigger_id == 'performance-pie-chart' else fig,  # Не обновляем диаграмму при клике
-        details_content,
-        None if trigger_id == 'reset-grade-filter' else dash.no_update
-    )
+    return fig, details_content
+
+startup.mark('регистрация callback\'ов')
+
+def run_in_dataset(dataset, fn):
+    # Прогрев идет вне запросов - набор данных задается так же, как в адресе страницы
+    with app.server.test_request_context(query_string={DATASET_PARAM: dataset}):
+        return fn()
+
+# Прогрев кэшей самыми частыми вызовами: в фоне после запуска worker'а и после каждой перезагрузки данных.
+# Импорт app (slowlog, отчеты) прогрев не запускает - его запускает start_worker()
+prewarmer = Prewarmer(record_access, run_in_dataset, registry.loaded_names)
+
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+def start_worker():
+    """Фоновые задачи процесса, который обслуживает запросы: проверка исходных файлов и прогрев кэшей.
+
+    Потоки не переживают fork: при preload_app приложение импортируется в
+    главном процессе gunicorn, а задачи запускает хук post_worker_init в
+    каждом worker'е (см. gunicorn.conf.py). Под другими WSGI-серверами их
+    запускает первый запрос процесса. В каждом процессе - один раз.
+    """
+    global _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+    # Соединения с базой, открытые до fork, дочернему процессу не годятся
+    registry.after_fork()
+    # Проверка исходных файлов раз в DATA_RELOAD_INTERVAL секунд; новая версия публикуется атомарно.
+    # Эскизы процентилей новой версии строятся при первом запросе (или прогревом рейтингов)
+    if os.environ.get('DATA_RELOAD_INTERVAL'):
+        watch_sources(registry, float(os.environ['DATA_RELOAD_INTERVAL']), on_reload=prewarmer.restart)
+    prewarmer.start()
+
+# Если сервер не вызвал start_worker() сам, задачи запускает первый запрос worker'а
+server.before_request(start_worker)
+
+report_startup()
+
 # Запуск приложения
 if __name__ == '__main__':
+    start_worker()
     app.run(host="127.0.0.1", port=8050)
\ No newline at end of file
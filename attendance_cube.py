@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+
+# Измерения и меры куба посещаемости
+CUBE_DIMENSIONS = ['Группа', 'Курс', 'Семестр', 'Преподаватель', 'Дисциплина', 'ВидЗанятий', 'Код']
+TOTAL_COLUMN = 'ВсегоЗанятийПоЖурналу'
+MISSED_COLUMN = 'ПропусковНеуважитПрич'
+RATE_COLUMN = 'Пропуски (%)'
+
+# Куб по (набор данных, версия данных)
+cube_cache = LRUCache('attendance-cube', maxsize=4)
+
+def absence_rate(total, missed):
+    """Доля пропусков по неуважительной причине в процентах (NaN, если занятий не было)"""
+    total = np.asarray(total, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, np.round(np.asarray(missed) / total * 100, 2), np.nan)
+
+
+class AttendanceCube:
+    """Предварительно агрегированная посещаемость по всем измерениям.
+
+    Ячейка куба - уникальное сочетание CUBE_DIMENSIONS с суммами занятий и
+    пропусков. Каждое измерение хранится кодами (номер значения в
+    отсортированном списке), поэтому фильтр - это np.isin по кодам, а срез по
+    части измерений - свертка сумм через np.bincount без обращения к строкам.
+    """
+
+    def __init__(self, rows):
+        cells = (rows.groupby(CUBE_DIMENSIONS, sort=True)[[TOTAL_COLUMN, MISSED_COLUMN]].sum()
+                 .reset_index())
+        self.levels = {}
+        self.codes = {}
+        for dimension in CUBE_DIMENSIONS:
+            codes, levels = pd.factorize(cells[dimension], sort=True)
+            codes.flags.writeable = False
+            self.codes[dimension] = codes
+            self.levels[dimension] = levels
+        self.total = cells[TOTAL_COLUMN].to_numpy(dtype=np.int64)
+        self.missed = cells[MISSED_COLUMN].to_numpy(dtype=np.int64)
+        self.total.flags.writeable = False
+        self.missed.flags.writeable = False
+
+        # Зависимость преподаватель -> дисциплины для фильтра дисциплин
+        pairs = cells[['Преподаватель', 'Дисциплина']].drop_duplicates()
+        self.teacher_subjects = {teacher: sorted(subjects)
+                                 for teacher, subjects in pairs.groupby('Преподаватель')['Дисциплина']}
+
+    def __len__(self):
+        return len(self.total)
+
+    def _mask(self, filters=None):
+        mask = np.ones(len(self), dtype=bool)
+        for dimension, values in (filters or {}).items():
+            if not values:
+                continue
+            wanted = self.levels[dimension].get_indexer(list(values))
+            mask &= np.isin(self.codes[dimension], wanted[wanted >= 0])
+        return mask
+
+    def totals(self, filters=None):
+        """Сумма занятий и пропусков по неуважительной причине"""
+        mask = self._mask(filters)
+        return int(self.total[mask].sum()), int(self.missed[mask].sum())
+
+    def rollup(self, by, filters=None):
+        """Суммы и доля пропусков в разрезе измерений by (остальные свернуты)"""
+        by = [by] if isinstance(by, str) else list(by)
+        mask = self._mask(filters)
+        if not mask.any():
+            return pd.DataFrame(columns=by + [TOTAL_COLUMN, MISSED_COLUMN, RATE_COLUMN])
+
+        codes = [self.codes[dimension][mask] for dimension in by]
+        shape = [len(self.levels[dimension]) for dimension in by]
+        cell_ids, inverse = np.unique(np.ravel_multi_index(codes, shape), return_inverse=True)
+        total = np.bincount(inverse, weights=self.total[mask]).astype(np.int64)
+        missed = np.bincount(inverse, weights=self.missed[mask]).astype(np.int64)
+
+        result = {dimension: self.levels[dimension].take(level_codes)
+                  for dimension, level_codes in zip(by, np.unravel_index(cell_ids, shape))}
+        result[TOTAL_COLUMN] = total
+        result[MISSED_COLUMN] = missed
+        result[RATE_COLUMN] = absence_rate(total, missed)
+        return pd.DataFrame(result)
+
+    def pivot(self, index, columns, filters=None):
+        """Доля пропусков: значения index по строкам, columns по столбцам"""
+        rolled = self.rollup([index, columns], filters)
+        return rolled.pivot(index=index, columns=columns, values=RATE_COLUMN)
+
+    def subjects_for(self, teachers):
+        """Дисциплины выбранных преподавателей"""
+        subjects = set()
+        for teacher in teachers:
+            subjects.update(self.teacher_subjects.get(teacher, []))
+        return sorted(subjects)
+
+def attendance_cube(engine):
+    """Куб посещаемости для текущей версии данных"""
+    key = (engine.dataset, engine.version)
+    return cube_cache.get_or_compute(key, lambda: AttendanceCube(engine.attendance_rows()))
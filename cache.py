@@ -0,0 +1,77 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+_MISSING = object()
+
+# Все созданные кэши процесса (для диагностики памяти)
+_registry = weakref.WeakSet()
+
+def all_caches():
+    """Кэши процесса, отсортированные по имени"""
+    return sorted(_registry, key=lambda cache: cache.name)
+
+def purge_dataset(dataset):
+    """Удаляет из всех кэшей записи набора данных - ключи вида (набор, ...); возвращает их число"""
+    return sum(cache.discard_where(lambda key: isinstance(key, tuple) and key[:1] == (dataset,))
+               for cache in all_caches())
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением по числу записей"""
+
+    def __init__(self, name, maxsize=256):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _registry.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def discard_where(self, predicate):
+        """Удаляет записи, для ключей которых predicate(key) истинно; возвращает их число"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def items(self):
+        """Копия записей от самой старой к самой свежей"""
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
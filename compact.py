@@ -0,0 +1,78 @@
+"""Компактная передача таблиц в браузер.
+
+Вместо to_dict('records'), где каждая строка повторяет названия столбцов и
+длинные тексты дисциплин и компетенций, callback отдает в dcc.Store таблицу по
+столбцам: строки заменены номерами в словаре значений столбца, целые числа
+приведены к минимальной разрядности. Массивы numpy кодируются orjson без
+обхода по элементам, а записи для DataTable собирает clientside callback
+(RECORDS_JS) в браузере.
+"""
+import numpy as np
+import pandas as pd
+from dash import Input, Output, dash_table, dcc, html
+
+# Восстановление записей DataTable из compact_table: значение словарного столбца -
+# labels[codes[i]] (-1 - пусто), остальные столбцы передаются как есть
+RECORDS_JS = """
+function(payload) {
+    if (!payload) {
+        return [];
+    }
+    var length = payload.length;
+    var records = new Array(length);
+    for (var i = 0; i < length; i++) {
+        records[i] = {};
+    }
+    payload.columns.forEach(function(column) {
+        var values = payload.values[column];
+        var i;
+        if (values !== null && typeof values === 'object' && !Array.isArray(values)) {
+            var codes = values.codes, labels = values.labels;
+            for (i = 0; i < length; i++) {
+                records[i][column] = codes[i] < 0 ? null : labels[codes[i]];
+            }
+        } else {
+            for (i = 0; i < length; i++) {
+                records[i][column] = values[i];
+            }
+        }
+    });
+    return records;
+}
+"""
+
+def compact_column(series):
+    """Столбец для compact_table: словарь строк или массив чисел минимальной разрядности"""
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy().astype(np.int8)
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer').to_numpy()
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy()
+        # Целые значения без пропусков передаются без дробной части
+        if np.isfinite(values).all() and (values == np.round(values)).all():
+            return pd.to_numeric(values.astype(np.int64), downcast='integer')
+        return values
+    codes, labels = pd.factorize(series, sort=False)
+    return {'codes': pd.to_numeric(codes, downcast='integer'), 'labels': pd.Index(labels).tolist()}
+
+def compact_table(frame, columns):
+    """Столбцы columns таблицы frame в виде {'length', 'columns', 'values'}"""
+    columns = [column for column in columns if column in frame.columns]
+    return {
+        'length': len(frame),
+        'columns': columns,
+        'values': {column: compact_column(frame[column]) for column in columns},
+    }
+
+def compact_data_table(table_id, frame, **kwargs):
+    """DataTable с пустыми data вместе с dcc.Store с таблицей; записи восстанавливает register_compact_table"""
+    columns = [column['id'] for column in kwargs['columns']]
+    return html.Div([
+        dcc.Store(id=f'{table_id}-store', data=compact_table(frame, columns)),
+        dash_table.DataTable(id=table_id, data=[], **kwargs),
+    ])
+
+def register_compact_table(app, table_id):
+    """Clientside callback, который заполняет DataTable table_id из ее dcc.Store"""
+    app.clientside_callback(RECORDS_JS, Output(table_id, 'data'), Input(f'{table_id}-store', 'data'))
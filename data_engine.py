@@ -0,0 +1,783 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from snapshot import Snapshot, freeze_frame
+from scoring import (get_last_word, debt_grades, convert_semester, grade_map, extract_year,
+                     calculate_competency_score, build_ratings_frame, attendance_percent)
+
+# Файлы с исходными данными
+COMPETENCIES_FILE = 'Компетенции.csv'
+ATTENDANCE_FILE = 'Посещаемость.csv'
+
+# Увеличивается при изменении prepare_*, чтобы базы и разделы прошлых версий пересобрались
+DATA_FORMAT_VERSION = 2
+
+COMPETENCIES_TABLE = 'competencies'
+ATTENDANCE_TABLE = 'attendance'
+
+# Столбцы, по которым строятся индексы во встроенной базе
+INDEXED_COLUMNS = {
+    COMPETENCIES_TABLE: ['Название', 'Семестр', 'Код_Студента'],
+    ATTENDANCE_TABLE: ['Группа', 'Код', 'Преподаватель'],
+}
+
+def read_competencies(path, **kwargs):
+    return pd.read_csv(path, encoding='cp1251', sep=';', **kwargs)
+
+def read_attendance(path, **kwargs):
+    return pd.read_csv(path, encoding='cp1251', sep=';', **kwargs)
+
+def prepare_competencies(frame):
+    """Добавляет к оценкам производные столбцы"""
+    # Преобразуем текстовые оценки в числа
+    frame['Числовая_оценка'] = frame['Оценка'].map(grade_map)
+    # Код компетенции (последнее слово), по нему объединяются версии компетенций
+    frame['last_word'] = frame['Компетенция'].apply(get_last_word)
+    return frame
+
+def prepare_attendance(frame):
+    """Приводит семестры посещаемости к сквозной нумерации, а виды занятий - к значениям без пробелов"""
+    if not frame.empty:
+        frame['Семестр'] = frame.apply(convert_semester, axis=1)
+        # В выгрузке вид занятий дополнен пробелами до 4 символов ('Пр  ', 'Лек ')
+        frame['ВидЗанятий'] = frame['ВидЗанятий'].str.strip()
+    return frame
+
+def source_signature(*paths):
+    """Версия набора данных по имени, размеру и времени изменения исходных файлов"""
+    digest = hashlib.sha1(f'format:{DATA_FORMAT_VERSION};'.encode('utf-8'))
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def _active_filters(filters):
+    # Пустой список или None означает "без фильтра"
+    return {column: values for column, values in (filters or {}).items() if values}
+
+def _as_list(values):
+    return values if isinstance(values, (list, tuple, set)) else [values]
+
+
+class DataEngine:
+    """Интерфейс движка данных: все запросы callback'ов идут через него"""
+
+    name = None
+    # Имя набора данных в реестре (datasets.py); ключи кэшей производных данных начинаются с него
+    dataset = None
+
+    @property
+    def version(self):
+        raise NotImplementedError
+
+    def reload(self):
+        """Перечитывает данные, если исходные файлы изменились; True - опубликована новая версия"""
+        raise NotImplementedError
+
+    def distinct(self, table, column, filters=None):
+        """Отсортированные уникальные значения столбца (без пустых)"""
+        raise NotImplementedError
+
+    def facets(self, table, columns, filters=None):
+        return {column: self.distinct(table, column, filters) for column in columns}
+
+    def group_students(self, group):
+        """Студенты группы в порядке появления в данных"""
+        raise NotImplementedError
+
+    def student_rows(self, student, group, semesters, types):
+        raise NotImplementedError
+
+    def competency_rows(self, filters=None):
+        raise NotImplementedError
+
+    def iter_competency_rows(self, filters=None, chunksize=10000):
+        """Строки оценок частями, не собирая всю выборку в памяти (порядок частей - порядок хранения)"""
+        raise NotImplementedError
+
+    def grade_counts(self, filters=None):
+        """Количество каждой оценки (аналог value_counts)"""
+        raise NotImplementedError
+
+    def teacher_subjects(self, teachers):
+        raise NotImplementedError
+
+    def attendance_rows(self, filters=None):
+        raise NotImplementedError
+
+    def iter_attendance_rows(self, filters=None, chunksize=10000):
+        """Строки посещаемости частями, не собирая всю выборку в памяти"""
+        raise NotImplementedError
+
+    def attendance_totals(self, filters=None):
+        """Сумма занятий и пропусков по неуважительной причине"""
+        raise NotImplementedError
+
+    def ratings(self, group, semester):
+        raise NotImplementedError
+
+    def after_fork(self):
+        """Вызывается в дочернем процессе: данные в памяти общие, но соединения нужно открыть заново"""
+
+    def spec(self):
+        """Аргументы create_engine, с которыми такой же движок создается в другом процессе"""
+        raise NotImplementedError
+
+
+class PandasEngine(DataEngine):
+    """Движок на pandas: данные целиком в памяти, фильтры - булевы маски"""
+
+    name = 'pandas'
+
+    def __init__(self, competencies_path=COMPETENCIES_FILE, attendance_path=ATTENDANCE_FILE,
+                 prepared_dir='.prepared'):
+        self.competencies_path = competencies_path
+        self.attendance_path = attendance_path
+        self.prepared_dir = prepared_dir
+        self._reload_lock = threading.Lock()
+        self.snapshot = self._load_snapshot()
+
+    def _load_snapshot(self):
+        version = source_signature(self.competencies_path, self.attendance_path)
+        return Snapshot(version, *self._prepared_frames(version))
+
+    def _prepared_frames(self, version):
+        """Подготовленные таблицы версии данных.
+
+        Первый worker разбирает CSV и сохраняет результат prepare_* в prepared_dir,
+        остальные (и перезапуски) читают готовые таблицы из pickle - это в разы
+        быстрее разбора cp1251 и построчных преобразований. prepared_dir=None - без кэша.
+        """
+        path = os.path.join(self.prepared_dir, f'{version}.pkl') if self.prepared_dir else None
+        if path and os.path.exists(path):
+            try:
+                return pd.read_pickle(path)
+            except Exception as e:
+                # Файл поврежден или записан несовместимой версией pandas - собираем заново
+                print(f'Не удалось прочитать подготовленные данные {path}: {e}')
+
+        frames = (prepare_competencies(read_competencies(self.competencies_path)),
+                  prepare_attendance(read_attendance(self.attendance_path)))
+        if path:
+            try:
+                os.makedirs(self.prepared_dir, exist_ok=True)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                pd.to_pickle(frames, tmp_path)
+                os.replace(tmp_path, path)
+                # Таблицы прошлых версий данных больше не нужны
+                for name in os.listdir(self.prepared_dir):
+                    if name.endswith('.pkl') and name != os.path.basename(path):
+                        os.remove(os.path.join(self.prepared_dir, name))
+            except OSError as e:
+                print(f'Не удалось сохранить подготовленные данные {path}: {e}')
+        return frames
+
+    def spec(self):
+        return {'competencies_path': self.competencies_path, 'attendance_path': self.attendance_path,
+                'prepared_dir': self.prepared_dir}
+
+    def reload(self):
+        with self._reload_lock:
+            if source_signature(self.competencies_path, self.attendance_path) == self.version:
+                return False
+            # Новый снимок строится целиком, потом публикуется одним присваиванием
+            self.snapshot = self._load_snapshot()
+            return True
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    @property
+    def df(self):
+        return self.snapshot.competencies
+
+    @property
+    def df_attendance(self):
+        return self.snapshot.attendance
+
+    def _competencies(self, filters=None):
+        """Таблица оценок, в которой ищутся строки под фильтры"""
+        groups = _as_list((filters or {}).get('Название') or [])
+        if len(groups) == 1:
+            # Фильтр по одной группе - сразу ее непрерывный срез
+            return self.snapshot.group_rows(groups[0])
+        return self.df
+
+    def _student_frame(self, student, group):
+        """Все строки студента в группе в исходном порядке"""
+        return self.snapshot.student_rows(group, student)
+
+    def _filter(self, frame, filters):
+        for column, values in _active_filters(filters).items():
+            frame = frame[frame[column].isin(_as_list(values))]
+        return frame
+
+    def _select(self, filters=None):
+        """Строки оценок под фильтры; исходный порядок строк восстанавливает sort_index()"""
+        return self._filter(self._competencies(filters), filters)
+
+    def distinct(self, table, column, filters=None):
+        frame = self._select(filters) if table == COMPETENCIES_TABLE else self._filter(self.df_attendance, filters)
+        return sorted(frame[column].dropna().unique())
+
+    def group_students(self, group):
+        return list(self.snapshot.students_by_group.get(group, []))
+
+    def student_rows(self, student, group, semesters, types):
+        # Работа пропорциональна числу строк студента, а не размеру таблицы
+        df = self._student_frame(student, group)
+        return df[(df['Семестр'].isin(semesters)) & (df['Тип_Компетенции'].isin(types))]
+
+    def competency_rows(self, filters=None):
+        # Таблица кластеризована по студентам - возвращаем строки в исходном порядке
+        return self._select(filters).sort_index()
+
+    def iter_competency_rows(self, filters=None, chunksize=10000):
+        filtered_df = self._select(filters)
+        for start in range(0, len(filtered_df), chunksize):
+            yield filtered_df.iloc[start:start + chunksize]
+
+    def grade_counts(self, filters=None):
+        filtered_df = self._select(filters).sort_index()
+        grade_counts = filtered_df['Оценка'].value_counts().reset_index()
+        grade_counts.columns = ['Оценка', 'Количество']
+        return grade_counts
+
+    def teacher_subjects(self, teachers):
+        filtered_subjects = self.df_attendance[self.df_attendance['Преподаватель'].isin(teachers)]
+        return sorted(filtered_subjects['Дисциплина'].dropna().unique())
+
+    def attendance_rows(self, filters=None):
+        return self._filter(self.df_attendance, filters)
+
+    def iter_attendance_rows(self, filters=None, chunksize=10000):
+        filtered_df = self._filter(self.df_attendance, filters)
+        for start in range(0, len(filtered_df), chunksize):
+            yield filtered_df.iloc[start:start + chunksize]
+
+    def attendance_totals(self, filters=None):
+        filtered_df = self._filter(self.df_attendance, filters)
+        return (filtered_df['ВсегоЗанятийПоЖурналу'].sum(),
+                filtered_df['ПропусковНеуважитПрич'].sum())
+
+    def ratings(self, group, semester):
+        semester_df = self._select({'Название': [group], 'Семестр': [semester]})
+        if semester_df.empty:
+            return pd.DataFrame()
+
+        student_performance = {}
+        for student, student_data in semester_df.groupby('Код_Студента'):
+            total_score = 0
+            competency_count = 0
+
+            for last_word, last_word_group in student_data.groupby('last_word'):
+                # Исключаем записи с "Не изуч." (6)
+                studied_group = last_word_group[last_word_group['Числовая_оценка'] != 6]
+                if studied_group.empty:
+                    continue
+
+                total_score += calculate_competency_score(studied_group)
+                competency_count += 1
+
+            avg_score_percent = total_score / competency_count if competency_count > 0 else 0
+
+            # Считаем долги (исключая "Не изуч.")
+            debts = ((student_data['Оценка'].isin(debt_grades)) &
+                     (student_data['Числовая_оценка'] != 6)).sum()
+
+            student_performance[student] = {
+                'avg_score_percent': avg_score_percent,
+                'avg_score_5': (avg_score_percent / 100) * 5,
+                'debts': int(debts)
+            }
+
+        # Рассчитываем посещаемость для каждого студента
+        attendance = self.df_attendance
+        attendance_group_df = attendance[(attendance['Группа'] == group) &
+                                         (attendance['Семестр'] == semester)]
+        student_attendance = {}
+        for student in student_performance.keys():
+            student_attendance_df = attendance_group_df[attendance_group_df['Код'] == student]
+            if not student_attendance_df.empty:
+                student_attendance[student] = attendance_percent(
+                    student_attendance_df['ВсегоЗанятийПоЖурналу'].sum(),
+                    student_attendance_df['ПропусковНеуважитПрич'].sum())
+            else:
+                student_attendance[student] = 0
+
+        return build_ratings_frame(student_performance, student_attendance)
+
+
+class SQLiteEngine(DataEngine):
+    """Движок на встроенной SQLite: данные в файле на диске, фильтры - индексированный SQL.
+
+    Файл базы строится из CSV по частям, поэтому набор данных может быть больше
+    оперативной памяти, а несколько worker'ов читают один и тот же файл.
+    """
+
+    name = 'sqlite'
+    chunksize = 50000
+
+    def __init__(self, db_path='data.sqlite', competencies_path=COMPETENCIES_FILE,
+                 attendance_path=ATTENDANCE_FILE):
+        self.db_path = db_path
+        self.competencies_path = competencies_path
+        self.attendance_path = attendance_path
+        self._version = source_signature(competencies_path, attendance_path)
+        self._local = threading.local()
+        self._reload_lock = threading.Lock()
+        self._ensure_database(self._version)
+
+    @property
+    def version(self):
+        return self._version
+
+    def spec(self):
+        return {'db_path': self.db_path, 'competencies_path': self.competencies_path,
+                'attendance_path': self.attendance_path}
+
+    # --- Построение базы ---
+
+    def _stored_version(self):
+        if not os.path.exists(self.db_path):
+            return None
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        return row[0] if row else None
+
+    def _ensure_database(self, version):
+        if self._stored_version() == version:
+            return
+        # Строим базу во временный файл и атомарно подменяем - соседние worker'ы
+        # либо видят старую версию целиком, либо новую
+        tmp_path = f'{self.db_path}.{os.getpid()}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            for chunk in read_competencies(self.competencies_path, chunksize=self.chunksize):
+                prepare_competencies(chunk).to_sql(COMPETENCIES_TABLE, conn, if_exists='append', index=False)
+            for chunk in read_attendance(self.attendance_path, chunksize=self.chunksize):
+                prepare_attendance(chunk).to_sql(ATTENDANCE_TABLE, conn, if_exists='append', index=False)
+
+            for table, columns in INDEXED_COLUMNS.items():
+                for column in columns:
+                    conn.execute(f'CREATE INDEX "ix_{table}_{column}" ON {table} ("{column}")')
+            conn.execute(f'CREATE INDEX ix_{COMPETENCIES_TABLE}_rating ON {COMPETENCIES_TABLE} '
+                         '("Название", "Семестр", "Код_Студента")')
+            conn.execute(f'CREATE INDEX ix_{ATTENDANCE_TABLE}_rating ON {ATTENDANCE_TABLE} '
+                         '("Группа", "Семестр", "Код")')
+            conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute("INSERT INTO meta VALUES ('version', ?)", (version,))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, self.db_path)
+
+    def reload(self):
+        with self._reload_lock:
+            version = source_signature(self.competencies_path, self.attendance_path)
+            if version == self._version:
+                return False
+            # Открытые соединения продолжают читать старый файл, пока поток не переподключится
+            self._ensure_database(version)
+            self._version = version
+            return True
+
+    # --- Запросы ---
+
+    @property
+    def _conn(self):
+        # Отдельное соединение только для чтения на каждый поток
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.version != self._version:
+            if conn is not None:
+                conn.close()
+            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False)
+            self._local.conn = conn
+            self._local.version = self._version
+        return conn
+
+    def after_fork(self):
+        # Соединение родителя нельзя использовать в дочернем процессе
+        self._local = threading.local()
+
+    @staticmethod
+    def _param(value):
+        # sqlite3 не принимает numpy-скаляры
+        return value.item() if hasattr(value, 'item') else value
+
+    def _where(self, filters, extra=None):
+        clauses, params = list(extra or []), []
+        for column, values in _active_filters(filters).items():
+            values = _as_list(values)
+            clauses.append(f'"{column}" IN ({", ".join("?" * len(values))})')
+            params.extend(self._param(value) for value in values)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def _query(self, sql, params=()):
+        return pd.read_sql_query(sql, self._conn, params=[self._param(p) for p in params])
+
+    def distinct(self, table, column, filters=None):
+        where, params = self._where(filters, [f'"{column}" IS NOT NULL'])
+        rows = self._conn.execute(f'SELECT DISTINCT "{column}" FROM {table}{where} ORDER BY 1', params)
+        return [row[0] for row in rows]
+
+    def group_students(self, group):
+        rows = self._conn.execute(
+            f'SELECT "Код_Студента" FROM {COMPETENCIES_TABLE} WHERE "Название" = ? '
+            'GROUP BY "Код_Студента" ORDER BY MIN(rowid)', (self._param(group),))
+        return [row[0] for row in rows]
+
+    def student_rows(self, student, group, semesters, types):
+        if not semesters or not types:
+            return pd.DataFrame()
+        where, params = self._where(
+            {'Код_Студента': [student], 'Название': [group], 'Семестр': semesters, 'Тип_Компетенции': types})
+        return self._query(f'SELECT * FROM {COMPETENCIES_TABLE}{where} ORDER BY rowid', params)
+
+    def competency_rows(self, filters=None):
+        where, params = self._where(filters)
+        return self._query(f'SELECT * FROM {COMPETENCIES_TABLE}{where} ORDER BY rowid', params)
+
+    def iter_competency_rows(self, filters=None, chunksize=10000):
+        where, params = self._where(filters)
+        yield from pd.read_sql_query(f'SELECT * FROM {COMPETENCIES_TABLE}{where} ORDER BY rowid', self._conn,
+                                     params=params, chunksize=chunksize)
+
+    def grade_counts(self, filters=None):
+        where, params = self._where(filters, ['"Оценка" IS NOT NULL'])
+        return self._query(
+            f'SELECT "Оценка", COUNT(*) AS "Количество" FROM {COMPETENCIES_TABLE}{where} '
+            'GROUP BY "Оценка" ORDER BY 2 DESC, 1', params)
+
+    def teacher_subjects(self, teachers):
+        return self.distinct(ATTENDANCE_TABLE, 'Дисциплина', {'Преподаватель': teachers})
+
+    def attendance_rows(self, filters=None):
+        where, params = self._where(filters)
+        return self._query(f'SELECT * FROM {ATTENDANCE_TABLE}{where} ORDER BY rowid', params)
+
+    def iter_attendance_rows(self, filters=None, chunksize=10000):
+        where, params = self._where(filters)
+        yield from pd.read_sql_query(f'SELECT * FROM {ATTENDANCE_TABLE}{where} ORDER BY rowid', self._conn,
+                                     params=params, chunksize=chunksize)
+
+    def attendance_totals(self, filters=None):
+        where, params = self._where(filters)
+        total, absences = self._conn.execute(
+            f'SELECT COALESCE(SUM("ВсегоЗанятийПоЖурналу"), 0), COALESCE(SUM("ПропусковНеуважитПрич"), 0) '
+            f'FROM {ATTENDANCE_TABLE}{where}', params).fetchone()
+        return total, absences
+
+    def ratings(self, group, semester):
+        group, semester = self._param(group), self._param(semester)
+
+        # Долги по студентам (исключая "Не изуч.")
+        students = self._query(
+            f'''SELECT "Код_Студента" AS student,
+                       SUM(CASE WHEN "Оценка" IN ({", ".join("?" * len(debt_grades))})
+                                 AND COALESCE("Числовая_оценка", 0) != 6 THEN 1 ELSE 0 END) AS debts
+                FROM {COMPETENCIES_TABLE}
+                WHERE "Название" = ? AND "Семестр" = ?
+                GROUP BY "Код_Студента" ORDER BY "Код_Студента"''',
+            [*debt_grades, group, semester])
+        if students.empty:
+            return pd.DataFrame()
+
+        # Балл компетенции = 100 / N * (зачеты + 0.5 удовл + 0.75 хор + отл),
+        # то же, что calculate_competency_score, но одним запросом
+        scores = self._query(
+            f'''SELECT "Код_Студента" AS student, last_word, COUNT(*) AS n,
+                       SUM(CASE
+                           WHEN "ДиффенцированныйЗачет" = 0 AND "Числовая_оценка" = 7 THEN 1.0
+                           WHEN "ДиффенцированныйЗачет" = 1 AND "Числовая_оценка" = 3 THEN 0.5
+                           WHEN "ДиффенцированныйЗачет" = 1 AND "Числовая_оценка" = 4 THEN 0.75
+                           WHEN "ДиффенцированныйЗачет" = 1 AND "Числовая_оценка" = 5 THEN 1.0
+                           ELSE 0 END) AS points
+                FROM {COMPETENCIES_TABLE}
+                WHERE "Название" = ? AND "Семестр" = ?
+                  AND ("Числовая_оценка" IS NULL OR "Числовая_оценка" != 6)
+                GROUP BY "Код_Студента", last_word''',
+            [group, semester])
+        scores['score'] = [round(points * 100 / n, 2) for points, n in zip(scores['points'], scores['n'])]
+        avg_scores = scores.groupby('student')['score'].mean()
+
+        attendance = self._query(
+            f'''SELECT "Код" AS student, SUM("ВсегоЗанятийПоЖурналу") AS total,
+                       SUM("ПропусковНеуважитПрич") AS missed
+                FROM {ATTENDANCE_TABLE}
+                WHERE "Группа" = ? AND "Семестр" = ?
+                GROUP BY "Код"''',
+            [group, semester]).set_index('student')
+
+        student_performance = {}
+        student_attendance = {}
+        for student, debts in zip(students['student'], students['debts']):
+            avg_score_percent = avg_scores.get(student, 0)
+            student_performance[student] = {
+                'avg_score_percent': avg_score_percent,
+                'avg_score_5': (avg_score_percent / 100) * 5,
+                'debts': int(debts)
+            }
+            if student in attendance.index:
+                row = attendance.loc[student]
+                student_attendance[student] = attendance_percent(row['total'], row['missed'])
+            else:
+                student_attendance[student] = 0
+
+        return build_ratings_frame(student_performance, student_attendance)
+
+
+class PartitionedEngine(PandasEngine):
+    """Движок на pandas с хранением оценок по учебным годам.
+
+    При первом запуске Компетенции.csv раскладывается на диске по разделам
+    УчебныйГод; в manifest.json для каждого раздела записываются значения
+    фильтруемых столбцов. При старте загружаются только текущие годы, старые -
+    по требованию, когда фильтр их затрагивает, и вытесняются по LRU.
+    """
+
+    name = 'partitioned'
+    chunksize = 50000
+    # Столбцы, значения которых хранятся в манифесте для отсечения разделов
+    facet_columns = ['Дисциплина', 'Курс', 'Семестр', 'КодКомпетенции', 'Компетенция', 'Тип_Компетенции',
+                     'Название', 'УчебныйГод', 'Код_Студента', 'Оценка']
+
+    def __init__(self, partition_dir='.partitions', competencies_path=COMPETENCIES_FILE,
+                 attendance_path=ATTENDANCE_FILE, current_years=1, max_loaded=2):
+        self.partition_dir = partition_dir
+        self.current_years_count = current_years
+        self.max_loaded = max_loaded
+        self._lock = threading.RLock()
+        super().__init__(competencies_path, attendance_path)
+
+    def spec(self):
+        return {'partition_dir': self.partition_dir, 'competencies_path': self.competencies_path,
+                'attendance_path': self.attendance_path, 'current_years': self.current_years_count,
+                'max_loaded': self.max_loaded}
+
+    def _load_snapshot(self):
+        version = source_signature(self.competencies_path, self.attendance_path)
+        manifest = self._ensure_partitions(version)
+        snapshot = Snapshot(version, attendance=prepare_attendance(read_attendance(self.attendance_path)))
+        snapshot.manifest = manifest
+        years = sorted(manifest['partitions'], key=extract_year)
+        snapshot.current_years = years[-self.current_years_count:] if self.current_years_count else []
+        # Текущие разделы загружены всегда и не вытесняются
+        snapshot.pinned = {year: self._read_partition(snapshot, year) for year in snapshot.current_years}
+        snapshot.loaded = OrderedDict()  # Загруженные исторические разделы в порядке использования
+        # Пустая таблица с нужными столбцами - ответ на фильтр, под который не подходит ни один раздел
+        if snapshot.pinned:
+            snapshot.empty = next(iter(snapshot.pinned.values())).iloc[0:0]
+        else:
+            snapshot.empty = freeze_frame(prepare_competencies(read_competencies(self.competencies_path, nrows=0)))
+        return snapshot
+
+    # --- Раскладка по разделам ---
+
+    def _version_dir(self, version):
+        return os.path.join(self.partition_dir, version)
+
+    def _ensure_partitions(self, version):
+        version_dir = self._version_dir(version)
+        manifest_path = os.path.join(version_dir, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+
+        # Раскладываем во временный каталог и переименовываем целиком
+        tmp_dir = f'{version_dir}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        partitions = {}
+        facets = {}
+        offset = 0
+        for chunk_number, chunk in enumerate(read_competencies(self.competencies_path, chunksize=self.chunksize)):
+            # Индекс - номер строки в исходном файле, чтобы восстановить порядок при объединении
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            chunk = prepare_competencies(chunk)
+            for year, part in chunk.groupby('УчебныйГод', sort=False):
+                year_dir = os.path.join(tmp_dir, str(year))
+                os.makedirs(year_dir, exist_ok=True)
+                file_name = f'part-{chunk_number:05d}.pkl'
+                part.to_pickle(os.path.join(year_dir, file_name))
+                info = partitions.setdefault(year, {'files': [], 'rows': 0})
+                info['files'].append(file_name)
+                info['rows'] += len(part)
+                year_facets = facets.setdefault(year, {column: set() for column in self.facet_columns})
+                for column in self.facet_columns:
+                    year_facets[column].update(part[column].dropna().unique().tolist())
+
+        for year, info in partitions.items():
+            info['facets'] = {column: sorted(values) for column, values in facets[year].items()}
+        manifest = {'version': version, 'partitions': partitions}
+        os.makedirs(tmp_dir, exist_ok=True)
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        try:
+            os.replace(tmp_dir, version_dir)
+        except OSError:
+            # Соседний worker успел разложить ту же версию
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Разделы прошлых версий данных больше не нужны
+        # (уже открытые worker'ами разделы остаются у них в памяти)
+        for name in os.listdir(self.partition_dir):
+            if name != version and not name.endswith('.tmp'):
+                shutil.rmtree(os.path.join(self.partition_dir, name), ignore_errors=True)
+        return manifest
+
+    def _read_partition(self, snapshot, year):
+        info = snapshot.manifest['partitions'][year]
+        version_dir = self._version_dir(snapshot.version)
+        parts = [pd.read_pickle(os.path.join(version_dir, year, file_name)) for file_name in info['files']]
+        return freeze_frame(pd.concat(parts) if len(parts) > 1 else parts[0])
+
+    # --- Загрузка по требованию ---
+
+    def _partition(self, snapshot, year):
+        if year in snapshot.pinned:
+            return snapshot.pinned[year]
+        with self._lock:
+            if year in snapshot.loaded:
+                snapshot.loaded.move_to_end(year)
+                return snapshot.loaded[year]
+            frame = self._read_partition(snapshot, year)
+            snapshot.loaded[year] = frame
+            while len(snapshot.loaded) > self.max_loaded:
+                snapshot.loaded.popitem(last=False)
+            return frame
+
+    @property
+    def manifest(self):
+        return self.snapshot.manifest
+
+    def partitions_for(self, filters=None, snapshot=None):
+        """Годы, в разделах которых могут быть строки под фильтры"""
+        snapshot = snapshot or self.snapshot
+        active = {column: set(_as_list(values)) for column, values in _active_filters(filters).items()
+                  if column in self.facet_columns}
+        years = []
+        for year, info in snapshot.manifest['partitions'].items():
+            if all(values.intersection(info['facets'][column]) for column, values in active.items()):
+                years.append(year)
+        return years
+
+    def loaded_partitions(self):
+        snapshot = self.snapshot
+        with self._lock:
+            return list(snapshot.pinned) + list(snapshot.loaded)
+
+    def _select(self, filters=None):
+        # Фильтр применяется к каждому разделу отдельно: объединяются только подошедшие строки,
+        # а не разделы целиком
+        snapshot = self.snapshot
+        frames = [self._filter(self._partition(snapshot, year), filters)
+                  for year in self.partitions_for(filters, snapshot)]
+        if not frames:
+            return snapshot.empty
+        matched = [frame for frame in frames if not frame.empty]
+        if len(matched) <= 1:
+            return matched[0] if matched else frames[0]
+        return pd.concat(matched)
+
+    def iter_competency_rows(self, filters=None, chunksize=10000):
+        # Незагруженные разделы читаются с диска в обход LRU: полный проход не вытесняет разделы,
+        # с которыми работают запросы, и не держит в памяти больше одного раздела
+        snapshot = self.snapshot
+        for year in self.partitions_for(filters, snapshot):
+            with self._lock:
+                frame = snapshot.pinned.get(year)
+                if frame is None:
+                    frame = snapshot.loaded.get(year)
+            if frame is None:
+                frame = self._read_partition(snapshot, year)
+            frame = self._filter(frame, filters)
+            for start in range(0, len(frame), chunksize):
+                yield frame.iloc[start:start + chunksize]
+
+    def group_students(self, group):
+        return list(self._select({'Название': [group]}).sort_index()['Код_Студента'].unique())
+
+    def _student_frame(self, student, group):
+        # Разделы по годам не кластеризованы по студентам
+        return self._select({'Код_Студента': [student], 'Название': [group]}).sort_index()
+
+    def distinct(self, table, column, filters=None):
+        if table == COMPETENCIES_TABLE and not _active_filters(filters) and column in self.facet_columns:
+            # Значения для фильтров берем из манифеста, не загружая разделы
+            values = set()
+            for info in self.manifest['partitions'].values():
+                values.update(info['facets'][column])
+            return sorted(values)
+        return super().distinct(table, column, filters)
+
+ENGINES = {
+    PandasEngine.name: PandasEngine,
+    SQLiteEngine.name: SQLiteEngine,
+    PartitionedEngine.name: PartitionedEngine,
+}
+
+# Файлы, которые движок строит из исходных данных, относительно storage_dir
+STORAGE_PATHS = {
+    PandasEngine.name: ('prepared_dir', 'prepared'),
+    SQLiteEngine.name: ('db_path', 'data.sqlite'),
+    PartitionedEngine.name: ('partition_dir', 'partitions'),
+}
+
+def create_engine(name=None, storage_dir=None, **kwargs):
+    """Создает движок данных по имени (по умолчанию из переменной окружения DATA_ENGINE).
+
+    storage_dir - отдельный каталог для базы, разделов или подготовленных таблиц,
+    когда в одном процессе работают движки по разным исходным файлам.
+    """
+    name = name or os.environ.get('DATA_ENGINE', PandasEngine.name)
+    if name not in ENGINES:
+        raise ValueError(f"Неизвестный движок данных: {name}. Доступны: {', '.join(ENGINES)}")
+    if storage_dir is not None:
+        argument, file_name = STORAGE_PATHS[name]
+        kwargs.setdefault(argument, os.path.join(storage_dir, file_name))
+    if name == PandasEngine.name and 'prepared_dir' not in kwargs and 'DATA_PREPARED_DIR' in os.environ:
+        # Пустое значение отключает кэш подготовленных таблиц
+        kwargs['prepared_dir'] = os.environ['DATA_PREPARED_DIR'] or None
+    if name == SQLiteEngine.name and 'db_path' not in kwargs and os.environ.get('DATA_DB_PATH'):
+        kwargs['db_path'] = os.environ['DATA_DB_PATH']
+    if name == PartitionedEngine.name:
+        if 'partition_dir' not in kwargs and os.environ.get('DATA_PARTITION_DIR'):
+            kwargs['partition_dir'] = os.environ['DATA_PARTITION_DIR']
+        if 'max_loaded' not in kwargs and os.environ.get('DATA_PARTITION_CACHE'):
+            kwargs['max_loaded'] = int(os.environ['DATA_PARTITION_CACHE'])
+    return ENGINES[name](**kwargs)
+
+def watch_sources(engine, interval, on_reload=None):
+    """Фоновая проверка исходных файлов: при изменении движок публикует новую версию данных.
+
+    on_reload() вызывается после каждой перезагрузки (например, для прогрева кэшей).
+    """
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                if engine.reload():
+                    print(f'Данные перезагружены, версия {engine.version}')
+                    if on_reload is not None:
+                        on_reload()
+            except Exception as e:
+                print(f'Ошибка перезагрузки данных: {e}')
+
+    thread = threading.Thread(target=loop, name='data-reload', daemon=True)
+    thread.start()
+    return thread
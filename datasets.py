@@ -0,0 +1,242 @@
+"""Реестр наборов данных: по набору на факультет в одном развертывании.
+
+Каждый подкаталог DATASETS_DIR с файлами Компетенции.csv и Посещаемость.csv -
+отдельный набор с именем подкаталога; данные из рабочего каталога (как и раньше,
+с учетом DATA_SOURCES) регистрируются под именем default. Набор выбирается
+параметром адреса ?dataset=<имя> (у страницы дашборда, API и выгрузок) и
+загружается при первом обращении. Callback'и Dash получают набор своей
+страницы в теле запроса (DATASET_REQUEST_HOOK). Суммарный объем загруженных наборов
+ограничен DATASET_MEMORY_MB: при превышении выгружаются наборы, к которым
+дольше всего не обращались.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, g, has_request_context, request
+
+from cache import purge_dataset
+from data_engine import ATTENDANCE_FILE, COMPETENCIES_FILE, create_engine
+from ingest import canonical_competencies_path
+from memprofile import dataset_sizes
+from singleflight import SingleFlight
+
+DATASETS_DIR = os.environ.get('DATASETS_DIR')
+DEFAULT_DATASET = os.environ.get('DEFAULT_DATASET')
+DATASET_MEMORY_MB = float(os.environ.get('DATASET_MEMORY_MB', 1024))
+# Производные файлы движков (базы, разделы, подготовленные таблицы) по наборам
+DATASETS_STORAGE_DIR = os.environ.get('DATASETS_STORAGE_DIR', '.datasets')
+
+DATASET_PARAM = 'dataset'
+LOCAL_DATASET = 'default'
+
+# Хук dash-renderer request_pre: запрос callback'а несет набор данных из адреса своей страницы.
+# Без ?dataset= поле не добавляется - используется набор по умолчанию
+DATASET_REQUEST_HOOK = f"""
+function(payload) {{
+    var dataset = new URLSearchParams(window.location.search).get('{DATASET_PARAM}');
+    if (dataset !== null) {{
+        payload.{DATASET_PARAM} = dataset;
+    }}
+}}
+"""
+
+class UnknownDataset(KeyError):
+    pass
+
+
+class Dataset:
+    """Описание набора данных: исходные файлы и каталог для производных файлов движка"""
+
+    def __init__(self, name, competencies_path, attendance_path, storage_dir=None):
+        self.name = name
+        self.competencies_path = competencies_path
+        self.attendance_path = attendance_path
+        self.storage_dir = storage_dir
+
+    def create_engine(self):
+        if self.storage_dir is not None:
+            os.makedirs(self.storage_dir, exist_ok=True)
+        engine = create_engine(competencies_path=self.competencies_path, attendance_path=self.attendance_path,
+                               storage_dir=self.storage_dir)
+        engine.dataset = self.name
+        return engine
+
+def discover_datasets(datasets_dir=DATASETS_DIR, storage_dir=DATASETS_STORAGE_DIR):
+    """Наборы из рабочего каталога и подкаталогов datasets_dir"""
+    datasets = {}
+    if os.path.exists(COMPETENCIES_FILE) and os.path.exists(ATTENDANCE_FILE):
+        # Прежний режим с одним набором - производные файлы на старых местах
+        datasets[LOCAL_DATASET] = Dataset(LOCAL_DATASET, canonical_competencies_path(), ATTENDANCE_FILE)
+    if datasets_dir:
+        for name in sorted(os.listdir(datasets_dir)):
+            competencies_path = os.path.join(datasets_dir, name, COMPETENCIES_FILE)
+            attendance_path = os.path.join(datasets_dir, name, ATTENDANCE_FILE)
+            if os.path.exists(competencies_path) and os.path.exists(attendance_path):
+                datasets[name] = Dataset(name, competencies_path, attendance_path, os.path.join(storage_dir, name))
+    return datasets
+
+def requested_dataset():
+    """Имя набора из ?dataset= запроса, а для callback'ов Dash - из поля dataset тела запроса"""
+    if not has_request_context():
+        return None
+    name = request.args.get(DATASET_PARAM)
+    if name is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            name = body.get(DATASET_PARAM)
+    return name
+
+
+class DatasetRegistry:
+    """Загруженные по требованию движки наборов данных с вытеснением по LRU.
+
+    Объем набора - объем его таблиц и индексов в памяти (для sqlite - объем
+    файла базы, см. dataset_sizes). Вытеснение убирает движок из реестра и
+    записи кэшей производных данных набора - запросы, которые уже работают с
+    ним, дорабатывают, а память освобождается после них.
+    """
+
+    def __init__(self, datasets, default=None, memory_budget=DATASET_MEMORY_MB * 1024 * 1024):
+        if not datasets:
+            raise ValueError('Не найдено ни одного набора данных')
+        self.datasets = datasets
+        self.default = default or (LOCAL_DATASET if LOCAL_DATASET in datasets else next(iter(datasets)))
+        if self.default not in datasets:
+            raise ValueError(f"Неизвестный набор данных по умолчанию: {self.default}")
+        self.memory_budget = memory_budget
+        self.evictions = 0
+        self._loaded = OrderedDict()  # имя -> (движок, объем в байтах), от давно использованных к свежим
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.engine = CurrentEngine(self)
+
+    @classmethod
+    def from_environment(cls):
+        return cls(discover_datasets(), DEFAULT_DATASET)
+
+    @property
+    def names(self):
+        return list(self.datasets)
+
+    def get(self, name):
+        """Движок набора; при первом обращении набор загружается"""
+        if name not in self.datasets:
+            raise UnknownDataset(name)
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                return entry[0]
+        return self._flight.do(name, self._load, name)
+
+    def _load(self, name):
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name][0]
+        engine = self.datasets[name].create_engine()
+        size = sum(row['bytes'] for row in dataset_sizes(engine))
+        with self._lock:
+            self._loaded[name] = (engine, size)
+            self._evict(keep=name)
+        return engine
+
+    def _evict(self, keep):
+        # Вызывается под self._lock; только что загруженный набор не вытесняется
+        while self.loaded_bytes() > self.memory_budget:
+            victim = next((name for name in self._loaded if name != keep), None)
+            if victim is None:
+                break
+            del self._loaded[victim]
+            # Производные данные набора (рейтинги, матрицы, эскизы, ...) выгружаются вместе с ним
+            purged = purge_dataset(victim)
+            self.evictions += 1
+            print(f'Набор данных {victim} выгружен из памяти (записей кэшей: {purged})')
+
+    def after_fork(self):
+        """Вызывается в дочернем процессе для всех загруженных движков (см. DataEngine.after_fork)"""
+        with self._lock:
+            engines = [engine for engine, _ in self._loaded.values()]
+        for engine in engines:
+            engine.after_fork()
+
+    def loaded_names(self):
+        with self._lock:
+            return list(self._loaded)
+
+    def loaded_bytes(self):
+        return sum(size for _, size in self._loaded.values())
+
+    def current(self):
+        """Движок набора текущего запроса (вне запроса - набора по умолчанию).
+
+        В пределах запроса движок запоминается, чтобы все обращения callback'а
+        шли к одной версии данных, даже если набор тем временем вытеснен.
+        """
+        if not has_request_context():
+            return self.get(self.default)
+        engine = g.get('dataset_engine')
+        if engine is None:
+            engine = g.dataset_engine = self.get(requested_dataset() or self.default)
+        return engine
+
+    def current_name(self):
+        return (requested_dataset() or self.default) if has_request_context() else self.default
+
+    def reload(self):
+        """Перечитывает загруженные наборы, исходные файлы которых изменились"""
+        with self._lock:
+            loaded = [(name, engine) for name, (engine, _) in self._loaded.items()]
+        reloaded = False
+        for name, engine in loaded:
+            if engine.reload():
+                size = sum(row['bytes'] for row in dataset_sizes(engine))
+                with self._lock:
+                    if name in self._loaded:
+                        self._loaded[name] = (engine, size)
+                reloaded = True
+        return reloaded
+
+    @property
+    def version(self):
+        with self._lock:
+            return ', '.join(f'{name}: {engine.version}' for name, (engine, _) in self._loaded.items())
+
+    def summary(self):
+        with self._lock:
+            loaded = {name: (engine.version, size) for name, (engine, size) in self._loaded.items()}
+        return {
+            'default': self.default,
+            'memory_budget': self.memory_budget,
+            'loaded_bytes': sum(size for _, size in loaded.values()),
+            'evictions': self.evictions,
+            'datasets': [{'name': name, 'loaded': name in loaded,
+                          'version': loaded.get(name, (None, None))[0],
+                          'bytes': loaded.get(name, (None, None))[1]} for name in self.datasets],
+        }
+
+
+class CurrentEngine:
+    """Движок набора данных текущего запроса.
+
+    Передается в маршруты и callback'и вместо конкретного движка: каждое
+    обращение к атрибуту уходит движку набора, выбранного в запросе.
+    """
+
+    def __init__(self, registry):
+        self._registry = registry
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.current(), attr)
+
+def register_dataset_routes(server, registry):
+    """Список наборов данных (/api/v1/datasets) и ответ 404 на неизвестный набор"""
+
+    @server.errorhandler(UnknownDataset)
+    def unknown_dataset(error):
+        return Response(f'Неизвестный набор данных: {error.args[0]}', status=404, mimetype='text/plain')
+
+    @server.route('/api/v1/datasets', endpoint='api_datasets')
+    def api_datasets():
+        return Response(json.dumps(registry.summary(), ensure_ascii=False), mimetype='application/json')
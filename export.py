@@ -0,0 +1,123 @@
+import zlib
+
+import pandas as pd
+from flask import Response, request, stream_with_context
+
+from data_engine import COMPETENCIES_TABLE
+from scoring import competency_scores
+
+# Формат выгрузки -> (MIME-тип, расширение файла)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+def iter_ratings(engine, groups, semesters=None):
+    """Рейтинги по одной паре (группа, семестр) за раз"""
+    for group in groups:
+        group_semesters = semesters or engine.distinct(COMPETENCIES_TABLE, 'Семестр', {'Название': [group]})
+        for semester in group_semesters:
+            ratings_df = engine.ratings(group, semester)
+            if ratings_df.empty:
+                continue
+            ratings_df.insert(0, 'Семестр', semester)
+            ratings_df.insert(0, 'Группа', group)
+            yield ratings_df
+
+def iter_scores(engine, groups, semesters=None, types=None, students=None):
+    """Баллы по компетенциям, по одному студенту за раз"""
+    for group in groups:
+        group_semesters = semesters or engine.distinct(COMPETENCIES_TABLE, 'Семестр', {'Название': [group]})
+        group_types = types or engine.distinct(COMPETENCIES_TABLE, 'Тип_Компетенции')
+        for student in engine.group_students(group):
+            if students and student not in students:
+                continue
+            rows = engine.student_rows(student, group, group_semesters, group_types)
+            scores = competency_scores(rows, with_min=True)
+            if not scores:
+                continue
+            yield pd.DataFrame([{
+                'Группа': group,
+                'Код_Студента': student,
+                'Код компетенции': score['last_word'],
+                'Тип_Компетенции': score['Тип_Компетенции'],
+                'Компетенция': score['Компетенция'],
+                'Балл': score['Балл'],
+                'Минимальный балл': score['Минимальный балл'],
+            } for score in scores])
+
+def encode_frames(frames, fmt):
+    """Превращает поток DataFrame'ов в поток строк CSV или NDJSON"""
+    header = True
+    for frame in frames:
+        if frame.empty:
+            continue
+        if fmt == 'csv':
+            # Разделитель такой же, как в исходных выгрузках
+            yield frame.to_csv(sep=';', header=header, index=False)
+            header = False
+        else:
+            yield frame.to_json(orient='records', lines=True, force_ascii=False).rstrip('\n') + '\n'
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # Формат gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _stream_response(name, frames):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return Response(f"Неизвестный формат выгрузки: {fmt}. Доступны: {', '.join(EXPORT_FORMATS)}",
+                        status=400, mimetype='text/plain')
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f'{name}.{extension}'
+    chunks = encode_frames(frames, fmt)
+    if request.args.get('gzip', '').lower() in ('1', 'true', 'yes'):
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+def register_export_routes(server, engine):
+    """Регистрирует маршруты потоковой выгрузки на Flask-сервере приложения.
+
+    Параметры запроса повторяются для выбора нескольких значений
+    (?group=404а&group=2.210-1); без параметра выгружается всё.
+    format=csv|ndjson, gzip=1 - сжатие на лету.
+    """
+
+    @server.route('/export/ratings', endpoint='export_ratings')
+    def export_ratings():
+        groups = request.args.getlist('group') or engine.distinct(COMPETENCIES_TABLE, 'Название')
+        semesters = request.args.getlist('semester', type=int)
+        return _stream_response('ratings', iter_ratings(engine, groups, semesters))
+
+    @server.route('/export/scores', endpoint='export_scores')
+    def export_scores():
+        groups = request.args.getlist('group') or engine.distinct(COMPETENCIES_TABLE, 'Название')
+        frames = iter_scores(engine, groups,
+                             semesters=request.args.getlist('semester', type=int),
+                             types=request.args.getlist('type'),
+                             students=request.args.getlist('student', type=int))
+        return _stream_response('scores', frames)
+
+    @server.route('/export/attendance', endpoint='export_attendance')
+    def export_attendance():
+        filters = {
+            'Группа': request.args.getlist('group'),
+            'Код': request.args.getlist('code', type=int),
+            'Курс': request.args.getlist('course', type=int),
+            'Семестр': request.args.getlist('semester', type=int),
+            'Преподаватель': request.args.getlist('teacher'),
+            'Дисциплина': request.args.getlist('subject'),
+            'ВидЗанятий': request.args.getlist('class_type'),
+        }
+        return _stream_response('attendance', engine.iter_attendance_rows(filters))
@@ -0,0 +1,97 @@
+"""Распределение оценок по дисциплинам за все учебные годы и группы.
+
+Одна группировка всех строк оценок дает число студентов с каждой оценкой по
+дисциплине, учебному году, группе, семестру и форме контроля. Таблица
+хранится компактно (ключи - уровни MultiIndex, счетчики - целые минимальной
+разрядности) и кэшируется по версии данных. Сводки по дисциплинам и
+детализация по годам и группам - суммы ее строк, а доля долгов, экзаменов и
+успеваемость считаются по тем же правилам, что и баллы компетенций (row_points).
+"""
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from scoring import debt_grades, grade_map
+from score_matrix import row_points
+from singleflight import SingleFlight
+
+DISTRIBUTION_KEYS = ['Дисциплина', 'УчебныйГод', 'Название', 'Семестр']
+# Столбцы оценок в порядке отображения: экзамен, зачет, неявка, не изучено
+GRADE_COLUMNS = ['Отл', 'Хор', 'Удовл', 'Неуд', 'Зачет', 'Незачет', 'Н/я', 'Не изуч.']
+STUDIED_COLUMN = 'Оценок'
+EXAM_SHARE_COLUMN = 'Экзамены (%)'
+DEBT_SHARE_COLUMN = 'Долги (%)'
+SCORE_COLUMN = 'Успеваемость (%)'
+METRIC_COLUMNS = [STUDIED_COLUMN] + GRADE_COLUMNS + [EXAM_SHARE_COLUMN, DEBT_SHARE_COLUMN, SCORE_COLUMN]
+
+# Счетчики оценок по (набор данных, версия данных)
+counts_cache = LRUCache('grade-distribution', maxsize=4)
+# Сводки по (набор данных, версия данных, уровень, учебные годы, группы)
+summary_cache = LRUCache('grade-distribution-summaries', maxsize=64)
+_flight = SingleFlight()
+
+def grade_counts_table(rows):
+    """Число студентов с каждой оценкой: строки - DISTRIBUTION_KEYS, столбцы - (форма контроля, оценка)"""
+    if rows.empty:
+        return pd.DataFrame(index=pd.MultiIndex.from_arrays([[]] * len(DISTRIBUTION_KEYS), names=DISTRIBUTION_KEYS))
+    # Оценка дисциплины повторяется в строке каждой ее компетенции - студенты считаются без повторов
+    counts = (rows.groupby(DISTRIBUTION_KEYS + ['ДиффенцированныйЗачет', 'Оценка'], sort=True, observed=True)
+              ['Код_Студента'].nunique()
+              .unstack(['ДиффенцированныйЗачет', 'Оценка'], fill_value=0))
+    return counts.apply(pd.to_numeric, downcast='integer')
+
+def distribution_counts(engine):
+    """Счетчики оценок всего набора для текущей версии данных"""
+    key = (engine.dataset, engine.version)
+    cached = counts_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def compute():
+        counts = grade_counts_table(engine.competency_rows())
+        counts_cache.put(key, counts)
+        return counts
+
+    return _flight.do(key, compute)
+
+def summarize_counts(counts, level):
+    """Сумма счетчиков по ключам level и показатели по ним"""
+    columns = list(level) + METRIC_COLUMNS
+    if counts.empty:
+        return pd.DataFrame(columns=columns)
+    sums = counts.astype(np.int64).groupby(level=list(level), sort=True, observed=True).sum()
+    matrix = sums.to_numpy()
+
+    # Вклад каждого столбца (форма контроля, оценка) - по правилам row_points
+    pairs = sums.columns.to_frame(index=False)
+    pairs['Числовая_оценка'] = pairs['Оценка'].map(grade_map)
+    studied, real, _ = row_points(pairs)
+    exam = studied & (pairs['ДиффенцированныйЗачет'].to_numpy() == 1)
+    debt = studied & pairs['Оценка'].isin(debt_grades).to_numpy()
+
+    result = sums.index.to_frame(index=False)
+    n_studied = matrix @ studied
+    result[STUDIED_COLUMN] = n_studied
+    for grade in GRADE_COLUMNS:
+        result[grade] = matrix @ (pairs['Оценка'] == grade).to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = np.where(n_studied > 0, 100 / n_studied, np.nan)
+        result[EXAM_SHARE_COLUMN] = np.round(matrix @ exam * share, 2)
+        result[DEBT_SHARE_COLUMN] = np.round(matrix @ debt * share, 2)
+        result[SCORE_COLUMN] = np.round(matrix @ real * share, 2)
+    return result[columns]
+
+def grade_distribution(engine, level=('Дисциплина',), years=None, groups=None):
+    """Распределение оценок по ключам level; years и groups ограничивают учебные годы и группы"""
+    key = (engine.dataset, engine.version, tuple(level), tuple(years or ()), tuple(groups or ()))
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+    counts = distribution_counts(engine)
+    if years:
+        counts = counts[counts.index.get_level_values('УчебныйГод').isin(years)]
+    if groups:
+        counts = counts[counts.index.get_level_values('Название').isin(groups)]
+    result = summarize_counts(counts, level)
+    summary_cache.put(key, result)
+    return result
@@ -0,0 +1,22 @@
+"""Настройки gunicorn (файл подхватывается из рабочего каталога):
+
+    gunicorn app:server
+
+Приложение загружается один раз в главном процессе (preload_app): импорт
+numpy, pandas и dash и загрузка данных не повторяются в каждом worker'е, и
+новый worker готов сразу после fork. Таблицы в памяти общие у всех worker'ов
+(копирование при записи). Число worker'ов - WEB_CONCURRENCY, адрес и
+остальное - аргументами командной строки или GUNICORN_CMD_ARGS.
+"""
+import os
+
+bind = '127.0.0.1:8050'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = 4
+preload_app = True
+
+
+def post_worker_init(worker):
+    # Потоки главного процесса не переживают fork - фоновые задачи запускаются в каждом worker'е
+    import app
+    app.start_worker()
@@ -0,0 +1,126 @@
+"""Сведение нескольких выгрузок оценок в одну таблицу без дублей.
+
+Выгрузки могут отличаться набором столбцов (в data.csv нет
+ДиффенцированныйЗачет). Строки разных выгрузок считаются одной записью,
+если совпадает ключ содержимого; недостающие значения берутся из более
+полной выгрузки.
+
+    python ingest.py Компетенции.csv data.csv -o canonical.csv
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from data_engine import COMPETENCIES_FILE, read_competencies, source_signature
+
+# Столбцы канонической таблицы оценок (как в Компетенции.csv)
+CANONICAL_COLUMNS = ['Дисциплина', 'Курс', 'Семестр', 'КодКомпетенции', 'Компетенция', 'Тип_Компетенции',
+                     'Название', 'УчебныйГод', 'Код_Студента', 'Оценка', 'Описание', 'ДиффенцированныйЗачет']
+
+INTEGER_COLUMNS = ['Курс', 'Семестр', 'КодКомпетенции', 'Код_Студента', 'ДиффенцированныйЗачет']
+
+# Ключ содержимого: студент, дисциплина, компетенция, семестр, год и форма контроля.
+# Без Описание экзамен и курсовая работа по одной дисциплине склеились бы в одну запись
+KEY_COLUMNS = ['Код_Студента', 'Дисциплина', 'КодКомпетенции', 'Семестр', 'УчебныйГод', 'Описание']
+
+# Формы контроля, для которых тип зачета однозначен
+DIFF_CREDIT_BY_DESCRIPTION = {
+    'Зачет': 0,
+    'Экзамен': 1,
+    'КурсРаб': 1,
+    'КурсПроект': 1,
+    'ВыпРаб': 1,
+}
+
+def read_source(path):
+    """Читает выгрузку и приводит ее к каноническому набору столбцов"""
+    frame = read_competencies(path)
+    unknown = [column for column in frame.columns if column not in CANONICAL_COLUMNS]
+    if unknown:
+        print(f"{path}: пропущены неизвестные столбцы {', '.join(unknown)}")
+    present = [column for column in CANONICAL_COLUMNS if column in frame.columns]
+    return frame.reindex(columns=CANONICAL_COLUMNS), len(present)
+
+def content_key(frame):
+    """64-битный хэш ключа содержимого для каждой строки"""
+    return pd.util.hash_pandas_object(frame[KEY_COLUMNS], index=False)
+
+def merge_sources(paths):
+    """Объединяет выгрузки, убирая дубли по ключу содержимого.
+
+    Возвращает каноническую таблицу и статистику по выгрузкам.
+    """
+    sources = [(path, *read_source(path)) for path in paths]
+    # Более полные выгрузки идут первыми - их значения имеют приоритет
+    sources.sort(key=lambda source: source[2], reverse=True)
+
+    combined = pd.concat([frame for _, frame, _ in sources], ignore_index=True)
+    total_rows = len(combined)
+    missing_before = int(combined['ДиффенцированныйЗачет'].isna().sum())
+
+    # first() берет первое непустое значение каждого столбца среди дублей
+    canonical = combined.groupby(content_key(combined).to_numpy(), sort=False).first()
+    canonical = canonical.reset_index(drop=True)[CANONICAL_COLUMNS]
+
+    # То, что не нашлось ни в одной выгрузке, восстанавливаем по форме контроля
+    missing = canonical['ДиффенцированныйЗачет'].isna()
+    canonical.loc[missing, 'ДиффенцированныйЗачет'] = canonical.loc[missing, 'Описание'].map(DIFF_CREDIT_BY_DESCRIPTION)
+
+    for column in INTEGER_COLUMNS:
+        canonical[column] = canonical[column].astype('Int64')
+
+    stats = {
+        'sources': {path: len(frame) for path, frame, _ in sources},
+        'rows': total_rows,
+        'duplicates': total_rows - len(canonical),
+        'filled': missing_before - int(canonical['ДиффенцированныйЗачет'].isna().sum()),
+        'canonical': len(canonical),
+    }
+    return canonical, stats
+
+def write_canonical(frame, path):
+    # Тот же формат, что и у исходных выгрузок
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    frame.to_csv(tmp_path, sep=';', encoding='cp1251', index=False)
+    os.replace(tmp_path, path)
+
+def canonical_competencies_path(sources=None, store_dir='.canonical'):
+    """Путь к таблице оценок для движка данных.
+
+    Если задано несколько выгрузок (аргументом или через DATA_SOURCES, разделитель
+    os.pathsep), они сводятся в одну таблицу, которая сохраняется по версии
+    исходных файлов и пересобирается только при их изменении.
+    """
+    if sources is None:
+        sources = [path for path in os.environ.get('DATA_SOURCES', '').split(os.pathsep) if path]
+    if not sources:
+        return COMPETENCIES_FILE
+    if len(sources) == 1:
+        return sources[0]
+
+    path = os.path.join(store_dir, f'{source_signature(*sources)}.csv')
+    if not os.path.exists(path):
+        os.makedirs(store_dir, exist_ok=True)
+        canonical, stats = merge_sources(sources)
+        write_canonical(canonical, path)
+        print(f"Сведено {stats['rows']} строк из {len(sources)} выгрузок: "
+              f"{stats['duplicates']} дублей, итог {stats['canonical']}")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description='Сводит выгрузки оценок в одну таблицу без дублей')
+    parser.add_argument('sources', nargs='+', help='CSV-выгрузки (cp1251, разделитель ;)')
+    parser.add_argument('-o', '--output', default='canonical.csv', help='Куда записать каноническую таблицу')
+    args = parser.parse_args()
+
+    canonical, stats = merge_sources(args.sources)
+    write_canonical(canonical, args.output)
+    for path, rows in stats['sources'].items():
+        print(f'{path}: {rows} строк')
+    print(f"Всего строк: {stats['rows']}, дублей: {stats['duplicates']}, "
+          f"заполнено ДиффенцированныйЗачет: {stats['filled']}")
+    print(f"{args.output}: {stats['canonical']} строк")
+
+if __name__ == '__main__':
+    main()
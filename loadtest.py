@@ -0,0 +1,310 @@
+"""Нагрузочный тест дашборда через /_dash-update-component.
+
+Каждый виртуальный пользователь проходит типичный сценарий, как браузер:
+выбирает группу и студента, переключает семестры, кликает по радару,
+открывает вкладку успеваемости и кликает по секторам диаграммы. Запросы
+строятся по callback_map приложения, состояние компонентов обновляется
+ответами сервера.
+
+    python loadtest.py --threads 8 --duration 30                # Flask test client в этом процессе
+    python loadtest.py --url http://127.0.0.1:8050 --processes 4 --threads 8
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+UPDATE_PATH = '/_dash-update-component'
+
+# Приложение для режима test client; при fork дочерние процессы наследуют его от родителя
+_app = None
+
+
+class TestClientTransport:
+    """Запросы через Flask test client приложения в этом же процессе"""
+
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_json(silent=True)
+
+    def post(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу; одно keep-alive соединение на поток"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.prefix = parts.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+
+    def _request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        try:
+            self.connection.request(method, self.prefix + path, data, headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError):
+            # Сервер закрыл соединение - переподключаемся при следующем запросе
+            self.connection.close()
+            raise
+        return response.status, json.loads(payload) if payload else None
+
+    def get(self, path):
+        return self._request('GET', path)
+
+    def post(self, path, body):
+        return self._request('POST', path, body)
+
+def layout_state(layout):
+    """Начальные значения свойств компонентов: 'id.свойство' -> значение"""
+    state = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict) and 'props' in node:
+            props = node['props']
+            if isinstance(props.get('id'), str):
+                for name, value in props.items():
+                    if name not in ('id', 'children'):
+                        state[f"{props['id']}.{name}"] = value
+            stack.append(props.get('children'))
+    return state
+
+def find_callback(callback_map, output):
+    """Ключ callback'а, среди выходов которого есть output ('id.свойство')"""
+    for key in callback_map:
+        if output in key.strip('.').split('...'):
+            return key
+    raise KeyError(f'Нет callback\'а с выходом {output}')
+
+def page_state(transport, callback_map, layout):
+    """Начальное состояние страницы: макет и содержимое, которое callback строит по адресу страницы"""
+    state = layout_state(layout)
+    session = Session(transport, callback_map, state, None, [])
+    session.fire('страница', 'page-content.children', ['url.search'])
+    content = session.state.get('page-content.children')
+    if content is None:
+        raise RuntimeError('Не удалось получить содержимое страницы')
+    state.update(layout_state(content))
+    return state
+
+
+class Session:
+    """Один виртуальный пользователь: состояние компонентов и журнал запросов"""
+
+    def __init__(self, transport, callback_map, state, rng, results):
+        self.transport = transport
+        self.callback_map = callback_map
+        self.state = dict(state)
+        self.rng = rng
+        self.results = results
+
+    def fire(self, step, output, changed):
+        """Вызывает callback с выходом output после изменения свойств changed"""
+        key = find_callback(self.callback_map, output)
+        spec = self.callback_map[key]
+        outputs = [dict(zip(('id', 'property'), item.split('.', 1))) for item in key.strip('.').split('...')]
+        body = {
+            'output': key,
+            'outputs': outputs if key.startswith('..') else outputs[0],
+            'inputs': [{**item, 'value': self.state.get(f"{item['id']}.{item['property']}")} for item in spec['inputs']],
+            'state': [{**item, 'value': self.state.get(f"{item['id']}.{item['property']}")}
+                      for item in spec.get('state', [])],
+            'changedPropIds': changed,
+        }
+        started = time.perf_counter()
+        try:
+            status, payload = self.transport.post(UPDATE_PATH, body)
+            error = None if status in (200, 204) else f'HTTP {status}'
+        except Exception as exc:
+            status, payload, error = None, None, type(exc).__name__
+        self.results.append((step, (time.perf_counter() - started) * 1000, error))
+
+        # 204 - PreventUpdate, состояние не меняется
+        if status == 200 and payload:
+            for component_id, props in payload.get('response', {}).items():
+                for name, value in props.items():
+                    self.state[f'{component_id}.{name}'] = value
+        return payload
+
+    def set(self, prop, value):
+        self.state[prop] = value
+        return prop
+
+    def options(self, prop):
+        return [option['value'] if isinstance(option, dict) else option for option in self.state.get(prop) or []]
+
+    def run(self):
+        rng = self.rng
+        groups = self.options('group-dropdown.options')
+        if not groups:
+            return
+        group = rng.choice(groups)
+
+        # Группа -> список студентов
+        self.fire('выбор группы', 'student-dropdown.options', [self.set('group-dropdown.value', group)])
+        students = self.options('student-dropdown.options')
+        if students:
+            changed = [self.set('student-dropdown.value', rng.choice(students))]
+            self.fire('радар', 'radar-chart.figure', changed)
+            self.fire('динамика', 'trajectory-chart.figure', changed)
+            self.fire('тепловая карта группы', 'group-heatmap.figure', [self.set('group-dropdown.value', group)])
+
+            # Переключение семестров
+            semesters = self.options('semester-dropdown.options')
+            for _ in range(rng.randint(1, 3)):
+                selected = sorted(rng.sample(semesters, rng.randint(1, len(semesters)))) if semesters else []
+                self.fire('смена семестров', 'radar-chart.figure', [self.set('semester-dropdown.value', selected)])
+
+            # Клик по компетенции на радаре
+            figure = self.state.get('radar-chart.figure') or {}
+            theta = (figure.get('data') or [{}])[0].get('theta') or []
+            if theta:
+                changed = [self.set('radar-chart.clickData', {'points': [{'theta': rng.choice(theta)}]})]
+                self.fire('клик по радару', 'radar-chart.figure', changed)
+
+        # Вкладка успеваемости с фильтром по группе
+        changed = [self.set('performance-group-dropdown.value', [group])]
+        self.fire('фильтры успеваемости', 'performance-course-dropdown.options', changed)
+        self.fire('успеваемость', 'performance-pie-chart.figure', changed)
+
+        # Клик по сектору диаграммы оценок
+        figure = self.state.get('performance-pie-chart.figure') or {}
+        labels = (figure.get('data') or [{}])[0].get('labels') or []
+        if labels:
+            changed = [self.set('performance-pie-chart.clickData', {'points': [{'label': rng.choice(labels)}]})]
+            self.fire('клик по диаграмме', 'performance-pie-chart.figure', changed)
+
+def _local_app():
+    global _app
+    if _app is None:
+        # Синтетические сессии не должны попадать в журнал популярных запросов для прогрева
+        os.environ.setdefault('PREWARM_LOG', '')
+        import app as app_module
+        _app = app_module.app
+    return _app
+
+def _make_transport(url):
+    return HttpTransport(url) if url else TestClientTransport(_local_app().server)
+
+def _worker_thread(url, callback_map, initial_state, seed, deadline, sessions, results):
+    rng = random.Random(seed)
+    transport = _make_transport(url)
+    done = 0
+    while (sessions is None or done < sessions) and (deadline is None or time.perf_counter() < deadline):
+        Session(transport, callback_map, initial_state, rng, results).run()
+        done += 1
+
+def run_threads(url, callback_map, initial_state, threads, seed, duration=30, sessions=None):
+    """Запускает threads пользователей; возвращает список (шаг, задержка мс, ошибка)"""
+    results = []
+    deadline = time.perf_counter() + duration if sessions is None else None
+    workers = [threading.Thread(target=_worker_thread,
+                                args=(url, callback_map, initial_state, seed * 1000 + i, deadline, sessions, results))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+def _process_main(args):
+    return run_threads(*args)
+
+def summarize(results, elapsed):
+    """Сводка: пропускная способность, перцентили задержки и доля ошибок по шагам"""
+    rows = []
+    by_step = {}
+    for step, latency, error in results:
+        by_step.setdefault(step, []).append((latency, error))
+    for step, items in [('всего', [(latency, error) for _, latency, error in results])] + list(by_step.items()):
+        latencies = np.array([latency for latency, _ in items])
+        errors = sum(1 for _, error in items if error)
+        p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99]) if len(latencies) else (0, 0, 0, 0)
+        rows.append({'step': step, 'requests': len(items), 'errors': errors,
+                     'error_rate': errors / len(items) if items else 0,
+                     'rps': len(items) / elapsed if elapsed else 0,
+                     'p50': p50, 'p90': p90, 'p95': p95, 'p99': p99,
+                     'max': latencies.max() if len(latencies) else 0})
+    return rows
+
+def print_report(rows, elapsed, workers):
+    print(f'Длительность: {elapsed:.1f} с, виртуальных пользователей: {workers}')
+    print(f"{'шаг':<24} {'запросов':>8} {'в сек':>7} {'ошибок':>7} {'p50':>7} {'p90':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+    for row in rows:
+        print(f"{row['step']:<24} {row['requests']:>8} {row['rps']:>7.1f} {row['error_rate']:>6.1%} "
+              f"{row['p50']:>7.0f} {row['p90']:>7.0f} {row['p95']:>7.0f} {row['p99']:>7.0f} {row['max']:>7.0f}")
+    print('Задержки в миллисекундах')
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест callback\'ов дашборда')
+    parser.add_argument('--url', help='Адрес запущенного приложения; без него - Flask test client в процессе')
+    parser.add_argument('--threads', type=int, default=4, help='Потоков (пользователей) на процесс')
+    parser.add_argument('--processes', type=int, default=1, help='Число процессов')
+    parser.add_argument('--duration', type=float, default=30, help='Длительность теста, с')
+    parser.add_argument('--sessions', type=int, default=None, help='Сценариев на поток вместо длительности')
+    parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора сценариев')
+    parser.add_argument('--json', help='Сохранить сводку в JSON-файл')
+    parser.add_argument('--max-error-rate', type=float, default=0.0,
+                        help='Код возврата 1, если доля ошибок больше этой')
+    args = parser.parse_args()
+
+    if args.url:
+        transport = HttpTransport(args.url)
+        status, dependencies = transport.get('/_dash-dependencies')
+        if status != 200:
+            sys.exit(f'Не удалось получить список callback\'ов: HTTP {status}')
+        callback_map = {item['output']: item for item in dependencies}
+    else:
+        transport = TestClientTransport(_local_app().server)
+        callback_map = _local_app().callback_map
+    status, layout = transport.get('/_dash-layout')
+    if status != 200:
+        sys.exit(f'Не удалось получить layout: HTTP {status}')
+    try:
+        initial_state = page_state(transport, callback_map, layout)
+    except RuntimeError as error:
+        sys.exit(str(error))
+
+    started = time.perf_counter()
+    if args.processes > 1:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        with context.Pool(args.processes) as pool:
+            chunks = pool.map(_process_main, [(args.url, callback_map, initial_state, args.threads,
+                                               args.seed + i * 7919, args.duration, args.sessions)
+                                              for i in range(args.processes)])
+        results = [item for chunk in chunks for item in chunk]
+    else:
+        results = run_threads(args.url, callback_map, initial_state, args.threads, args.seed,
+                              args.duration, args.sessions)
+    elapsed = time.perf_counter() - started
+
+    rows = summarize(results, elapsed)
+    print_report(rows, elapsed, args.threads * args.processes)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'elapsed': elapsed, 'workers': args.threads * args.processes, 'steps': rows},
+                      f, ensure_ascii=False, indent=1, default=float)
+    if rows and rows[0]['error_rate'] > args.max_error_rate:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
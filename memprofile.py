@@ -0,0 +1,248 @@
+"""Диагностика памяти: объем загруженных данных, кэшей и выделений в callback'ах.
+
+Включается переменной окружения MEMORY_PROFILE=1. Тогда запускается
+tracemalloc, callback'и дашборда записывают пиковое выделение памяти за вызов
+и размер ответа, а сводка отдается в JSON:
+
+    MEMORY_PROFILE=1 python app.py
+    curl 'http://127.0.0.1:8050/diagnostics/memory?top=20'
+
+tracemalloc замедляет каждое выделение памяти, поэтому в обычной работе
+режим выключен, и маршрут не регистрируется.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import tracemalloc
+import types
+
+import numpy as np
+import pandas as pd
+from flask import Response, request
+from plotly.io.json import to_json_plotly
+
+from cache import all_caches
+
+MEMORY_PROFILE = os.environ.get('MEMORY_PROFILE', '').lower() in ('1', 'true', 'yes')
+# Глубина стека, которую tracemalloc запоминает для каждого выделения
+MEMORY_PROFILE_FRAMES = int(os.environ.get('MEMORY_PROFILE_FRAMES', 1))
+
+# Объекты, в которые не спускаемся: они общие для всего процесса
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+def deep_sizeof(value, seen=None):
+    """Приблизительный объем памяти объекта вместе со всем, на что он ссылается.
+
+    Объект, уже встреченный в seen, не учитывается повторно. Таблицы pandas
+    считаются через memory_usage(deep=True), поэтому строки, общие для таблицы и
+    массива из нее, могут попасть в сумму дважды.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen or isinstance(value, _SHARED_TYPES):
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        # Представление чужого буфера само по себе данных не хранит
+        size = sys.getsizeof(value)
+        if value.dtype == object:
+            size += sum(deep_sizeof(item, seen) for item in value.ravel())
+        return size
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += deep_sizeof(vars(value), seen)
+    for slot in getattr(type(value), '__slots__', ()):
+        if hasattr(value, slot):
+            size += deep_sizeof(getattr(value, slot), seen)
+    return size
+
+def payload_size(result):
+    """Размер ответа callback'а в JSON, байт (None, если ответ не сериализуется)"""
+    try:
+        return len(to_json_plotly(result).encode('utf-8'))
+    except Exception:
+        return None
+
+def process_memory():
+    """Текущий и максимальный резидентный объем процесса, байт"""
+    memory = {'rss': None, 'max_rss': None}
+    try:
+        with open('/proc/self/statm') as f:
+            memory['rss'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдает килобайты, macOS - байты
+        memory['max_rss'] = max_rss if sys.platform == 'darwin' else max_rss * 1024
+    except ImportError:
+        pass
+    return memory
+
+
+class CallbackMemoryStats:
+    """Пиковые выделения памяти и размеры ответов по callback'ам.
+
+    tracemalloc считает пик на весь процесс. Пик вызова - максимум выделенной
+    памяти во время вызова сверх той, что была занята в его начале. Если
+    одновременно выполнялись другие callback'и, их выделения попадают в этот
+    пик; такие вызовы считаются в overlapped, а peak_max_exclusive учитывает
+    только вызовы, которые шли в одиночку.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._started = 0
+        self.stats = {}
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self._lock:
+                alone = self._active == 0
+                if alone:
+                    tracemalloc.reset_peak()
+                self._active += 1
+                self._started += 1
+                ticket = self._started
+                start = tracemalloc.get_traced_memory()[0]
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    peak = max(tracemalloc.get_traced_memory()[1] - start, 0)
+                    exclusive = alone and self._started == ticket
+                self.record(fn.__name__, peak, exclusive, payload_size(result))
+        return wrapper
+
+    def record(self, name, peak, exclusive, payload):
+        with self._lock:
+            entry = self.stats.setdefault(name, {
+                'calls': 0, 'overlapped': 0, 'peak_last': 0, 'peak_max': 0, 'peak_total': 0,
+                'peak_max_exclusive': 0, 'payload_last': None, 'payload_max': 0,
+            })
+            entry['calls'] += 1
+            entry['peak_last'] = peak
+            entry['peak_max'] = max(entry['peak_max'], peak)
+            entry['peak_total'] += peak
+            if exclusive:
+                entry['peak_max_exclusive'] = max(entry['peak_max_exclusive'], peak)
+            else:
+                entry['overlapped'] += 1
+            entry['payload_last'] = payload
+            if payload is not None:
+                entry['payload_max'] = max(entry['payload_max'], payload)
+
+    def summary(self):
+        with self._lock:
+            rows = [{'callback': name, **entry, 'peak_mean': entry['peak_total'] // entry['calls']}
+                    for name, entry in self.stats.items()]
+        for row in rows:
+            del row['peak_total']
+        return sorted(rows, key=lambda row: row['peak_max'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+# Статистика процесса; заполняется, только если профилирование включено
+callback_stats = CallbackMemoryStats()
+
+def start_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(MEMORY_PROFILE_FRAMES)
+
+def memory_recorder():
+    """Декоратор из переменных окружения; если профилирование выключено - функция не оборачивается"""
+    if not MEMORY_PROFILE:
+        return lambda fn: fn
+    start_tracing()
+    return callback_stats
+
+def dataset_sizes(engine):
+    """Объем таблиц и производных индексов текущего снимка данных движка"""
+    snapshot = getattr(engine, 'snapshot', None)
+    if snapshot is None:
+        # SQLite: данные лежат в файле базы, но его страницы читаются в кэш ОС, а полные выборки
+        # (риск, прогноз, распределения оценок) занимают в памяти объем того же порядка
+        db_path = getattr(engine, 'db_path', None)
+        if db_path is None or not os.path.exists(db_path):
+            return []
+        return [{'name': 'database', 'type': 'sqlite', 'length': None, 'bytes': os.path.getsize(db_path)}]
+    seen = set()
+    rows = []
+    for name, value in vars(snapshot).items():
+        if isinstance(value, (str, int, float)) or value is None:
+            continue
+        rows.append({'name': name, 'type': type(value).__name__,
+                     'length': len(value) if hasattr(value, '__len__') else None,
+                     'bytes': deep_sizeof(value, seen)})
+    return rows
+
+def cache_sizes():
+    """Число записей и объем каждого LRU-кэша процесса"""
+    rows = []
+    for cache in all_caches():
+        entries = cache.items()
+        rows.append({'name': cache.name, 'entries': len(entries), 'maxsize': cache.maxsize,
+                     'hits': cache.hits, 'misses': cache.misses,
+                     'bytes': sum(deep_sizeof(key) + deep_sizeof(value) for key, value in entries)})
+    return rows
+
+def top_allocations(limit=10):
+    """Строки кода, за которыми сейчас числится больше всего памяти"""
+    if not tracemalloc.is_tracing():
+        return []
+    statistics = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ]).statistics('lineno')
+    return [{'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+             'bytes': stat.size, 'count': stat.count} for stat in statistics[:limit]]
+
+def memory_report(engine, top=10):
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    return {
+        'version': engine.version,
+        'engine': engine.name,
+        'process': process_memory(),
+        'tracemalloc': {'current': current, 'peak': peak},
+        'datasets': dataset_sizes(engine),
+        'caches': cache_sizes(),
+        'callbacks': callback_stats.summary(),
+        'top_allocations': top_allocations(top),
+    }
+
+def register_memory_routes(server, engine):
+    """Регистрирует /diagnostics/memory, если профилирование памяти включено.
+
+    top=N - число строк кода с наибольшим объемом выделенной памяти,
+    reset=1 - после ответа обнулить статистику callback'ов.
+    """
+    if not MEMORY_PROFILE:
+        return
+    start_tracing()
+
+    @server.route('/diagnostics/memory', endpoint='diagnostics_memory')
+    def diagnostics_memory():
+        report = memory_report(engine, top=request.args.get('top', 10, type=int))
+        if request.args.get('reset', '').lower() in ('1', 'true', 'yes'):
+            callback_stats.reset()
+        return Response(json.dumps(report, ensure_ascii=False, indent=1), mimetype='application/json')
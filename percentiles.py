@@ -0,0 +1,367 @@
+"""Процентили студентов по успеваемости и посещаемости в группе, на курсе, на направлении и в институте.
+
+Распределение значений на каждом уровне хранится KLL-эскизом (KLLSketch):
+эскиз занимает O(k) памяти независимо от числа студентов, эскизы можно
+сливать, а положение значения в распределении находится двоичным поиском по
+эскизу - без сортировки всех студентов на каждый запрос.
+
+Листовые эскизы строятся по группе и семестру (и по группе за все семестры)
+и хранятся вместе с отпечатком строк группы. Индекс строится не при
+загрузке данных, а при первом запросе процентилей новой версии: строки
+читаются частями и сразу сводятся в суммы по студентам, поэтому вся таблица
+оценок в памяти не собирается, а движок partitioned не загружает
+исторические разделы в свой LRU. Пересчитываются только группы, чьи оценки
+или посещаемость изменились, а эскизы курса, направления и института заново
+сливаются из листовых.
+
+Уровни семестра сравнивают студентов одного полугодия: курс - группы того же
+курса в том же учебном году и семестре (осень/весна), направление - группы
+того же направления, институт - все группы. Уровни "за все семестры"
+сравнивают студентов по итогу обучения, курс - текущий курс группы.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from risk import group_fingerprints
+from score_matrix import row_points
+from singleflight import SingleFlight
+
+# Точность эскиза: ошибка ранга порядка 1.7/k, до k значений эскиз точный
+KLL_K = int(os.environ.get('KLL_K', 200))
+
+SCORE_METRIC = 'score'
+ATTENDANCE_METRIC = 'attendance'
+METRICS = [SCORE_METRIC, ATTENDANCE_METRIC]
+LEVELS = ['group', 'course', 'direction', 'institute']
+LEVEL_LABELS = {'group': 'в группе', 'course': 'на курсе', 'direction': 'на направлении', 'institute': 'в институте'}
+# Семестр листа "за все семестры"
+ALL_SEMESTERS = 0
+# Строк в одной части при проходе по данным
+CHUNK_ROWS = 50000
+
+CELL_KEYS = ['Группа', 'Семестр', 'Код_Студента', 'last_word']
+VISIT_KEYS = ['Группа', 'Семестр', 'Код_Студента']
+VISIT_COLUMNS = ['records', 'total', 'missed']
+
+# Направление - номер группы без номера подгруппы: 2.210-1 -> 2.210, 404а -> 404
+DIRECTION_PATTERN = re.compile(r'^(.+?)(?:-\d+|[^\W\d_]+)$')
+
+# Листовые эскизы групп: (набор данных, группа) -> (отпечаток данных группы, GroupLeaves)
+leaf_store = LRUCache('percentile-leaves', maxsize=512)
+# Индексы по (набор данных, версия данных)
+index_cache = LRUCache('percentile-index', maxsize=4)
+_flight = SingleFlight()
+
+def direction_of(group):
+    match = DIRECTION_PATTERN.match(str(group))
+    return match.group(1) if match else str(group)
+
+
+class KLLSketch:
+    """Сливаемый квантильный эскиз KLL (Karnin, Lang, Liberty, 2016).
+
+    Уровень h хранит значения с весом 2**h. Переполненный уровень сжимается:
+    значения сортируются, и каждое второе (со смещением 0 или 1) переходит
+    уровнем выше с удвоенным весом. Емкость уровня убывает в 2/3 раза с
+    удалением от верхнего, поэтому общий объем - O(k). Смещение берется из
+    хэша, а не из генератора случайных чисел: одинаковые данные дают
+    одинаковый эскиз во всех worker'ах.
+    """
+
+    def __init__(self, k=KLL_K):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._compactions = [0]
+        self._cumulative = None
+
+    @classmethod
+    def from_values(cls, values, k=KLL_K):
+        sketch = cls(k)
+        sketch.update(values)
+        return sketch
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def __len__(self):
+        return sum(len(items) for items in self.levels)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other):
+        """Новый эскиз по значениям обоих; исходные эскизы не меняются"""
+        merged = KLLSketch(self.k)
+        depth = max(len(self.levels), len(other.levels))
+        merged.levels = [np.concatenate([self.levels[h] if h < len(self.levels) else np.empty(0),
+                                         other.levels[h] if h < len(other.levels) else np.empty(0)])
+                         for h in range(depth)]
+        merged._compactions = [(self._compactions[h] if h < len(self._compactions) else 0)
+                               + (other._compactions[h] if h < len(other._compactions) else 0)
+                               for h in range(depth)]
+        merged.n = self.n + other.n
+        merged._compress()
+        return merged
+
+    def _compress(self):
+        self._cumulative = None
+        while len(self) > sum(self.capacity(h) for h in range(len(self.levels))):
+            level = next(h for h in range(len(self.levels)) if len(self.levels[h]) > self.capacity(h))
+            self._compact(level)
+
+    def _compact(self, level):
+        items = np.sort(self.levels[level])
+        if level + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+            self._compactions.append(0)
+        # При нечетном числе значений одно остается на своем уровне, чтобы сохранить общий вес
+        kept, items = items[:len(items) % 2], items[len(items) % 2:]
+        # Смещение - бит хэша от числа значений, уровня и номера сжатия: детерминировано, но без перекоса
+        offset = ((self.n * 2654435761 + level * 40503 + self._compactions[level]) >> 16) & 1
+        self._compactions[level] += 1
+        self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+        self.levels[level] = kept
+
+    def _sorted(self):
+        # Эскиз после построения не меняется - отсортированные значения и веса считаются один раз
+        if self._cumulative is None:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(level_items), 2 ** h, dtype=np.int64)
+                                      for h, level_items in enumerate(self.levels)])
+            order = np.argsort(items, kind='stable')
+            self._cumulative = (items[order], np.cumsum(weights[order]))
+        return self._cumulative
+
+    def percentile(self, values):
+        """Доля значений ниже values (совпадающие считаются наполовину), в процентах"""
+        values = np.asarray(values, dtype=float)
+        if self.n == 0:
+            return np.full(values.shape, np.nan)
+        items, cumulative = self._sorted()
+        cumulative = np.concatenate([[0], cumulative])
+        below = cumulative[np.searchsorted(items, values, side='left')]
+        not_above = cumulative[np.searchsorted(items, values, side='right')]
+        return np.round((below + not_above) / 2 / self.n * 100, 1)
+
+    def quantile(self, q):
+        if self.n == 0:
+            return np.nan
+        items, cumulative = self._sorted()
+        return float(items[min(np.searchsorted(cumulative, q * self.n, side='left'), len(items) - 1)])
+
+def competency_sums(rows):
+    """Число изученных строк и сумма баллов по (группа, семестр, студент, компетенция) для части строк оценок"""
+    studied, real, _ = row_points(rows)
+    cells = pd.DataFrame({
+        'Группа': rows['Название'].to_numpy(),
+        'Семестр': rows['Семестр'].to_numpy(),
+        'Код_Студента': rows['Код_Студента'].to_numpy(),
+        'last_word': rows['last_word'].to_numpy(),
+        'studied': studied,
+        'real': real,
+    })
+    return cells.groupby(CELL_KEYS, sort=False)[['studied', 'real']].sum()
+
+def semester_terms(rows):
+    """Учебный год, курс и наибольший курс каждого семестра группы для части строк оценок"""
+    return rows.groupby(['Название', 'Семестр']).agg(
+        УчебныйГод=('УчебныйГод', 'first'), Курс=('Курс', 'first'), max_course=('Курс', 'max'))
+
+def attendance_sums(rows):
+    """Число записей, занятий и пропусков по (группа, семестр, студент) для части строк посещаемости"""
+    visits = pd.DataFrame({
+        'Группа': rows['Группа'].to_numpy(),
+        'Семестр': rows['Семестр'].to_numpy(),
+        'Код_Студента': rows['Код'].to_numpy(),
+        'records': 1,
+        'total': rows['ВсегоЗанятийПоЖурналу'].to_numpy(),
+        'missed': rows['ПропусковНеуважитПрич'].to_numpy(),
+    })
+    return visits.groupby(VISIT_KEYS, sort=False)[VISIT_COLUMNS].sum()
+
+def _all_semesters(sums, keys):
+    # Суммы за все семестры - строки с Семестр = ALL_SEMESTERS
+    other = [key for key in keys if key != 'Семестр']
+    return sums.groupby(level=other).sum().reset_index().assign(Семестр=ALL_SEMESTERS).set_index(keys)
+
+def student_values(cell_sums, visit_sums):
+    """Успеваемость и посещаемость каждого студента по семестрам и за все семестры.
+
+    Те же правила, что в таблице рейтингов (engine.ratings): средний балл
+    изученных компетенций (0, если изученных нет) и процент посещенных
+    занятий (0, если записей посещаемости у студента нет, и 100, если в
+    записях нет занятий). Строки за все семестры имеют Семестр = ALL_SEMESTERS.
+    """
+    frames = []
+    for sums in (cell_sums, _all_semesters(cell_sums, CELL_KEYS)):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.round(sums['real'] * 100 / sums['studied'].where(sums['studied'] > 0), 2)
+        frames.append(scores.groupby(level=VISIT_KEYS).mean().fillna(0).round(2).rename(SCORE_METRIC))
+    values = pd.concat(frames).to_frame()
+
+    visits = pd.concat([visit_sums, _all_semesters(visit_sums, VISIT_KEYS)]).reindex(values.index).fillna(0)
+    total, missed = visits['total'].to_numpy(), visits['missed'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percent = np.where(total > 0, (total - missed) / total * 100, 100.0)
+    values[ATTENDANCE_METRIC] = np.round(np.where(visits['records'].to_numpy() > 0, percent, 0.0), 2)
+    return values
+
+
+class GroupLeaves:
+    """Значения студентов группы, листовые эскизы по семестрам и ключи уровней каждого листа"""
+
+    def __init__(self, group, values, terms):
+        self.group = group
+        self.values = values.droplevel('Группа')
+        self.sketches = {}
+        self.level_keys = {}
+        direction = direction_of(group)
+        for semester, semester_values in self.values.groupby(level='Семестр'):
+            for metric in METRICS:
+                self.sketches[(metric, semester)] = KLLSketch.from_values(semester_values[metric].to_numpy())
+            if semester == ALL_SEMESTERS:
+                term = (ALL_SEMESTERS,)
+                course = int(terms['max_course'].max())
+            else:
+                # Полугодие: учебный год и осенний (нечетный) или весенний семестр
+                term = (terms.at[semester, 'УчебныйГод'], semester % 2)
+                course = int(terms.at[semester, 'Курс'])
+            self.level_keys[semester] = {
+                'group': (group, semester),
+                'course': term + (course,),
+                'direction': term + (direction,),
+                'institute': term,
+            }
+
+
+class PercentileIndex:
+    """Эскизы всех уровней для одной версии данных"""
+
+    def __init__(self, leaves):
+        self.leaves = {group_leaves.group: group_leaves for group_leaves in leaves}
+        self.sketches = {}
+        for group_leaves in leaves:
+            for (metric, semester), sketch in group_leaves.sketches.items():
+                for level, key in group_leaves.level_keys[semester].items():
+                    existing = self.sketches.get((metric, level, key))
+                    self.sketches[(metric, level, key)] = sketch if existing is None else existing.merge(sketch)
+
+    def sketch(self, metric, level, group, semester=ALL_SEMESTERS):
+        group_leaves = self.leaves.get(group)
+        if group_leaves is None or semester not in group_leaves.level_keys:
+            return None
+        return self.sketches.get((metric, level, group_leaves.level_keys[semester][level]))
+
+    def percentiles(self, metric, group, semester, values):
+        """Процентили values на каждом уровне: {уровень: массив}"""
+        result = {}
+        for level in LEVELS:
+            sketch = self.sketch(metric, level, group, semester)
+            result[level] = (sketch.percentile(values) if sketch is not None
+                             else np.full(np.shape(values), np.nan))
+        return result
+
+    def student(self, group, student, semester=ALL_SEMESTERS):
+        """Значения студента и их процентили на каждом уровне (None, если студента нет в данных)"""
+        group_leaves = self.leaves.get(group)
+        if group_leaves is None or (semester, student) not in group_leaves.values.index:
+            return None
+        values = group_leaves.values.loc[(semester, student)]
+        return {metric: {'value': float(values[metric]),
+                         'percentiles': {level: float(percentile) for level, percentile
+                                         in self.percentiles(metric, group, semester, values[metric]).items()}}
+                for metric in METRICS}
+
+def _add_fingerprints(total, part):
+    # Отпечаток группы - число строк и сумма хэшей по модулю 2**64, поэтому части складываются
+    for group, (count, value) in part.items():
+        total_count, total_value = total.get(group, (0, 0))
+        total[group] = (total_count + count, (total_value + value) % 2 ** 64)
+
+def _group_sums(parts, names, keys, columns):
+    # Суммы частей только по группам names
+    if not parts:
+        return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_arrays([[]] * len(keys), names=keys))
+    sums = pd.concat(parts)
+    sums = sums[sums.index.get_level_values(0).isin(names)]
+    return sums.groupby(level=keys).agg(columns)
+
+def percentile_index(engine):
+    """Индекс процентилей для текущей версии данных; неизменившиеся группы берутся из хранилища.
+
+    Строится при первом запросе процентилей одним проходом по строкам частями
+    (iter_competency_rows, iter_attendance_rows): в памяти остаются только
+    суммы по студентам и компетенциям, а не вся таблица оценок.
+    """
+    dataset, version = engine.dataset, engine.version
+    cached = index_cache.get((dataset, version))
+    if cached is not None:
+        return cached
+
+    def compute():
+        cells, terms, visits = [], [], []
+        fingerprints, attendance_fingerprints = {}, {}
+        for rows in engine.iter_competency_rows(chunksize=CHUNK_ROWS):
+            cells.append(competency_sums(rows))
+            terms.append(semester_terms(rows))
+            _add_fingerprints(fingerprints, group_fingerprints(rows, 'Название'))
+        for rows in engine.iter_attendance_rows(chunksize=CHUNK_ROWS):
+            visits.append(attendance_sums(rows))
+            _add_fingerprints(attendance_fingerprints, group_fingerprints(rows, 'Группа'))
+
+        leaves, changed = {}, []
+        for group in sorted(fingerprints):
+            fingerprint = (fingerprints[group], attendance_fingerprints.get(group))
+            entry = leaf_store.get((dataset, group))
+            if entry is not None and entry[0] == fingerprint:
+                leaves[group] = entry[1]
+            else:
+                changed.append((group, fingerprint))
+
+        if changed:
+            # Все измененные группы - одним расчетом по суммам
+            names = [group for group, _ in changed]
+            values = student_values(_group_sums(cells, names, CELL_KEYS, {'studied': 'sum', 'real': 'sum'}),
+                                    _group_sums(visits, names, VISIT_KEYS, dict.fromkeys(VISIT_COLUMNS, 'sum')))
+            group_terms = _group_sums(terms, names, ['Название', 'Семестр'],
+                                      {'УчебныйГод': 'first', 'Курс': 'first', 'max_course': 'max'})
+            for group, fingerprint in changed:
+                group_leaves = GroupLeaves(group, values.xs(group, level='Группа', drop_level=False),
+                                           group_terms.xs(group, level='Название'))
+                leaf_store.put((dataset, group), (fingerprint, group_leaves))
+                leaves[group] = group_leaves
+
+        # Эскизы сливаются в порядке групп: индекс после перезагрузки совпадает с построенным заново
+        index = PercentileIndex([leaves[group] for group in sorted(leaves)])
+        index_cache.put((dataset, version), index)
+        return index
+
+    return _flight.do((dataset, version), compute)
+
+# Столбцы процентилей таблицы рейтингов (в группе место уже показано рейтингом)
+METRIC_LABELS = {SCORE_METRIC: 'успеваемость', ATTENDANCE_METRIC: 'посещаемость'}
+PERCENTILE_COLUMNS = {(metric, level): f'Процентиль {LEVEL_LABELS[level]} ({METRIC_LABELS[metric]})'
+                      for level in ['course', 'direction', 'institute'] for metric in METRICS}
+RATING_METRIC_COLUMNS = {SCORE_METRIC: 'Успеваемость (%)', ATTENDANCE_METRIC: 'Посещаемость (%)'}
+
+def ratings_percentiles(index, ratings_df, group, semester):
+    """Таблица рейтингов группы за семестр со столбцами PERCENTILE_COLUMNS"""
+    if ratings_df.empty:
+        return ratings_df
+    result = ratings_df.copy()
+    for metric in METRICS:
+        percentiles = index.percentiles(metric, group, semester, ratings_df[RATING_METRIC_COLUMNS[metric]].to_numpy())
+        for (column_metric, level), column in PERCENTILE_COLUMNS.items():
+            if column_metric == metric:
+                result[column] = percentiles[level]
+    return result
@@ -0,0 +1,286 @@
+"""Прогрев кэшей по самым частым запросам.
+
+Декоратор AccessLog считает вызовы расчетов дашборда, результаты которых
+хранятся в кэшах (рейтинги, матрицы баллов, риск, прогноз, распределения,
+куб посещаемости), по набору данных и аргументам - группам, семестрам,
+фильтрам - и раз в PREWARM_SAVE_INTERVAL секунд добавляет новые вызовы к
+счетчикам в файле PREWARM_LOG, оставляя PREWARM_LOG_SIZE самых частых: файл
+общий у всех worker'ов и копит вызовы всего развертывания. После запуска сервера и после перезагрузки
+данных Prewarmer в фоновом пуле из PREWARM_WORKERS потоков повторяет
+PREWARM_TOP самых частых вызовов, пока не израсходует PREWARM_CPU_SECONDS
+секунд процессорного времени. Запросы пользователей при этом обслуживаются
+как обычно: одинаковый с прогревом расчет ждет его результата (SingleFlight),
+а не считает заново.
+
+Пустой PREWARM_LOG отключает и журнал, и прогрев.
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from singleflight import normalize_key
+
+PREWARM_LOG = os.environ.get('PREWARM_LOG', '.prewarm.json')
+PREWARM_LOG_SIZE = int(os.environ.get('PREWARM_LOG_SIZE', 1000))
+PREWARM_SAVE_INTERVAL = float(os.environ.get('PREWARM_SAVE_INTERVAL', 60))
+PREWARM_TOP = int(os.environ.get('PREWARM_TOP', 100))
+PREWARM_WORKERS = int(os.environ.get('PREWARM_WORKERS', 1))
+PREWARM_CPU_SECONDS = float(os.environ.get('PREWARM_CPU_SECONDS', 30))
+
+def _json_default(value):
+    # numpy-скаляры сохраняются числами, чтобы прогрев вызывал функцию с теми же аргументами
+    return value.item() if hasattr(value, 'item') else str(value)
+
+def entry_key(name, dataset, args):
+    """Ключ вызова: позиционные аргументы сохраняют порядок, нормализуются только их значения"""
+    return json.dumps([name, dataset, [normalize_key(arg) for arg in args]],
+                      ensure_ascii=False, default=_json_default)
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Межпроцессная блокировка на время чтения и записи журнала"""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class AccessLog:
+    """Счетчики вызовов по (функция, набор данных, аргументы).
+
+    Хранится не больше max_entries ключей: при переполнении отбрасываются
+    самые редкие. Аргументы записываются в том виде, в каком пришли в первый
+    раз, ключ - их нормализованная форма (порядок выбранных значений внутри
+    аргумента не важен). Вызовы с последнего сохранения копятся отдельно и при
+    save() прибавляются к счетчикам файла под блокировкой: несколько worker'ов
+    пишут в один журнал, не затирая счетчики друг друга. Без path журнал
+    выключен: декоратор возвращает функцию как есть.
+    """
+
+    def __init__(self, path=PREWARM_LOG, dataset=None, max_entries=PREWARM_LOG_SIZE,
+                 save_interval=PREWARM_SAVE_INTERVAL):
+        self.path = path
+        self.dataset = dataset
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self.functions = {}
+        self._entries = {}  # ключ -> {'callback', 'dataset', 'args', 'count'}
+        self._pending = {}  # то же для вызовов, еще не сохраненных в файл
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved = time.monotonic()
+        self.load()
+
+    def __call__(self, fn):
+        if not self.path:
+            return fn
+        # Прогрев вызывает исходную функцию, поэтому сам в журнал не попадает
+        self.functions[fn.__name__] = fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not kwargs:
+                self.record(fn.__name__, args)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    def record(self, name, args):
+        dataset = self.dataset() if self.dataset else None
+        try:
+            key = entry_key(name, dataset, args)
+        except TypeError:
+            return
+        with self._lock:
+            for entries in (self._entries, self._pending):
+                entry = entries.get(key)
+                if entry is None:
+                    entry = entries[key] = {'callback': name, 'dataset': dataset, 'args': list(args), 'count': 0}
+                entry['count'] += 1
+            if len(self._entries) > self.max_entries:
+                self._prune()
+            self._dirty = True
+            due = time.monotonic() - self._saved >= self.save_interval
+        if due:
+            self.save()
+
+    def _prune(self):
+        # Вызывается под self._lock; оставляет 80% лимита, чтобы не сортировать на каждой новой записи
+        keep = sorted(self._entries.items(), key=lambda item: item[1]['count'], reverse=True)
+        self._entries = dict(keep[:int(self.max_entries * 0.8)])
+
+    def top(self, limit=PREWARM_TOP):
+        """Самые частые вызовы, от частых к редким"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        entries.sort(key=lambda entry: entry['count'], reverse=True)
+        return entries[:limit]
+
+    def _read(self):
+        """Записи файла журнала по ключам"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as error:
+            print(f'Журнал прогрева {self.path} не прочитан: {error}')
+            return {}
+        result = {}
+        for entry in entries:
+            key = entry_key(entry['callback'], entry['dataset'], entry['args'])
+            if key in result:
+                result[key]['count'] += entry['count']
+            else:
+                result[key] = entry
+        return result
+
+    def load(self):
+        if not self.path:
+            return
+        entries = self._read()
+        with self._lock:
+            self._entries.update(entries)
+
+    def save(self):
+        """Прибавляет вызовы с прошлого сохранения к счетчикам файла журнала и атомарно записывает его"""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            pending, self._pending = self._pending, {}
+            self._dirty = False
+            self._saved = time.monotonic()
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with _file_lock(f'{self.path}.lock'):
+                entries = self._read()
+                for key, entry in pending.items():
+                    if key in entries:
+                        entries[key]['count'] += entry['count']
+                    else:
+                        entries[key] = dict(entry)
+                keep = sorted(entries.items(), key=lambda item: item[1]['count'], reverse=True)[:self.max_entries]
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump([entry for _, entry in keep], f, ensure_ascii=False, default=_json_default)
+                os.replace(tmp_path, self.path)
+        except OSError as error:
+            print(f'Журнал прогрева {self.path} не записан: {error}')
+            with self._lock:
+                # Несохраненные вызовы попадут в файл при следующей записи
+                for key, entry in pending.items():
+                    if key in self._pending:
+                        self._pending[key]['count'] += entry['count']
+                    else:
+                        self._pending[key] = entry
+                self._dirty = True
+            return
+        with self._lock:
+            # Счетчики всего развертывания плюс вызовы, пришедшие во время записи
+            self._entries = dict(keep)
+            for key, entry in self._pending.items():
+                if key in self._entries:
+                    self._entries[key] = {**self._entries[key],
+                                          'count': self._entries[key]['count'] + entry['count']}
+                else:
+                    self._entries[key] = dict(entry)
+
+
+class Prewarmer:
+    """Повторяет самые частые вызовы журнала в фоновом пуле потоков.
+
+    run_in_dataset(dataset, fn) выполняет fn в контексте набора данных;
+    datasets() - наборы, которые сейчас загружены: вызовы остальных наборов
+    пропускаются, чтобы прогрев не загружал и не вытеснял наборы сам. Новый
+    запуск (например, после перезагрузки данных) останавливает предыдущий.
+    """
+
+    def __init__(self, access_log, run_in_dataset=None, datasets=None, top=PREWARM_TOP,
+                 workers=PREWARM_WORKERS, cpu_seconds=PREWARM_CPU_SECONDS):
+        self.access_log = access_log
+        self.run_in_dataset = run_in_dataset or (lambda dataset, fn: fn())
+        self.datasets = datasets
+        self.top = top
+        self.workers = workers
+        self.cpu_seconds = cpu_seconds
+        self.last_run = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Запускает прогрев в фоне и сразу возвращает управление"""
+        if not self.access_log.functions:
+            return None
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        thread = threading.Thread(target=self.run, args=(generation,), name='cache-prewarm', daemon=True)
+        thread.start()
+        return thread
+
+    def restart(self):
+        """Прогрев заново (после перезагрузки данных), если сервер уже запускал его через start()"""
+        return self.start() if self._generation else None
+
+    def run(self, generation=None):
+        started = time.perf_counter()
+        loaded = set(self.datasets()) if self.datasets else None
+        entries = [entry for entry in self.access_log.top(self.top)
+                   if entry['callback'] in self.access_log.functions
+                   and (loaded is None or entry['dataset'] in loaded)]
+        stats = {'entries': len(entries), 'done': 0, 'failed': 0, 'skipped': 0, 'cpu_seconds': 0.0}
+        stats_lock = threading.Lock()
+
+        def warm(entry):
+            with stats_lock:
+                if stats['cpu_seconds'] >= self.cpu_seconds or (generation is not None
+                                                               and generation != self._generation):
+                    stats['skipped'] += 1
+                    return
+            fn = self.access_log.functions[entry['callback']]
+            cpu_started = time.thread_time()
+            try:
+                self.run_in_dataset(entry['dataset'], lambda: fn(*entry['args']))
+                outcome = 'done'
+            except Exception:
+                # Аргументы могли устареть (студент отчислен, группа переименована)
+                outcome = 'failed'
+            with stats_lock:
+                stats[outcome] += 1
+                stats['cpu_seconds'] += time.thread_time() - cpu_started
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cache-prewarm') as pool:
+            list(pool.map(warm, entries))
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        stats['cpu_seconds'] = round(stats['cpu_seconds'], 3)
+        self.last_run = stats
+        if entries:
+            print(f"Прогрев кэшей: {stats['done']} из {stats['entries']} вызовов за {stats['seconds']} с "
+                  f"(процессор {stats['cpu_seconds']} с, ошибок {stats['failed']}, пропущено {stats['skipped']})")
+        return stats
+
+def access_recorder(dataset=None):
+    """Журнал вызовов из переменных окружения; если PREWARM_LOG пуст - выключенный журнал"""
+    access_log = AccessLog(PREWARM_LOG or None, dataset=dataset)
+    if access_log.path:
+        atexit.register(access_log.save)
+    return access_log
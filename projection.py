@@ -0,0 +1,114 @@
+"""Прогноз баллов компетенций с учетом еще не изученных дисциплин.
+
+Балл компетенции считается только по изученным дисциплинам. Прогноз
+засчитывает и строки "Не изуч." по предположению об оценке: балл компетенции
+делится на все ее дисциплины. Сценарии задаются баллом за зачет и за экзамен
+(в долях максимума, как в row_points); None - средний балл самого студента по
+изученным дисциплинам той же формы контроля. Весь институт считается одним
+векторным проходом, результат кэшируется по версии данных.
+"""
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from score_matrix import row_points
+from singleflight import SingleFlight
+
+# Сценарии по умолчанию: имя -> (подпись, балл за зачет, балл за экзамен)
+PROJECTION_SCENARIOS = {
+    'best': ('Лучший случай (%)', 1.0, 1.0),
+    'minimum': ('Минимум (%)', 1.0, 0.5),
+    'expected': ('Ожидаемый (%)', None, None),
+}
+
+# Баллы оценок по форме контроля для сценариев, заданных оценкой
+CREDIT_POINTS = {'Зачет': 1.0, 'Незачет': 0.0, 'Н/я': 0.0}
+EXAM_POINTS = {'Отл': 1.0, 'Хор': 0.75, 'Удовл': 0.5, 'Неуд': 0.0, 'Н/я': 0.0}
+
+PROJECTION_KEYS = ['Группа', 'Код_Студента', 'Компетенция']
+PROJECTION_COLUMNS = PROJECTION_KEYS + ['Тип_Компетенции', 'Изучено', 'Не изучено', 'Балл (%)']
+
+# Прогноз по ключу (набор данных, версия данных, сценарии)
+projection_cache = LRUCache('projections', maxsize=8)
+_flight = SingleFlight()
+
+def scenario_from_grades(label, credit_grade, exam_grade):
+    """Сценарий по названиям оценок ('Зачет', 'Хор', ...); None - средний балл студента"""
+    credit = None if credit_grade is None else CREDIT_POINTS[credit_grade]
+    exam = None if exam_grade is None else EXAM_POINTS[exam_grade]
+    return (label, credit, exam)
+
+def projection_columns(scenarios=PROJECTION_SCENARIOS):
+    return PROJECTION_COLUMNS + [label for label, _, _ in scenarios.values()]
+
+def project_scores(rows, scenarios=PROJECTION_SCENARIOS):
+    """Текущий и прогнозные баллы каждой пары студент-компетенция переданных строк"""
+    if rows.empty:
+        return pd.DataFrame(columns=projection_columns(scenarios))
+
+    studied, real, _ = row_points(rows)
+    diff_credit = rows['ДиффенцированныйЗачет'].to_numpy()
+    credit = diff_credit == 0
+    exam = diff_credit == 1
+    cells = pd.DataFrame({
+        'Группа': rows['Название'].to_numpy(),
+        'Код_Студента': rows['Код_Студента'].to_numpy(),
+        'Компетенция': rows['last_word'].to_numpy(),
+        'rows': 1,
+        'studied': studied,
+        'real': real,
+        'open_credit': ~studied & credit,
+        'open_exam': ~studied & exam,
+        'credit_real': np.where(studied & credit, real, 0.0),
+        'credit_count': studied & credit,
+        'exam_real': np.where(studied & exam, real, 0.0),
+        'exam_count': studied & exam,
+    })
+    sums = cells.groupby(PROJECTION_KEYS, sort=True).sum()
+
+    # Тип компетенции - из первой изученной строки пары, у пар без изученных строк - из первой строки
+    first_rows = cells[PROJECTION_KEYS].assign(type=rows['Тип_Компетенции'].to_numpy())
+    first_rows = first_rows.iloc[np.argsort(~studied, kind='stable')].drop_duplicates(PROJECTION_KEYS)
+    types = first_rows.set_index(PROJECTION_KEYS)['type'].reindex(sums.index)
+
+    # Средний балл студента по изученным зачетам и экзаменам; если их нет - по всем строкам
+    students = sums.groupby(level=['Группа', 'Код_Студента'])[
+        ['credit_real', 'credit_count', 'exam_real', 'exam_count']].sum()
+    averages = {}
+    for form, minimum in (('credit', 1.0), ('exam', 0.5)):
+        total_count = students[f'{form}_count'].sum()
+        overall = students[f'{form}_real'].sum() / total_count if total_count else minimum
+        count = students[f'{form}_count']
+        average = (students[f'{form}_real'] / count.where(count > 0)).fillna(overall)
+        averages[form] = average.reindex(sums.index.droplevel('Компетенция')).to_numpy()
+
+    result = sums.index.to_frame(index=False)
+    result['Тип_Компетенции'] = types.to_numpy()
+    result['Изучено'] = sums['studied'].to_numpy().astype(int)
+    result['Не изучено'] = (sums['rows'] - sums['studied']).to_numpy().astype(int)
+    n_studied = sums['studied'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['Балл (%)'] = np.where(n_studied > 0, np.round(sums['real'].to_numpy() * 100 / n_studied, 2), np.nan)
+
+    total = sums['rows'].to_numpy()
+    for label, credit_points, exam_points in scenarios.values():
+        credit_points = averages['credit'] if credit_points is None else credit_points
+        exam_points = averages['exam'] if exam_points is None else exam_points
+        points = (sums['real'].to_numpy() + credit_points * sums['open_credit'].to_numpy()
+                  + exam_points * sums['open_exam'].to_numpy())
+        result[label] = np.round(points * 100 / total, 2)
+    return result
+
+def projection_table(engine, scenarios=PROJECTION_SCENARIOS):
+    """Прогноз по всему институту для текущей версии данных"""
+    key = (engine.dataset, engine.version, tuple(scenarios.items()))
+    cached = projection_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def compute():
+        table = project_scores(engine.competency_rows(), scenarios)
+        projection_cache.put(key, table)
+        return table
+
+    return _flight.do(key, compute)
@@ -0,0 +1,98 @@
+"""Рейтинги группы по семестрам и их изменение относительно прошлого семестра.
+
+Рейтинг семестра хранится вместе с отпечатком оценок и посещаемости группы за
+этот семестр. При новой версии данных семестры с тем же отпечатком берутся из
+хранилища, а считаются только измененные и новые. Изменение места и балла
+считается одним слиянием таблиц соседних семестров и тоже кэшируется, поэтому
+повторный запрос таблицы рейтингов ничего не пересчитывает.
+"""
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from risk import group_fingerprints
+from singleflight import SingleFlight
+
+SCORE_COLUMN = 'Успеваемость (%)'
+SCORE_RANK_COLUMN = 'Рейтинг в группе (успеваемость)'
+ATTENDANCE_RANK_COLUMN = 'Рейтинг в группе (посещаемость)'
+
+# Столбцы изменений: положительное изменение места - студент поднялся в рейтинге
+SCORE_DELTA_COLUMN = 'Изменение успеваемости (%)'
+SCORE_RANK_DELTA_COLUMN = 'Изменение места (успеваемость)'
+ATTENDANCE_RANK_DELTA_COLUMN = 'Изменение места (посещаемость)'
+DELTA_COLUMNS = [SCORE_DELTA_COLUMN, SCORE_RANK_DELTA_COLUMN, ATTENDANCE_RANK_DELTA_COLUMN]
+
+# Рейтинги семестров: (набор данных, группа, семестр) -> (отпечаток данных семестра, таблица рейтинга)
+rating_store = LRUCache('semester-ratings', maxsize=512)
+# Отпечатки семестров группы: (набор данных, версия данных, группа) -> {семестр: отпечаток}
+fingerprint_cache = LRUCache('rating-fingerprints', maxsize=64)
+# Рейтинги с изменениями: (набор данных, версия данных, группа, семестр) -> таблица
+movement_cache = LRUCache('rating-movement', maxsize=256)
+_flight = SingleFlight()
+
+def semester_fingerprints(engine, group):
+    """Отпечаток оценок и посещаемости группы по каждому семестру"""
+    key = (engine.dataset, engine.version, group)
+    cached = fingerprint_cache.get(key)
+    if cached is not None:
+        return cached
+    grades = group_fingerprints(engine.competency_rows({'Название': [group]}), 'Семестр')
+    attendance = group_fingerprints(engine.attendance_rows({'Группа': [group]}), 'Семестр')
+    fingerprints = {semester: (fingerprint, attendance.get(semester)) for semester, fingerprint in grades.items()}
+    fingerprint_cache.put(key, fingerprints)
+    return fingerprints
+
+def compact_ratings(ratings_df):
+    """Таблица рейтинга с целыми столбцами минимальной разрядности"""
+    ratings_df = ratings_df.copy()
+    for column in ratings_df.columns:
+        if pd.api.types.is_integer_dtype(ratings_df[column]):
+            ratings_df[column] = pd.to_numeric(ratings_df[column], downcast='integer')
+    return ratings_df
+
+def semester_ratings(engine, group, semester):
+    """Рейтинг группы за семестр; неизменившийся семестр берется из хранилища"""
+    fingerprint = semester_fingerprints(engine, group).get(semester)
+    if fingerprint is None:
+        return pd.DataFrame()
+    key = (engine.dataset, group, semester)
+    entry = rating_store.get(key)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+
+    def compute():
+        ratings_df = compact_ratings(engine.ratings(group, semester))
+        rating_store.put(key, (fingerprint, ratings_df))
+        return ratings_df
+
+    return _flight.do(key + (fingerprint,), compute)
+
+def rating_movement(current, previous):
+    """Рейтинг current с изменениями относительно previous (слияние по студенту)"""
+    result = current.copy()
+    if previous.empty or current.empty:
+        for column in DELTA_COLUMNS:
+            result[column] = np.nan
+        return result
+    before = previous.set_index('Студент')[[SCORE_COLUMN, SCORE_RANK_COLUMN, ATTENDANCE_RANK_COLUMN]]
+    before = before.reindex(current['Студент'])
+    result[SCORE_DELTA_COLUMN] = np.round(current[SCORE_COLUMN].to_numpy() - before[SCORE_COLUMN].to_numpy(), 2)
+    result[SCORE_RANK_DELTA_COLUMN] = before[SCORE_RANK_COLUMN].to_numpy() - current[SCORE_RANK_COLUMN].to_numpy()
+    result[ATTENDANCE_RANK_DELTA_COLUMN] = (before[ATTENDANCE_RANK_COLUMN].to_numpy()
+                                            - current[ATTENDANCE_RANK_COLUMN].to_numpy())
+    return result
+
+def ratings_with_movement(engine, group, semester):
+    """Рейтинг группы за семестр со столбцами изменений относительно предыдущего семестра группы"""
+    key = (engine.dataset, engine.version, group, semester)
+    cached = movement_cache.get(key)
+    if cached is not None:
+        return cached
+
+    current = semester_ratings(engine, group, semester)
+    earlier = [s for s in semester_fingerprints(engine, group) if s < semester]
+    previous = semester_ratings(engine, group, max(earlier)) if earlier else pd.DataFrame()
+    result = rating_movement(current, previous) if not current.empty else current
+    movement_cache.put(key, result)
+    return result
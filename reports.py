@@ -0,0 +1,273 @@
+"""Пакетная сборка HTML-отчетов для кураторов: по отчету на группу и семестр.
+
+В отчете таблица рейтингов, радар компетенций каждого студента и список
+долгов. Отчеты строятся параллельно в нескольких процессах; отчет, входные
+данные которого не изменились с прошлого запуска, пропускается. Каждый
+отчет - самостоятельный файл со встроенным plotly.js: его можно отправить
+куратору отдельно от остальных.
+
+    python reports.py -o reports
+    python reports.py --group 404а --semester 5 --force
+    python reports.py --shared-js -o /var/www/reports
+"""
+import argparse
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+from plotly.offline import get_plotlyjs
+
+from data_engine import COMPETENCIES_TABLE, create_engine
+from ingest import canonical_competencies_path
+from scoring import competency_scores, debt_grades
+
+# Увеличивается при изменении содержимого отчета, чтобы все отчеты пересобрались
+REPORT_FORMAT_VERSION = 2
+MANIFEST_FILE = 'manifest.json'
+PLOTLY_JS_FILE = 'plotly.min.js'
+
+# Движок данных процесса; дочерние процессы получают его от родителя при fork
+_engine = None
+
+def report_file_name(group, semester):
+    safe_group = ''.join(char if char.isalnum() or char in '.-' else '_' for char in str(group))
+    return f'{safe_group}_semester{semester}.html'
+
+def report_fingerprint(engine, group, semester):
+    """Отпечаток входных данных отчета: оценки и посещаемость группы за семестр"""
+    digest = hashlib.sha1(f'report:{REPORT_FORMAT_VERSION};'.encode('utf-8'))
+    frames = (engine.competency_rows({'Название': [group], 'Семестр': [semester]}),
+              engine.attendance_rows({'Группа': [group], 'Семестр': [semester]}))
+    for frame in frames:
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        digest.update(b';')
+    return digest.hexdigest()
+
+def radar_figure(student, scores):
+    """Радар компетенций студента: фактический и минимальный балл.
+
+    Фигура собирается словарем: проверка свойств в plotly.graph_objects
+    занимала больше времени, чем весь расчет отчета.
+    """
+    theta = [score['last_word'] for score in scores]
+    theta = theta + theta[:1]
+    real = [score['Балл'] for score in scores]
+    minimum = [score['Минимальный балл'] for score in scores]
+    return {
+        'data': [{
+            'type': 'scatterpolar',
+            'r': real + real[:1],
+            'theta': theta,
+            'fill': 'toself',
+            'mode': 'lines+markers',
+            'line': {'width': 2, 'color': 'blue'},
+            'fillcolor': 'rgba(0, 100, 255, 0.3)',
+            'name': 'Фактический балл',
+            'customdata': [[score['Тип_Компетенции'], score['Компетенция']] for score in scores],
+            'hovertemplate': '<b>%{customdata[1]}</b><br>Балл: %{r:.2f}%<br>Тип: %{customdata[0]}<extra></extra>',
+        }, {
+            'type': 'scatterpolar',
+            'r': minimum + minimum[:1],
+            'theta': theta,
+            'mode': 'lines',
+            'line': {'color': 'red', 'width': 1, 'dash': 'dot'},
+            'name': 'Минимальный балл',
+            'hovertemplate': '<b>Компетенция: %{theta}</b><br>Балл: %{r:.2f}%<br><extra></extra>',
+        }],
+        'layout': {
+            'title': {'text': f'Студент {student}'},
+            'polar': {'radialaxis': {'visible': True, 'range': [0, 100]}, 'angularaxis': {'rotation': 90}},
+            'margin': {'l': 40, 'r': 40, 't': 60, 'b': 40},
+            'height': 450,
+        },
+    }
+
+def _table(frame):
+    if frame.empty:
+        return '<p>Нет данных</p>'
+    return frame.to_html(index=False, border=0, classes='report-table', na_rep='', float_format=lambda x: f'{x:.2f}')
+
+def render_report(engine, group, semester, plotly_js):
+    """HTML отчета группы за семестр; фигуры Plotly встраиваются как JSON"""
+    ratings_df = engine.ratings(group, semester)
+
+    rows = engine.competency_rows({'Название': [group], 'Семестр': [semester]})
+    debts = rows[rows['Оценка'].isin(debt_grades) & (rows['Числовая_оценка'] != 6)]
+    debts_df = (debts.drop_duplicates(['Код_Студента', 'Дисциплина', 'Описание'])
+                .sort_values(['Код_Студента', 'Дисциплина'])
+                [['Код_Студента', 'Дисциплина', 'Описание', 'Оценка', 'УчебныйГод']]
+                .rename(columns={'Код_Студента': 'Студент'}))
+
+    figures = []
+    for student in sorted(rows['Код_Студента'].unique()):
+        scores = competency_scores(rows[rows['Код_Студента'] == student], with_min=True)
+        if scores:
+            figures.append(radar_figure(student, scores))
+
+    # Внутри <script> нельзя оставлять "</"
+    figures_json = to_json_plotly(figures).replace('</', '<\\/')
+    template_json = to_json_plotly(pio.templates['plotly_white']).replace('</', '<\\/')
+    title = html.escape(f'Группа {group}, семестр {semester}')
+    plot_divs = '\n'.join(f'<div id="radar-{i}" class="radar"></div>' for i in range(len(figures)))
+
+    return f'''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{plotly_js}
+<style>
+body {{ font-family: Arial, sans-serif; margin: 20px; }}
+.report-table {{ border-collapse: collapse; font-size: 13px; margin-bottom: 20px; }}
+.report-table th {{ background: rgb(230, 230, 230); }}
+.report-table th, .report-table td {{ border: 1px solid #ddd; padding: 4px 8px; text-align: center; }}
+.report-table tr:nth-child(even) {{ background: rgb(248, 248, 248); }}
+.radars {{ display: flex; flex-wrap: wrap; }}
+.radar {{ width: 520px; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>Сформирован {time.strftime('%d.%m.%Y %H:%M')}, версия данных {html.escape(engine.version)}</p>
+<h2>Рейтинг студентов</h2>
+{_table(ratings_df)}
+<h2>Долги</h2>
+{_table(debts_df)}
+<h2>Компетенции студентов</h2>
+<div class="radars">
+{plot_divs}
+</div>
+<script>
+const template = {template_json};
+const figures = {figures_json};
+figures.forEach((fig, i) => Plotly.newPlot('radar-' + i, fig.data, {{...fig.layout, template: template}},
+                                           {{responsive: true}}));
+</script>
+</body>
+</html>
+'''
+
+def _write_atomic(path, text):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _init_worker(engine_name, engine_spec, dataset):
+    global _engine
+    if _engine is None:
+        # Процесс запущен через spawn - тот же движок создается заново по его аргументам
+        _engine = create_engine(engine_name, **engine_spec)
+        _engine.dataset = dataset
+    else:
+        _engine.after_fork()
+
+def _build_report(task):
+    group, semester, path, plotly_js = task
+    _write_atomic(path, render_report(_engine, group, semester, plotly_js))
+    return group, semester
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_index(output_dir, manifest):
+    """Оглавление: все собранные отчеты, в том числе прошлых запусков по другим группам"""
+    reports = []
+    for name in manifest:
+        if os.path.exists(os.path.join(output_dir, name)):
+            group, _, semester = name[:-len('.html')].rpartition('_semester')
+            reports.append((group, int(semester), name))
+    items = '\n'.join(f'<li><a href="{html.escape(name)}">Группа {html.escape(group)}, семестр {semester}</a></li>'
+                      for group, semester, name in sorted(reports))
+    _write_atomic(os.path.join(output_dir, 'index.html'),
+                  f'<!DOCTYPE html>\n<html lang="ru">\n<head><meta charset="utf-8"><title>Отчеты по группам</title></head>\n'
+                  f'<body>\n<h1>Отчеты по группам</h1>\n<ul>\n{items}\n</ul>\n</body>\n</html>\n')
+
+def build_reports(engine, output_dir='reports', groups=None, semesters=None, jobs=None, force=False,
+                  shared_js=False):
+    """Собирает отчеты по всем парам группа/семестр; возвращает (собрано, пропущено).
+
+    shared_js - одна копия plotly.js рядом с отчетами вместо 3 МБ в каждом файле
+    (для публикации каталога целиком: отдельный файл без нее не откроется).
+    """
+    global _engine
+    os.makedirs(output_dir, exist_ok=True)
+    if shared_js:
+        js_path = os.path.join(output_dir, PLOTLY_JS_FILE)
+        if not os.path.exists(js_path):
+            _write_atomic(js_path, get_plotlyjs())
+        plotly_js = f'<script src="{PLOTLY_JS_FILE}"></script>'
+    else:
+        plotly_js = f'<script>{get_plotlyjs()}</script>'
+
+    manifest = _load_manifest(output_dir)
+    tasks, reports, fingerprints = [], [], {}
+    for group in groups or engine.distinct(COMPETENCIES_TABLE, 'Название'):
+        group_semesters = engine.distinct(COMPETENCIES_TABLE, 'Семестр', {'Название': [group]})
+        for semester in group_semesters:
+            if semesters and semester not in semesters:
+                continue
+            name = report_file_name(group, semester)
+            path = os.path.join(output_dir, name)
+            reports.append((group, semester, name))
+            fingerprint = report_fingerprint(engine, group, semester) + (':shared' if shared_js else '')
+            fingerprints[name] = fingerprint
+            if force or manifest.get(name) != fingerprint or not os.path.exists(path):
+                tasks.append((group, semester, path, plotly_js))
+
+    if tasks:
+        jobs = jobs or os.cpu_count() or 1
+        if jobs == 1 or len(tasks) == 1:
+            for task in tasks:
+                group, semester, path, _ = task
+                _write_atomic(path, render_report(engine, group, semester, plotly_js))
+        else:
+            # При fork дочерние процессы разделяют загруженные данные с родителем (только чтение)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+            _engine = engine if context.get_start_method() == 'fork' else None
+            with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), mp_context=context,
+                                     initializer=_init_worker,
+                                     initargs=(engine.name, engine.spec(), engine.dataset)) as pool:
+                for future in as_completed([pool.submit(_build_report, task) for task in tasks]):
+                    future.result()
+            _engine = None
+
+    for _, _, path, _ in tasks:
+        name = os.path.basename(path)
+        manifest[name] = fingerprints[name]
+    _write_atomic(os.path.join(output_dir, MANIFEST_FILE), json.dumps(manifest, ensure_ascii=False, indent=1))
+    _write_index(output_dir, manifest)
+    return len(tasks), len(reports) - len(tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description='Собирает HTML-отчеты по группам и семестрам')
+    parser.add_argument('-o', '--output-dir', default='reports', help='Каталог для отчетов')
+    parser.add_argument('--group', action='append', help='Только эта группа (можно несколько раз)')
+    parser.add_argument('--semester', action='append', type=int, help='Только этот семестр (можно несколько раз)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Число процессов (по умолчанию - число ядер)')
+    parser.add_argument('--force', action='store_true', help='Пересобрать и неизменившиеся отчеты')
+    parser.add_argument('--shared-js', action='store_true',
+                        help='Одна копия plotly.js рядом с отчетами вместо встроенной в каждый')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = create_engine(competencies_path=canonical_competencies_path())
+    built, skipped = build_reports(engine, args.output_dir, args.group, args.semester, args.jobs,
+                                   args.force, args.shared_js)
+    print(f'Собрано отчетов: {built}, без изменений: {skipped}, '
+          f'{time.perf_counter() - started:.1f} с -> {args.output_dir}')
+
+if __name__ == '__main__':
+    main()
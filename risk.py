@@ -0,0 +1,116 @@
+"""Список студентов группы риска по всему институту.
+
+Студент попадает в список, если у него есть долги, доля пропусков по
+неуважительной причине выше порога или компетенции с низким баллом.
+Все группы считаются одним векторным проходом, один раз на версию данных:
+проверка, какие группы изменились, стоит столько же, сколько сам расчет.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from scoring import debt_grades
+from score_matrix import row_points
+from singleflight import SingleFlight
+
+# Пороги (можно переопределить переменными окружения)
+RISK_MIN_DEBTS = int(os.environ.get('RISK_MIN_DEBTS', 1))
+RISK_ABSENCE_PERCENT = float(os.environ.get('RISK_ABSENCE_PERCENT', 20))
+RISK_LOW_SCORE = float(os.environ.get('RISK_LOW_SCORE', 50))
+
+# Веса составляющих итогового балла риска (0-100)
+DEBT_WEIGHT, ABSENCE_WEIGHT, SCORE_WEIGHT = 40, 30, 30
+# Число долгов и доля пропусков, при которых составляющая достигает максимума
+DEBTS_CAP = 5
+ABSENCE_CAP = 50
+
+RISK_COLUMNS = ['Группа', 'Код_Студента', 'Долги', 'Пропуски (%)', 'Средний балл (%)',
+                'Компетенций ниже порога', 'Риск', 'Причины']
+
+# Итоговый список по (набор данных, версия данных)
+risk_cache = LRUCache('risk', maxsize=4)
+_flight = SingleFlight()
+
+def group_fingerprints(frame, group_column):
+    """Отпечаток строк каждой группы (сумма 64-битных хэшей строк)"""
+    if frame.empty:
+        return {}
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    codes, groups = pd.factorize(frame[group_column])
+    sums = np.zeros(len(groups), dtype=np.uint64)
+    np.add.at(sums, codes, hashes)
+    return {group: (int(count), int(total))
+            for group, count, total in zip(groups, np.bincount(codes, minlength=len(groups)), sums)}
+
+def student_risk(competencies, attendance):
+    """Показатели риска по каждому студенту переданных строк одним проходом"""
+    keys = ['Группа', 'Код_Студента']
+
+    # Долги (исключая "Не изуч.")
+    studied, real, _ = row_points(competencies)
+    grades = pd.DataFrame({
+        'Группа': competencies['Название'].to_numpy(),
+        'Код_Студента': competencies['Код_Студента'].to_numpy(),
+        'last_word': competencies['last_word'].to_numpy(),
+        'debt': competencies['Оценка'].isin(debt_grades).to_numpy() & studied,
+        'studied': studied,
+        'real': real,
+    })
+    debts = grades.groupby(keys)['debt'].sum().rename('Долги')
+
+    # Балл каждой компетенции, затем средний балл и число компетенций ниже порога
+    cells = grades[grades['studied']].groupby(keys + ['last_word'])[['studied', 'real']].sum()
+    cells['score'] = np.round(cells['real'] * 100 / cells['studied'], 2)
+    scores = pd.DataFrame({
+        'Средний балл (%)': cells['score'].groupby(level=keys).mean().round(2),
+        'Компетенций ниже порога': (cells['score'] < RISK_LOW_SCORE).groupby(level=keys).sum(),
+    })
+
+    # Пропуски по неуважительной причине
+    visits = (attendance.rename(columns={'Код': 'Код_Студента'})
+              .groupby(keys)[['ВсегоЗанятийПоЖурналу', 'ПропусковНеуважитПрич']].sum())
+    total = visits['ВсегоЗанятийПоЖурналу']
+    absences = (visits['ПропусковНеуважитПрич'] / total.where(total > 0) * 100).fillna(0).round(2)
+
+    result = pd.concat([debts, absences.rename('Пропуски (%)'), scores], axis=1)
+    result['Долги'] = result['Долги'].fillna(0).astype(int)
+    result['Компетенций ниже порога'] = result['Компетенций ниже порога'].fillna(0).astype(int)
+    result = result.rename_axis(keys).reset_index()
+
+    # Итоговый балл риска и причины
+    debt_part = np.minimum(result['Долги'] / DEBTS_CAP, 1)
+    absence_part = np.minimum(result['Пропуски (%)'].fillna(0) / ABSENCE_CAP, 1)
+    score_part = (1 - result['Средний балл (%)'].fillna(100) / 100).clip(0, 1)
+    result['Риск'] = np.round(DEBT_WEIGHT * debt_part + ABSENCE_WEIGHT * absence_part + SCORE_WEIGHT * score_part, 1)
+
+    reasons = []
+    for debts_count, absence, low in zip(result['Долги'], result['Пропуски (%)'], result['Компетенций ниже порога']):
+        student_reasons = []
+        if debts_count >= RISK_MIN_DEBTS:
+            student_reasons.append(f'долги: {debts_count}')
+        if absence > RISK_ABSENCE_PERCENT:
+            student_reasons.append(f'пропуски {absence:.1f}%')
+        if low:
+            student_reasons.append(f'компетенций ниже {RISK_LOW_SCORE:g}%: {low}')
+        reasons.append(', '.join(student_reasons))
+    result['Причины'] = reasons
+    return result[RISK_COLUMNS]
+
+def risk_table(engine):
+    """Ранжированный список студентов группы риска для текущей версии данных"""
+    dataset, version = engine.dataset, engine.version
+    cached = risk_cache.get((dataset, version))
+    if cached is not None:
+        return cached
+
+    def compute():
+        table = student_risk(engine.competency_rows(), engine.attendance_rows())
+        table = table[table['Причины'] != '']
+        table = table.sort_values(['Риск', 'Долги', 'Группа', 'Код_Студента'],
+                                  ascending=[False, False, True, True], ignore_index=True)
+        risk_cache.put((dataset, version), table)
+        return table
+
+    return _flight.do((dataset, version), compute)
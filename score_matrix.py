@@ -0,0 +1,290 @@
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from singleflight import SingleFlight
+
+# Матрицы по ключу (набор данных, версия данных, группа, семестры)
+matrix_cache = LRUCache('score-matrices', maxsize=64)
+# Накопленные суммы по группе: (набор данных, группа) -> (версия данных, GroupTrajectory)
+trajectory_cache = LRUCache('trajectories', maxsize=32)
+
+# Столбцы, изменение которых меняет баллы семестра
+FINGERPRINT_COLUMNS = ['Код_Студента', 'last_word', 'Тип_Компетенции', 'Оценка', 'ДиффенцированныйЗачет']
+
+# Групповые показатели для наложения на радар: значение -> (подпись, функция по столбцам)
+GROUP_STATS = {
+    'mean': ('Среднее по группе', lambda values: np.nanmean(values, axis=0)),
+    'median': ('Медиана по группе', lambda values: np.nanmedian(values, axis=0)),
+    'p25': ('25-й перцентиль группы', lambda values: np.nanpercentile(values, 25, axis=0)),
+    'p75': ('75-й перцентиль группы', lambda values: np.nanpercentile(values, 75, axis=0)),
+}
+
+def row_points(rows):
+    """Вклад каждой строки в балл компетенции, в долях максимума.
+
+    Возвращает маску изученных строк, фактические и минимальные баллы - те же
+    правила, что в calculate_competency_score: зачет 1, удовл 0.5, хор 0.75,
+    отл 1; минимальный балл - зачет за каждый зачет и удовл за каждый экзамен.
+    """
+    grades = rows['Числовая_оценка'].to_numpy()
+    diff_credit = rows['ДиффенцированныйЗачет'].to_numpy()
+    studied = grades != 6
+    credit = studied & (diff_credit == 0)
+    exam = studied & (diff_credit == 1)
+
+    real = np.zeros(len(rows))
+    real[credit & (grades == 7)] = 1.0
+    real[exam & (grades == 3)] = 0.5
+    real[exam & (grades == 4)] = 0.75
+    real[exam & (grades == 5)] = 1.0
+
+    minimum = np.where(credit, 1.0, np.where(exam, 0.5, 0.0))
+    return studied, real, minimum
+
+
+def cell_sums(rows, students, competencies):
+    """Суммы по ячейкам (студент, компетенция) одним проходом.
+
+    Возвращает массивы: число строк, число изученных строк, сумму фактических
+    и сумму минимальных баллов. Строки с неизвестным студентом или
+    компетенцией пропускаются.
+    """
+    shape = (len(students), len(competencies))
+    sums = np.zeros((4,) + shape)
+    studied, real_points, min_points = row_points(rows)
+    student_pos = pd.Index(students).get_indexer(rows['Код_Студента'])
+    competency_pos = pd.Index(competencies).get_indexer(rows['last_word'])
+    known = (student_pos >= 0) & (competency_pos >= 0)
+    cells = (student_pos[known], competency_pos[known])
+    np.add.at(sums[0], cells, 1)
+    np.add.at(sums[1], cells, studied[known])
+    np.add.at(sums[2], cells, real_points[known])
+    np.add.at(sums[3], cells, min_points[known])
+    return sums
+
+
+class GroupScoreMatrix:
+    """Баллы группы: студенты по строкам, коды компетенций по столбцам.
+
+    real и minimum - фактический и минимальный балл (в процентах), studied -
+    есть ли у студента изученные дисциплины по компетенции; где не изучено, в
+    real и minimum стоит NaN.
+    """
+
+    def __init__(self, students, competencies, competency_types, real, minimum, studied):
+        self.students = students
+        self.competencies = competencies
+        self.competency_types = competency_types
+        self.real = real
+        self.minimum = minimum
+        self.studied = studied
+        self._student_index = {student: i for i, student in enumerate(students)}
+        for values in (real, minimum, studied, competency_types):
+            values.flags.writeable = False
+
+    @classmethod
+    def from_rows(cls, rows, students):
+        students = np.asarray(students)
+        rows = rows[rows['Код_Студента'].isin(students)]
+        competencies = np.asarray(sorted(rows['last_word'].dropna().unique()), dtype=object)
+        sums = cell_sums(rows, students, competencies)
+
+        # Тип компетенции - по первой изученной строке, как на радаре
+        studied = rows['Числовая_оценка'].to_numpy() != 6
+        types = (rows[studied].drop_duplicates('last_word').set_index('last_word')['Тип_Компетенции']
+                 .reindex(competencies).to_numpy(dtype=object))
+        return cls.from_sums(students, competencies, types, sums)
+
+    @classmethod
+    def from_sums(cls, students, competencies, competency_types, sums):
+        """Матрица из сумм по ячейкам (см. cell_sums)"""
+        _, n_studied, real, minimum = sums
+        studied_mask = n_studied > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            real = np.where(studied_mask, np.round(real * 100 / n_studied, 2), np.nan)
+            minimum = np.where(studied_mask, np.round(minimum * 100 / n_studied, 2), np.nan)
+        return cls(students, competencies, competency_types, real, minimum, studied_mask)
+
+    def columns(self, types=None):
+        """Маска столбцов с компетенциями выбранных типов"""
+        if not types:
+            return np.ones(len(self.competencies), dtype=bool)
+        return np.isin(self.competency_types, list(types))
+
+    def student(self, student):
+        i = self._student_index.get(student)
+        return None if i is None else self.real[i]
+
+    def group_stat(self, stat, values=None):
+        """Показатель группы по каждой компетенции (только по изучившим ее студентам)"""
+        values = self.real if values is None else values
+        if stat not in GROUP_STATS or len(self.students) == 0:
+            raise ValueError(f'Неизвестный показатель группы: {stat}')
+        result = np.full(values.shape[1], np.nan)
+        has_values = self.studied.any(axis=0)
+        if has_values.any():
+            result[has_values] = np.round(GROUP_STATS[stat][1](values[:, has_values]), 2)
+        return result
+
+def semester_fingerprint(rows):
+    """Отпечаток строк одного семестра: меняется при любом изменении его оценок"""
+    hashes = pd.util.hash_pandas_object(rows[FINGERPRINT_COLUMNS], index=False).to_numpy()
+    return len(rows), int(hashes.sum(dtype=np.uint64))
+
+
+class GroupTrajectory:
+    """Накопленные по семестрам суммы баллов группы.
+
+    Для каждого семестра хранится слой cell_sums (студенты x компетенции), а
+    prefix[k] - сумма первых k слоев. Баллы за непрерывный диапазон семестров
+    получаются разностью двух префиксов, за произвольный набор - суммой слоев,
+    без обращения к исходным строкам. Новый семестр добавляется одним слоем.
+    Объект неизменяемый: append и truncate возвращают новый.
+    """
+
+    def __init__(self, students, competencies, competency_types, semesters, fingerprints, layers):
+        self.students = students
+        self.competencies = competencies
+        self.competency_types = competency_types
+        self.semesters = semesters
+        self.fingerprints = fingerprints
+        self.layers = layers
+        prefix = np.zeros((len(semesters) + 1,) + layers.shape[1:])
+        np.cumsum(layers, axis=0, out=prefix[1:])
+        self.prefix = prefix
+        self._positions = {semester: i for i, semester in enumerate(semesters)}
+        for values in (layers, prefix, competency_types):
+            values.flags.writeable = False
+
+    @classmethod
+    def empty(cls, students):
+        return cls(np.asarray(students), np.empty(0, dtype=object), np.empty(0, dtype=object),
+                   [], [], np.zeros((0, 4, len(students), 0)))
+
+    def truncate(self, count):
+        """Первые count семестров"""
+        if count == len(self.semesters):
+            return self
+        return GroupTrajectory(self.students, self.competencies, self.competency_types,
+                               self.semesters[:count], self.fingerprints[:count], self.layers[:count])
+
+    def with_students(self, students):
+        """Те же семестры на оси студентов students: слои известных студентов переносятся, у новых - нули"""
+        students = np.asarray(students)
+        if len(students) == len(self.students) and (students == self.students).all():
+            return self
+        positions = pd.Index(self.students).get_indexer(students)
+        known = positions >= 0
+        layers = np.zeros((len(self.semesters), 4, len(students), len(self.competencies)))
+        layers[:, :, known, :] = self.layers[:, :, positions[known], :]
+        return GroupTrajectory(students, self.competencies, self.competency_types,
+                               self.semesters, self.fingerprints, layers)
+
+    def append(self, semester, rows, fingerprint=None):
+        """Добавляет слой семестра; новые студенты и компетенции дописываются в конец"""
+        students, competencies, types = self.students, self.competencies, self.competency_types
+        new_students = np.setdiff1d(rows['Код_Студента'].unique(), students)
+        new_competencies = [word for word in pd.unique(rows['last_word'].dropna()) if word not in set(competencies)]
+        if len(new_students):
+            students = np.concatenate([students, new_students])
+        if new_competencies:
+            competencies = np.concatenate([competencies, np.asarray(new_competencies, dtype=object)])
+            types = np.concatenate([types, np.full(len(new_competencies), np.nan, dtype=object)])
+        # Тип компетенции - по первой изученной строке, как в from_rows; пока не изучена, типа нет
+        untyped = pd.isna(types)
+        if untyped.any():
+            studied = rows['Числовая_оценка'].to_numpy() != 6
+            studied_types = rows[studied].drop_duplicates('last_word').set_index('last_word')['Тип_Компетенции']
+            types = types.copy()
+            types[untyped] = studied_types.reindex(competencies[untyped]).to_numpy(dtype=object)
+
+        layers = np.zeros((len(self.semesters) + 1, 4, len(students), len(competencies)))
+        layers[:-1, :, :len(self.students), :len(self.competencies)] = self.layers
+        layers[-1] = cell_sums(rows, students, competencies)
+        if fingerprint is None:
+            fingerprint = semester_fingerprint(rows)
+        return GroupTrajectory(students, competencies, types, self.semesters + [semester],
+                               self.fingerprints + [fingerprint], layers)
+
+    def sums(self, semesters=None):
+        """Суммы по ячейкам за выбранные семестры (все, если не заданы)"""
+        if not semesters:
+            return self.prefix[-1]
+        positions = sorted({self._positions[s] for s in semesters if s in self._positions})
+        if not positions:
+            return np.zeros(self.layers.shape[1:])
+        first, last = positions[0], positions[-1]
+        if last - first + 1 == len(positions):
+            # Непрерывный диапазон - разность префиксов
+            return self.prefix[last + 1] - self.prefix[first]
+        return self.layers[positions].sum(axis=0)
+
+    def matrix(self, semesters=None):
+        """GroupScoreMatrix за выбранные семестры; столбцы - компетенции, встречавшиеся в них"""
+        sums = self.sums(semesters)
+        present = sums[0].any(axis=0)
+        order = np.argsort(self.competencies[present], kind='stable')
+        columns = np.flatnonzero(present)[order]
+        studied = sums[1][:, columns].any(axis=0)
+        # Как и при расчете по строкам, тип известен только у изученных компетенций
+        types = np.where(studied, self.competency_types[columns], np.nan).astype(object)
+        return GroupScoreMatrix.from_sums(self.students, self.competencies[columns], types, sums[:, :, columns])
+
+    def student_trajectory(self, student):
+        """Накопленный балл студента по каждой компетенции после каждого семестра.
+
+        Массив семестры x компетенции; NaN - компетенция к этому семестру еще не изучалась.
+        """
+        positions = np.flatnonzero(self.students == student)
+        if not len(positions):
+            return np.full((len(self.semesters), len(self.competencies)), np.nan)
+        _, n_studied, real, _ = (self.prefix[1:, :, positions[0], :]).transpose(1, 0, 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n_studied > 0, np.round(real * 100 / n_studied, 2), np.nan)
+
+_trajectory_flight = SingleFlight()
+
+def group_trajectory(engine, group):
+    """Накопленные суммы группы для текущей версии данных.
+
+    При смене версии семестры, оценки которых не изменились, переиспользуются:
+    пересчитываются слои начиная с первого измененного семестра, а новый
+    семестр в конце добавляется одним слоем. Ось студентов всегда строится
+    заново по group_students: отчисленные студенты убираются, новые встают на
+    свое место в порядке группы.
+    """
+    dataset, version = engine.dataset, engine.version
+    cached = trajectory_cache.get((dataset, group))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    def update():
+        rows = engine.competency_rows({'Название': [group]})
+        by_semester = {semester: part for semester, part in rows.groupby('Семестр', sort=True)}
+        semesters = list(by_semester)
+        fingerprints = [semester_fingerprint(by_semester[s]) for s in semesters]
+
+        students = engine.group_students(group)
+        trajectory = GroupTrajectory.empty(students)
+        if cached is not None:
+            previous = cached[1]
+            keep = 0
+            for old, new in zip(zip(previous.semesters, previous.fingerprints), zip(semesters, fingerprints)):
+                if old != new:
+                    break
+                keep += 1
+            if keep:
+                trajectory = previous.truncate(keep).with_students(students)
+        for semester, fingerprint in list(zip(semesters, fingerprints))[len(trajectory.semesters):]:
+            trajectory = trajectory.append(semester, by_semester[semester], fingerprint)
+        trajectory_cache.put((dataset, group), (version, trajectory))
+        return trajectory
+
+    return _trajectory_flight.do((dataset, version, group), update)
+
+def group_score_matrix(engine, group, semesters):
+    """Матрица баллов группы за выбранные семестры (кэшируется по версии данных)"""
+    trajectory = group_trajectory(engine, group)
+    key = (engine.dataset, engine.version, group, tuple(sorted(semesters or trajectory.semesters)))
+    return matrix_cache.get_or_compute(key, lambda: trajectory.matrix(semesters))
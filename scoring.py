@@ -0,0 +1,173 @@
+import pandas as pd
+
+def get_last_word(text):
+    if not isinstance(text, str):
+        return ""
+    words = text.strip().split()
+    return words[-1] if words else ""
+
+debt_grades = ['Незачет', 'Н/я', 'Неуд']
+
+def convert_semester(row):
+    """Преобразует семестр из формата 'курс, семестр' в стандартную нумерацию (1-8)"""
+    try:
+        course = int(row['Курс'])
+        semester_in_course = int(row['Семестр'])
+        return (course - 1) * 2 + semester_in_course
+    except (ValueError, KeyError):
+        return row['Семестр']  # Если не получается преобразовать, оставляем как есть
+
+# Словарь для перевода текстовых оценок в числа
+grade_map = {
+    'Незачет': -1,
+    'NULL': 0,
+    'Н/я': 1,
+    'Неуд': 2,
+    'Удовл': 3,
+    'Хор': 4,
+    'Отл': 5,
+    'Не изуч.': 6,
+    'Зачет': 7,
+}
+
+def calculate_competency_score(competency_group, min_score=False):
+    if 'Описание' not in competency_group.columns:
+        raise ValueError("Для правильной обработки NULL нужен столбец 'Описание'")
+
+    # Исключаем записи с "Не изуч." (6)
+    studied_group = competency_group[competency_group['Числовая_оценка'] != 6]
+
+    N = len(studied_group)  # Теперь считаем только изученные
+    if N == 0:
+        return 0
+
+    # Разделяем зачеты и экзамены (уже без "Не изуч.")
+    credits = studied_group[(studied_group['ДиффенцированныйЗачет'] == 0)]
+    exams = studied_group[(studied_group['ДиффенцированныйЗачет'] == 1)]
+
+    X = len(credits)  # Количество зачетов
+    Y = len(exams)    # Количество экзаменов
+
+    total_score = 0
+
+    if X > 0:
+        credit_weight = X / N  # Масса зачетов
+        per_credit = (credit_weight / X) * 100  # Вклад одного зачета
+
+        for _, row in credits.iterrows():
+            grade = row['Числовая_оценка']
+            if min_score:
+                # Минимальный балл - считаем как "зачет"
+                total_score += per_credit
+            else:
+                # Реальный расчет
+                if grade == 7:  # Зачет
+                    total_score += per_credit
+                elif grade == -1:  # Незачет
+                    total_score += 0
+
+    if Y > 0:
+        exam_weight = Y / N  # Масса экзаменов
+        per_exam_max = (exam_weight / Y) * 100  # Макс вклад экзамена
+
+        for _, row in exams.iterrows():
+            grade = row['Числовая_оценка']
+            if min_score:
+                # Минимальный балл - считаем как "удовл" (3)
+                total_score += 0.5 * per_exam_max
+            else:
+                # Реальный расчет
+                if grade == 3:  # Удовл
+                    total_score += 0.5 * per_exam_max
+                elif grade == 4:  # Хор
+                    total_score += 0.75 * per_exam_max
+                elif grade == 5:  # Отл
+                    total_score += per_exam_max
+
+    return round(total_score, 2)
+
+def build_ratings_frame(student_performance, student_attendance):
+    """Собирает таблицу рейтингов из успеваемости и посещаемости студентов"""
+    ratings_data = []
+    for student in student_performance.keys():
+        ratings_data.append({
+            'Студент': f"Студент {student}",
+            'Успеваемость (%)': round(student_performance[student]['avg_score_percent'], 2),
+            'Успеваемость (5-балльная)': round(student_performance[student]['avg_score_5'], 2),
+            'Долги': student_performance[student]['debts'],
+            'Посещаемость (%)': round(student_attendance.get(student, 100), 2)
+        })
+
+    ratings_df = pd.DataFrame(ratings_data)
+
+    # Рассчитываем рейтинги (используем 5-балльную шкалу для сортировки)
+    if not ratings_df.empty:
+        # Рейтинг по успеваемости (чем выше балл, тем выше рейтинг)
+        ratings_df['Рейтинг в группе (успеваемость)'] = ratings_df['Успеваемость (5-балльная)'].rank(ascending=False, method='dense').astype(int)
+
+        # Рейтинг по посещаемости (чем выше %, тем выше рейтинг)
+        ratings_df['Рейтинг в группе (посещаемость)'] = ratings_df['Посещаемость (%)'].rank(ascending=False, method='dense').astype(int)
+
+        # Для рейтинга на направлении, курсе и в институте - в реальном приложении
+        # нужно было бы иметь данные по всем группам, здесь просто заполняем теми же значениями
+        ratings_df['Рейтинг на направлении (успеваемость)'] = ratings_df['Рейтинг в группе (успеваемость)']
+        ratings_df['Рейтинг на направлении (посещаемость)'] = ratings_df['Рейтинг в группе (посещаемость)']
+        ratings_df['Рейтинг на курсе (успеваемость)'] = ratings_df['Рейтинг в группе (успеваемость)']
+        ratings_df['Рейтинг на курсе (посещаемость)'] = ratings_df['Рейтинг в группе (посещаемость)']
+        ratings_df['Рейтинг в институте (успеваемость)'] = ratings_df['Рейтинг в группе (успеваемость)']
+        ratings_df['Рейтинг в институте (посещаемость)'] = ratings_df['Рейтинг в группе (посещаемость)']
+
+    return ratings_df
+
+def attendance_percent(total_classes, missed_classes):
+    """Процент посещаемости по сумме занятий и пропусков"""
+    return ((total_classes - missed_classes) / total_classes * 100
+            if total_classes > 0 else 100)
+
+def extract_year(year_str):
+    try:
+        return int(year_str.split('-')[0])
+    except:
+        return 0
+
+def competency_scores(rows, with_min=False):
+    """Баллы по компетенциям: версии компетенции объединяются по последнему слову.
+
+    Для каждой компетенции возвращает последнюю по учебному году формулировку,
+    тип, фактический балл и (если with_min) минимальный балл.
+    """
+    if rows.empty:
+        return []
+
+    # Код компетенции обычно уже посчитан при загрузке данных
+    last_words = rows['last_word'] if 'last_word' in rows else rows['Компетенция'].apply(get_last_word)
+    years = rows['УчебныйГод'].apply(extract_year)
+
+    # Находим последние версии каждой компетенции (по последнему слову)
+    latest_versions = {}
+    for competency, last_word, year in zip(rows['Компетенция'], last_words, years):
+        if last_word not in latest_versions or year > latest_versions[last_word]['year']:
+            latest_versions[last_word] = {
+                'competency': competency,
+                'year': year
+            }
+
+    scores = []
+    for last_word, group in rows.groupby(last_words):
+        # Исключаем из группы записи с "Не изуч."
+        studied_group = group[group['Числовая_оценка'] != 6]
+        if studied_group.empty:
+            # Все записи этой группы имеют "Не изуч."
+            continue
+
+        entry = {
+            'Компетенция': latest_versions[last_word]['competency'],
+            'last_word': last_word,
+            'Тип_Компетенции': studied_group['Тип_Компетенции'].iloc[0],
+            'Балл': calculate_competency_score(studied_group),
+        }
+        if with_min:
+            entry['Минимальный балл'] = calculate_competency_score(group, min_score=True)
+        scores.append(entry)
+
+    return scores
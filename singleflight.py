@@ -0,0 +1,85 @@
+import functools
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединяет одновременные вычисления с одинаковым ключом.
+
+    Первый поток считает результат, остальные ждут его и получают тот же
+    объект. После завершения ключ освобождается - это не кэш, а защита от
+    одинаковых запросов, пришедших одновременно.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+def normalize_key(value):
+    """Хэшируемый ключ аргументов: порядок выбранных в списке значений не важен"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize_key(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        items = [normalize_key(item) for item in value]
+        try:
+            return tuple(sorted(items))
+        except TypeError:
+            return tuple(items)
+    if hasattr(value, 'item'):
+        return value.item()  # numpy-скаляры
+    return value
+
+def coalesce(fn=None, scope=None):
+    """Декоратор: одновременные вызовы fn с одинаковыми аргументами считаются один раз.
+
+    scope() - часть ключа, которой нет в аргументах (например, набор данных
+    запроса и его версия): вызовы с разным scope не объединяются.
+    Используется как @coalesce или @coalesce(scope=...).
+    """
+    if fn is None:
+        return functools.partial(coalesce, scope=scope)
+    flight = SingleFlight()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Позиционные аргументы сохраняют порядок, нормализуются только их значения
+        key = (scope() if scope else None, tuple(normalize_key(arg) for arg in args), normalize_key(kwargs))
+        return flight.do(key, fn, *args, **kwargs)
+
+    wrapper.flight = flight
+    return wrapper
@@ -0,0 +1,159 @@
+"""Журнал медленных callback'ов и их воспроизведение.
+
+Включается переменной окружения SLOW_CALLBACK_LOG (путь к файлу): вызовы
+дольше SLOW_CALLBACK_MS миллисекунд записываются с входными данными одной
+JSON-строкой в ротируемый файл. Воспроизведение прогоняет записанные вызовы
+на текущем коде и сравнивает время:
+
+    python slowlog.py slow_callbacks.log slow_callbacks.log.1 --repeat 3
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import statistics
+import time
+from logging.handlers import RotatingFileHandler
+
+import dash
+
+SLOW_CALLBACK_MS = float(os.environ.get('SLOW_CALLBACK_MS', 500))
+SLOW_CALLBACK_LOG_BYTES = int(os.environ.get('SLOW_CALLBACK_LOG_BYTES', 5 * 1024 * 1024))
+SLOW_CALLBACK_LOG_BACKUPS = int(os.environ.get('SLOW_CALLBACK_LOG_BACKUPS', 5))
+
+def _triggered():
+    # Вне запроса Dash (прямой вызов функции) контекста нет
+    try:
+        return [{'prop_id': item['prop_id'], 'value': item.get('value')}
+                for item in dash.callback_context.triggered]
+    except Exception:
+        return []
+
+
+class CallbackRecorder:
+    """Декоратор: записывает в журнал вызовы дольше порога"""
+
+    def __init__(self, path, threshold_ms=SLOW_CALLBACK_MS, version=None, dataset=None,
+                 max_bytes=SLOW_CALLBACK_LOG_BYTES, backups=SLOW_CALLBACK_LOG_BACKUPS):
+        self.threshold_ms = threshold_ms
+        self.version = version
+        self.dataset = dataset
+        self.logger = logging.getLogger(f'slow_callbacks.{os.path.abspath(path)}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if elapsed_ms >= self.threshold_ms:
+                    self.record(fn.__name__, elapsed_ms, args, kwargs)
+        return wrapper
+
+    def record(self, name, elapsed_ms, args, kwargs):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'callback': name,
+            'ms': round(elapsed_ms, 1),
+            'dataset': self.dataset() if self.dataset else None,
+            'version': self.version() if self.version else None,
+            'triggered': _triggered(),
+            'args': list(args),
+            'kwargs': kwargs,
+        }
+        self.logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+def slow_callback_recorder(version=None, dataset=None):
+    """Декоратор из переменных окружения; если журнал не включен - функция не оборачивается"""
+    path = os.environ.get('SLOW_CALLBACK_LOG')
+    if not path:
+        return lambda fn: fn
+    return CallbackRecorder(path, version=version, dataset=dataset)
+
+def read_entries(paths):
+    entries = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    print(f'{path}:{line_number}: пропущена поврежденная запись')
+    return sorted(entries, key=lambda entry: entry['time'])
+
+def replay_entry(module, entry, repeat=1):
+    """Вызывает записанный callback с теми же входами в том же наборе данных; время каждого запуска (мс)"""
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    fn = getattr(module, entry['callback'])
+    timings = []
+    for _ in range(repeat):
+        # Callback'и, которые смотрят на dash.callback_context, видят тот же источник события
+        token = context_value.set(AttributeDict(triggered_inputs=entry.get('triggered') or []))
+        try:
+            started = time.perf_counter()
+            if entry.get('dataset') is not None:
+                module.run_in_dataset(entry['dataset'], lambda: fn(*entry['args'], **entry.get('kwargs', {})))
+            else:
+                fn(*entry['args'], **entry.get('kwargs', {}))
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            context_value.reset(token)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизводит медленные вызовы callback\'ов на текущем коде')
+    parser.add_argument('logs', nargs='+', help='Файлы журнала (можно вместе с ротированными .1, .2, ...)')
+    parser.add_argument('--callback', action='append', help='Только этот callback (можно несколько раз)')
+    parser.add_argument('--repeat', type=int, default=3, help='Сколько раз запускать каждый вызов')
+    parser.add_argument('--limit', type=int, default=None, help='Не больше стольких записей')
+    args = parser.parse_args()
+
+    # Воспроизведение само в журнал не пишет и не прогревает кэши: первый запуск должен быть холодным
+    os.environ.pop('SLOW_CALLBACK_LOG', None)
+    os.environ['PREWARM_LOG'] = ''
+    import app
+
+    entries = read_entries(args.logs)
+    if args.callback:
+        entries = [entry for entry in entries if entry['callback'] in args.callback]
+    entries = entries[:args.limit]
+    if not entries:
+        print('Нет записей для воспроизведения')
+        return
+
+    print(f"Версия данных: {app.engine.version}")
+    print(f"{'callback':<30} {'записано, мс':>13} {'первый, мс':>11} {'лучший, мс':>11} {'изменение':>10}")
+    changes = {}
+    for entry in entries:
+        try:
+            timings = replay_entry(app, entry, args.repeat)
+        except Exception as error:
+            print(f"{entry['callback']:<30} {entry['ms']:>13.1f}  ошибка: {error!r}")
+            continue
+        best = min(timings)
+        change = (best - entry['ms']) / entry['ms'] * 100
+        changes.setdefault(entry['callback'], []).append(change)
+        version = app.registry.get(entry['dataset']).version if entry.get('dataset') else app.engine.version
+        marker = '' if entry.get('version') in (None, version) else ' (другая версия данных)'
+        print(f"{entry['callback']:<30} {entry['ms']:>13.1f} {timings[0]:>11.1f} {best:>11.1f} {change:>+9.0f}%{marker}")
+
+    print('\nМедиана изменения по callback\'ам:')
+    for name, values in sorted(changes.items()):
+        print(f'  {name}: {statistics.median(values):+.0f}% ({len(values)} вызовов)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# В pandas 3 copy-on-write включен всегда, в pandas 2 его нужно включить явно:
+# тогда срезы таблиц - представления, а не копии, и изменить снимок через них нельзя
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+def freeze_frame(frame):
+    """Таблица с теми же данными, в которой numpy-столбцы только для чтения"""
+    columns = {}
+    for column in frame.columns:
+        values = frame[column].array
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = values.to_numpy()
+            values.flags.writeable = False
+        columns[column] = values
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+# Ключ кластеризации таблицы оценок
+CLUSTER_COLUMNS = ['Название', 'Код_Студента']
+
+def cluster_offsets(frame, columns):
+    """Границы непрерывных блоков одинаковых значений columns в отсортированной таблице.
+
+    Возвращает словарь ключ -> (начало, конец) для позиционного среза iloc.
+    """
+    if frame.empty:
+        return {}
+    keys = frame[columns]
+    changed = (keys != keys.shift()).any(axis=1).to_numpy()
+    starts = np.flatnonzero(changed)
+    stops = np.append(starts[1:], len(frame))
+    values = keys.iloc[starts].itertuples(index=False, name=None)
+    if len(columns) == 1:
+        values = (value[0] for value in values)
+    return {key: (int(start), int(stop)) for key, start, stop in zip(values, starts, stops)}
+
+
+class Snapshot:
+    """Неизменяемая версия набора данных.
+
+    Запись в таблицы снимка на месте падает с ошибкой, а фильтрация дает
+    представления, поэтому callback'и работают со срезами без копирования,
+    и один снимок безопасно обслуживает много потоков. При перезагрузке данных
+    строится новый Snapshot, и движок подменяет ссылку на него одним присваиванием.
+
+    Таблица оценок хранится отсортированной по (группа, студент) с сохранением
+    исходного порядка внутри студента; индекс - номер строки в исходном файле,
+    sort_index() возвращает исходный порядок. Строки группы или студента - один
+    непрерывный срез, границы которого лежат в group_offsets и student_offsets.
+    """
+
+    def __init__(self, version, competencies=None, attendance=None):
+        self.version = version
+        self.attendance = freeze_frame(attendance) if attendance is not None else None
+        self._arrays = {}
+
+        # Производные индексы
+        self.students_by_group = {}
+        self.group_offsets = {}
+        self.student_offsets = {}
+        self.competencies = None
+        if competencies is not None:
+            # Порядок студентов в группе - порядок появления в исходных данных
+            pairs = competencies[CLUSTER_COLUMNS].drop_duplicates()
+            for group, students in pairs.groupby('Название', sort=False)['Код_Студента']:
+                self.students_by_group[group] = students.tolist()
+
+            clustered = competencies.sort_values(CLUSTER_COLUMNS, kind='stable')
+            self.competencies = freeze_frame(clustered)
+            self.group_offsets = cluster_offsets(clustered, ['Название'])
+            self.student_offsets = cluster_offsets(clustered, CLUSTER_COLUMNS)
+
+    def group_rows(self, group):
+        """Строки группы (срез без копирования)"""
+        start, stop = self.group_offsets.get(group, (0, 0))
+        return self.competencies.iloc[start:stop]
+
+    def student_rows(self, group, student):
+        """Строки студента в группе в исходном порядке (срез без копирования)"""
+        start, stop = self.student_offsets.get((group, student), (0, 0))
+        return self.competencies.iloc[start:stop]
+
+    def array(self, table, column):
+        """Столбец таблицы как numpy-массив только для чтения"""
+        key = (table, column)
+        values = self._arrays.get(key)
+        if values is None:
+            values = getattr(self, table)[column].to_numpy()
+            values.flags.writeable = False
+            self._arrays[key] = values
+        return values
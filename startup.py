@@ -0,0 +1,69 @@
+"""Время запуска worker'а по фазам.
+
+Включается переменной окружения STARTUP_PROFILE=1: app.py отмечает конец
+каждой фазы (импорт библиотек, загрузка данных, значения фильтров, макет,
+callback'и), и после импорта приложения в stderr печатается таблица.
+
+    STARTUP_PROFILE=1 python -c "import app"
+"""
+import importlib
+import os
+import sys
+import time
+
+STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+
+class StartupProfiler:
+    """Длительность фаз запуска: фаза длится от предыдущей отметки до mark()"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+    def report(self, file=None):
+        file = file or sys.stderr
+        width = max([len(name) for name, _ in self.phases] + [5])
+        print(f"{'фаза':<{width}} {'мс':>8} {'доля':>6}", file=file)
+        for name, seconds in self.phases:
+            share = seconds / self.total if self.total else 0
+            print(f'{name:<{width}} {seconds * 1000:>8.1f} {share:>6.0%}', file=file)
+        print(f"{'всего':<{width}} {self.total * 1000:>8.1f}", file=file)
+
+class LazyModule:
+    """Модуль, который импортируется при первом обращении к его атрибуту.
+
+    Импорт через importlib.import_module защищен блокировкой импорта, поэтому
+    одновременное первое обращение из нескольких потоков безопасно.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def lazy_import(name):
+    """Модуль name, если он уже импортирован, иначе LazyModule"""
+    return sys.modules.get(name) or LazyModule(name)
+
+# Отсчет идет с первого импорта модуля - app.py импортирует его раньше остальных
+startup = StartupProfiler()
+
+def report_startup():
+    """Печатает таблицу фаз, если профилирование запуска включено"""
+    if STARTUP_PROFILE:
+        startup.report()
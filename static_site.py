@@ -0,0 +1,348 @@
+"""Статическая версия радара компетенций для пиковой нагрузки (сессия).
+
+Для каждого студента заранее считаются суммы баллов по компетенциям в
+разрезе семестров и таблица оценок; страница index.html сама складывает
+суммы за выбранные семестры и рисует радар в браузере. Каталог можно
+раздавать любым статическим сервером, Python на просмотр не нужен.
+При обновлении данных пересобираются только файлы изменившихся студентов.
+
+    python static_site.py -o static_site
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+from data_engine import COMPETENCIES_TABLE, create_engine
+from ingest import canonical_competencies_path
+from score_matrix import row_points
+from scoring import extract_year
+
+# Увеличивается при изменении формата файлов, чтобы все файлы пересобрались
+STATIC_FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+PLOTLY_JS_FILE = 'plotly.min.js'
+
+# Столбцы таблицы оценок (как в grades-table на дашборде)
+GRADE_COLUMNS = ['Дисциплина', 'Оценка', 'Тип_зачета', 'Семестр', 'Тип_Компетенции', 'Компетенция', 'Название']
+
+def _safe_name(value):
+    return ''.join(char if char.isalnum() or char in '.-' else '_' for char in str(value))
+
+def _json_default(value):
+    # numpy-скаляры из pandas
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def _dumps(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def student_fingerprints(rows):
+    """Отпечаток строк каждого студента группы"""
+    hashes = pd.Series(pd.util.hash_pandas_object(rows, index=False).to_numpy(), index=rows['Код_Студента'].to_numpy())
+    return {student: hashlib.sha1(f'static:{STATIC_FORMAT_VERSION};'.encode('utf-8') + values.to_numpy().tobytes())
+            .hexdigest() for student, values in hashes.groupby(level=0, sort=False)}
+
+def group_payloads(rows, students):
+    """Данные страницы для выбранных студентов группы.
+
+    По каждой компетенции и семестру хранится ячейка [изучено строк, сумма
+    баллов, сумма минимальных баллов, учебный год, номер строки, формулировка]:
+    балл за любой набор семестров - сумма ячеек (как в calculate_competency_score),
+    формулировка - самая поздняя по учебному году, при равенстве - первая по порядку.
+    """
+    rows = rows[rows['Код_Студента'].isin(students)]
+    studied, real, minimum = row_points(rows)
+    cells = pd.DataFrame({
+        'student': rows['Код_Студента'].to_numpy(),
+        'semester': rows['Семестр'].to_numpy(),
+        'last_word': rows['last_word'].to_numpy(),
+        'studied': studied.astype(int),
+        'real': real,
+        'minimum': minimum,
+        'year': rows['УчебныйГод'].map(extract_year).to_numpy(),
+        'position': range(len(rows)),
+        'competency': rows['Компетенция'].to_numpy(),
+    })
+    # Позиция строки считается внутри студента - в таком порядке строки видит competency_scores
+    cells['position'] = cells.groupby('student').cumcount()
+    keys = ['student', 'semester', 'last_word']
+    sums = cells.groupby(keys, sort=True)[['studied', 'real', 'minimum']].sum()
+    wording = (cells.sort_values(['year', 'position'], ascending=[False, True])
+               .drop_duplicates(keys).set_index(keys)[['year', 'position', 'competency']])
+    sums = sums.join(wording)
+
+    # Тип компетенции - по первой изученной строке
+    types = rows[studied].drop_duplicates('last_word').set_index('last_word')['Тип_Компетенции'].to_dict()
+
+    grades = pd.DataFrame({
+        'Дисциплина': rows['Дисциплина'],
+        'Оценка': rows['Оценка'],
+        'Тип_зачета': rows['ДиффенцированныйЗачет'].map(lambda value: 'Дифф. зачет' if value == 1 else 'Зачет'),
+        'Семестр': rows['Семестр'],
+        'Тип_Компетенции': rows['Тип_Компетенции'],
+        'Компетенция': rows['Компетенция'],
+        'Название': rows['Название'],
+    })
+    grades = grades.astype(object).where(grades.notna(), None)
+    grades_by_student = {student: part.to_numpy().tolist()
+                         for student, part in grades.groupby(rows['Код_Студента'].to_numpy(), sort=False)}
+
+    payloads = {}
+    for student, student_sums in sums.groupby(level='student', sort=False):
+        competencies = {}
+        for (_, semester, last_word), cell in student_sums.iterrows():
+            entry = competencies.setdefault(last_word, {'type': types.get(last_word), 'cells': {}})
+            entry['cells'][str(semester)] = [int(cell['studied']), float(cell['real']), float(cell['minimum']),
+                                             int(cell['year']), int(cell['position']), cell['competency']]
+        payloads[student] = {
+            'student': student,
+            'semesters': sorted({int(semester) for semester in student_sums.index.get_level_values('semester')}),
+            'competencies': competencies,
+            'grades': grades_by_student.get(student, []),
+        }
+    return payloads
+
+def build_static_site(engine, output_dir='static_site', force=False):
+    """Собирает статический сайт; возвращает (пересобрано, без изменений, удалено)"""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {}
+    if not force:
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    js_path = os.path.join(output_dir, PLOTLY_JS_FILE)
+    if not os.path.exists(js_path):
+        _write_atomic(js_path, get_plotlyjs())
+    _write_atomic(os.path.join(output_dir, 'index.html'), PAGE_HTML)
+
+    index = {'version': engine.version, 'columns': GRADE_COLUMNS,
+             'types': engine.distinct(COMPETENCIES_TABLE, 'Тип_Компетенции'), 'groups': []}
+    new_manifest, built, unchanged = {}, 0, 0
+    for group in engine.distinct(COMPETENCIES_TABLE, 'Название'):
+        rows = engine.competency_rows({'Название': [group]})
+        fingerprints = student_fingerprints(rows)
+        students = engine.group_students(group)
+        # Отпечаток в адресе файла студента: после пересборки кэши браузера и CDN
+        # сбрасываются только у изменившихся студентов
+        index['groups'].append({'group': group, 'dir': _safe_name(group), 'students': students,
+                                'fingerprints': {student: fingerprints[student][:16] for student in students}})
+
+        changed = []
+        for student in students:
+            key = f'{_safe_name(group)}/{student}'
+            new_manifest[key] = fingerprints[student]
+            path = os.path.join(output_dir, 'data', f'{key}.json')
+            if manifest.get(key) != fingerprints[student] or not os.path.exists(path):
+                changed.append(student)
+        unchanged += len(students) - len(changed)
+
+        # Считаются только изменившиеся студенты
+        for student, payload in group_payloads(rows, changed).items():
+            payload['group'] = group
+            _write_atomic(os.path.join(output_dir, 'data', _safe_name(group), f'{student}.json'), _dumps(payload))
+            built += 1
+
+    # Файлы студентов, которых больше нет в данных
+    removed = 0
+    for key in set(manifest) - set(new_manifest):
+        path = os.path.join(output_dir, 'data', f'{key}.json')
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+
+    _write_atomic(os.path.join(output_dir, 'data', 'index.json'), _dumps(index))
+    _write_atomic(manifest_path, json.dumps(new_manifest, ensure_ascii=False, indent=1))
+    return built, unchanged, removed
+
+def main():
+    parser = argparse.ArgumentParser(description='Собирает статическую версию радара компетенций')
+    parser.add_argument('-o', '--output-dir', default='static_site', help='Каталог сайта')
+    parser.add_argument('--force', action='store_true', help='Пересобрать всех студентов')
+    parser.add_argument('--clean', action='store_true', help='Удалить каталог перед сборкой')
+    args = parser.parse_args()
+
+    if args.clean:
+        shutil.rmtree(args.output_dir, ignore_errors=True)
+    started = time.perf_counter()
+    engine = create_engine(competencies_path=canonical_competencies_path())
+    built, unchanged, removed = build_static_site(engine, args.output_dir, args.force)
+    print(f'Студентов пересобрано: {built}, без изменений: {unchanged}, удалено: {removed}, '
+          f'{time.perf_counter() - started:.1f} с -> {args.output_dir}')
+
+
+# Страница только для чтения: те же фильтры и радар, что на дашборде, но все считается в браузере
+PAGE_HTML = '''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>Компетенции студентов</title>
+<script src="plotly.min.js"></script>
+<style>
+body { font-family: Arial, sans-serif; margin: 0; display: flex; }
+#controls { width: 320px; padding: 20px; box-sizing: border-box; }
+#charts { flex: 1; padding: 20px; }
+#controls select { width: 100%; margin-bottom: 10px; }
+#controls label { display: block; }
+#radar { height: 70vh; }
+table { border-collapse: collapse; font-size: 13px; width: 100%; }
+th { background: #f8f9fa; text-align: left; }
+th, td { border: 1px solid #ddd; padding: 5px; }
+tr:nth-child(even) { background: rgb(248, 248, 248); }
+td.debt { background: rgba(255, 0, 0, 0.3); font-weight: bold; color: darkred; }
+#grades { max-height: 350px; overflow-y: auto; margin-top: 20px; }
+</style>
+</head>
+<body>
+<div id="controls">
+<h2>График компетенций студентов</h2>
+<p>Выберите группу:</p><select id="group"></select>
+<p>Выберите студента:</p><select id="student"></select>
+<p>Выберите семестр:</p><div id="semesters"></div>
+<p>Выберите тип компетенции:</p><div id="types"></div>
+<label><input type="checkbox" id="show-min" checked> Показать минимальный балл (тройки/зачеты)</label>
+</div>
+<div id="charts">
+<div id="radar"></div>
+<div id="grades"></div>
+</div>
+<script>
+const DEBT_GRADES = ['Незачет', 'Н/я', 'Неуд'];
+let index = null;
+let payload = null;
+
+// Округление до 2 знаков как в Python/numpy (половина - к четному)
+function round2(value) {
+  const scaled = value * 100;
+  const floor = Math.floor(scaled);
+  const diff = scaled - floor;
+  if (diff === 0.5) return (floor % 2 === 0 ? floor : floor + 1) / 100;
+  return Math.round(scaled) / 100;
+}
+
+function checked(containerId) {
+  return Array.from(document.querySelectorAll('#' + containerId + ' input:checked')).map(input => input.value);
+}
+
+function checkboxes(containerId, values, label) {
+  document.getElementById(containerId).innerHTML = values.map(value =>
+    `<label><input type="checkbox" value="${value}" checked> ${label(value)}</label>`).join('');
+  document.querySelectorAll('#' + containerId + ' input').forEach(input => input.onchange = render);
+}
+
+function escapeHtml(value) {
+  return String(value ?? '').replace(/[&<>"]/g, char => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}[char]));
+}
+
+// Баллы за выбранные семестры и типы: суммы ячеек, как в competency_scores
+function scores(semesters, types) {
+  const result = [];
+  for (const lastWord of Object.keys(payload.competencies).sort()) {
+    const competency = payload.competencies[lastWord];
+    if (!types.includes(competency.type)) continue;
+    let studied = 0, real = 0, minimum = 0, latest = null;
+    for (const semester of semesters) {
+      const cell = competency.cells[semester];
+      if (!cell) continue;
+      studied += cell[0]; real += cell[1]; minimum += cell[2];
+      if (latest === null || cell[3] > latest[3] || (cell[3] === latest[3] && cell[4] < latest[4])) latest = cell;
+    }
+    if (studied === 0) continue;
+    result.push({lastWord, type: competency.type, competency: latest[5],
+                 score: round2(real * 100 / studied), minimum: round2(minimum * 100 / studied)});
+  }
+  return result;
+}
+
+function render() {
+  if (!payload) return;
+  const semesters = checked('semesters');
+  const types = checked('types');
+  const rows = payload.grades.filter(row => semesters.includes(String(row[3])) && types.includes(row[4]));
+  const result = scores(semesters, types);
+  const group = document.getElementById('group').value;
+
+  const theta = result.map(item => item.lastWord);
+  const traces = [{
+    type: 'scatterpolar', r: result.map(item => item.score), theta, fill: 'toself', mode: 'lines+markers',
+    line: {width: 2, color: 'blue'}, marker: {size: 5, color: 'blue'}, fillcolor: 'rgba(0, 100, 255, 0.3)',
+    name: 'Фактический балл', customdata: result.map(item => [item.type, item.competency]),
+    hovertemplate: '<b>%{customdata[1]}</b><br>Балл: %{r:.2f}%<br>Тип: %{customdata[0]}<extra></extra>'
+  }];
+  if (document.getElementById('show-min').checked) {
+    traces.push({
+      type: 'scatterpolar', r: result.map(item => item.minimum), theta, fill: 'none',
+      line: {color: 'red', width: 1, dash: 'dot'}, name: 'Минимальный балл',
+      hovertemplate: '<b>Компетенция: %{theta}</b><br>Балл: %{r:.2f}%<br><extra></extra>'
+    });
+  }
+  // Замыкаем линии, как line_close в plotly express
+  traces.forEach(trace => { if (trace.r.length) { trace.r.push(trace.r[0]); trace.theta = theta.concat(theta.slice(0, 1)); } });
+  const title = result.length ? `Компетенции студента ${payload.student} (Группа: ${group})`
+                              : (rows.length ? 'Все компетенции не изучены для выбранных семестров'
+                                             : 'Нет данных для выбранных критериев');
+  Plotly.react('radar', result.length ? traces : [], {
+    title: {text: title}, showlegend: true, margin: {l: 40, r: 40, t: 60, b: 40},
+    polar: {radialaxis: {visible: true, range: [0, 100], tickvals: [0, 20, 40, 60, 80, 100],
+                         ticktext: ['0%', '20%', '40%', '60%', '80%', '100%']},
+            angularaxis: {rotation: 90}}
+  });
+
+  const header = ['Дисциплина', 'Оценка', 'Тип зачета', 'Семестр', 'Тип', 'Компетенция', 'Группа'];
+  document.getElementById('grades').innerHTML = '<table><tr>' + header.map(name => `<th>${name}</th>`).join('') +
+    '</tr>' + rows.map(row => '<tr>' + row.map((value, i) =>
+      `<td${i === 1 && DEBT_GRADES.includes(value) ? ' class="debt"' : ''}>${escapeHtml(value)}</td>`).join('') +
+      '</tr>').join('') + '</table>';
+}
+
+async function loadStudent() {
+  const group = index.groups.find(item => item.group === document.getElementById('group').value);
+  const student = document.getElementById('student').value;
+  const response = await fetch(`data/${group.dir}/${student}.json?v=${group.fingerprints[student]}`);
+  payload = await response.json();
+  checkboxes('semesters', payload.semesters.map(String), value => `Семестр ${value}`);
+  render();
+}
+
+function loadGroup() {
+  const group = index.groups.find(item => item.group === document.getElementById('group').value);
+  const select = document.getElementById('student');
+  select.innerHTML = group.students.map(student => `<option value="${student}">Студент ${student}</option>`).join('');
+  loadStudent();
+}
+
+async function init() {
+  index = await (await fetch('data/index.json', {cache: 'no-cache'})).json();
+  const select = document.getElementById('group');
+  select.innerHTML = index.groups.map(item => `<option value="${escapeHtml(item.group)}">${escapeHtml(item.group)}</option>`).join('');
+  select.onchange = loadGroup;
+  document.getElementById('student').onchange = loadStudent;
+  document.getElementById('show-min').onchange = render;
+  checkboxes('types', index.types, value => value);
+  loadGroup();
+}
+
+init();
+</script>
+</body>
+</html>
+'''
+
+if __name__ == '__main__':
+    main()
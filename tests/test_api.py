@@ -0,0 +1,53 @@
+"""ETag и 304 у cached_json"""
+from types import SimpleNamespace
+
+from flask import Flask
+
+from api import cached_json
+
+
+def make_client(engine, calls):
+    server = Flask(__name__)
+
+    @server.route('/api/v1/test')
+    def api_test():
+        def compute():
+            calls.append(engine.version)
+            return {'version': engine.version}
+        return cached_json(engine, compute)
+
+    return server.test_client()
+
+
+def test_same_key_returns_not_modified():
+    engine = SimpleNamespace(dataset='test-etag', version=1)
+    calls = []
+    client = make_client(engine, calls)
+    first = client.get('/api/v1/test?group=404а')
+    assert first.status_code == 200
+    assert first.get_json() == {'version': 1}
+    etag = first.headers['ETag']
+    repeated = client.get('/api/v1/test?group=404а', headers={'If-None-Match': etag})
+    assert repeated.status_code == 304
+    assert repeated.data == b''
+    assert repeated.headers['ETag'] == etag
+    # Ответ 304 не пересчитывается, повторный запрос без ETag берется из кэша
+    assert client.get('/api/v1/test?group=404а').get_json() == {'version': 1}
+    assert calls == [1]
+    # Другие параметры - другой ключ и другой ETag
+    other = client.get('/api/v1/test?group=404б', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+    assert other.headers['ETag'] != etag
+
+
+def test_new_version_changes_etag():
+    engine = SimpleNamespace(dataset='test-version', version=1)
+    calls = []
+    client = make_client(engine, calls)
+    etag = client.get('/api/v1/test').headers['ETag']
+    engine.version = 2
+    response = client.get('/api/v1/test', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json() == {'version': 2}
+    assert response.headers['ETag'] != etag
+    assert calls == [1, 2]
@@ -0,0 +1,68 @@
+"""compact_table после JSON-кодирования Dash восстанавливается в те же записи"""
+import json
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+from compact import compact_column, compact_table
+
+
+def decode_records(payload):
+    """То же, что RECORDS_JS в браузере"""
+    records = [{} for _ in range(payload['length'])]
+    for column in payload['columns']:
+        values = payload['values'][column]
+        if isinstance(values, dict):
+            values = [None if code < 0 else values['labels'][code] for code in values['codes']]
+        for record, value in zip(records, values):
+            record[column] = value
+    return records
+
+
+def roundtrip(frame, columns=None):
+    payload = compact_table(frame, list(frame.columns) if columns is None else columns)
+    return decode_records(json.loads(to_json_plotly(payload)))
+
+
+def test_nan_becomes_null():
+    frame = pd.DataFrame({'Балл': [1.5, np.nan, 3.25]})
+    assert roundtrip(frame) == [{'Балл': 1.5}, {'Балл': None}, {'Балл': 3.25}]
+
+
+def test_whole_floats_become_int():
+    column = compact_column(pd.Series([1.0, 2.0, 300.0]))
+    assert np.issubdtype(column.dtype, np.integer)
+    records = roundtrip(pd.DataFrame({'Балл': [1.0, 2.0, 300.0]}))
+    assert records == [{'Балл': 1}, {'Балл': 2}, {'Балл': 300}]
+    assert all(type(record['Балл']) is int for record in records)
+    # Целые значения с пропуском остаются дробными
+    assert roundtrip(pd.DataFrame({'Балл': [1.0, np.nan]})) == [{'Балл': 1.0}, {'Балл': None}]
+
+
+def test_factorized_strings_with_missing_value():
+    series = pd.Series(['Отл', None, 'Хор', 'Отл'])
+    column = compact_column(series)
+    assert column['labels'] == ['Отл', 'Хор']
+    assert list(column['codes']) == [0, -1, 1, 0]
+    records = roundtrip(pd.DataFrame({'Оценка': series, 'Код_Студента': [7, 8, 9, 10]}))
+    assert records == [
+        {'Оценка': 'Отл', 'Код_Студента': 7},
+        {'Оценка': None, 'Код_Студента': 8},
+        {'Оценка': 'Хор', 'Код_Студента': 9},
+        {'Оценка': 'Отл', 'Код_Студента': 10},
+    ]
+
+
+def test_matches_records():
+    frame = pd.DataFrame({
+        'Студент': ['Иванов', 'Петров', np.nan],
+        'Балл': [4.5, np.nan, 2.0],
+        'Место': [1, 2, 3],
+        'Долг': [False, True, False],
+    })
+    expected = frame.astype(object).where(frame.notna(), None).to_dict('records')
+    for record in expected:
+        record['Долг'] = int(record['Долг'])
+    # Столбцы, которых нет в таблице, пропускаются
+    assert roundtrip(frame, list(frame.columns) + ['Нет']) == expected
@@ -0,0 +1,51 @@
+"""Сведение data.csv и Компетенции.csv по ключу содержимого"""
+import os
+
+import pandas as pd
+import pytest
+
+from data_engine import COMPETENCIES_FILE, read_competencies
+from ingest import DIFF_CREDIT_BY_DESCRIPTION, KEY_COLUMNS, merge_sources, write_canonical
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPETENCIES_PATH = os.path.join(ROOT, COMPETENCIES_FILE)
+DATA_PATH = os.path.join(ROOT, 'data.csv')
+
+
+@pytest.fixture(scope='module')
+def competencies():
+    return read_competencies(COMPETENCIES_PATH)
+
+
+def test_merge_reproduces_competencies(competencies, tmp_path):
+    canonical, stats = merge_sources([DATA_PATH, COMPETENCIES_PATH])
+    # Все строки data.csv - дубли строк Компетенции.csv
+    assert stats['duplicates'] == stats['sources'][DATA_PATH]
+    assert stats['canonical'] == len(competencies)
+    path = tmp_path / 'canonical.csv'
+    write_canonical(canonical, str(path))
+    pd.testing.assert_frame_equal(read_competencies(str(path)), competencies)
+
+
+def test_exam_and_course_project_are_not_merged(competencies):
+    # Экзамен и курсовая по одной дисциплине в одном семестре совпадают по ключу без Описание
+    key = [column for column in KEY_COLUMNS if column != 'Описание']
+    shared = competencies[competencies.duplicated(key, keep=False)]
+    assert shared['Описание'].value_counts().to_dict() == {'Экзамен': 310, 'КурсПроект': 238, 'КурсРаб': 72}
+    canonical, _ = merge_sources([COMPETENCIES_PATH, DATA_PATH])
+    merged = canonical.merge(shared[KEY_COLUMNS], on=KEY_COLUMNS)
+    assert len(merged) == len(shared)
+    assert not merged.duplicated(KEY_COLUMNS).any()
+
+
+def test_diff_credit_filled_from_description(competencies):
+    # В data.csv нет ДиффенцированныйЗачет - он восстанавливается по форме контроля
+    canonical, stats = merge_sources([DATA_PATH])
+    known = canonical['Описание'].isin(list(DIFF_CREDIT_BY_DESCRIPTION))
+    assert stats['filled'] == int(known.sum())
+    assert canonical.loc[~known, 'ДиффенцированныйЗачет'].isna().all()
+    # Восстановленные значения совпадают с Компетенции.csv
+    filled = canonical[known].merge(competencies[KEY_COLUMNS + ['ДиффенцированныйЗачет']], on=KEY_COLUMNS,
+                                    suffixes=('', '_исходный'))
+    assert len(filled) == int(known.sum())
+    assert (filled['ДиффенцированныйЗачет'] == filled['ДиффенцированныйЗачет_исходный']).all()
@@ -0,0 +1,135 @@
+"""Точность эскизов KLL и пересчет листов процентилей после перезагрузки"""
+import os
+
+import numpy as np
+import pytest
+
+from data_engine import ATTENDANCE_FILE, COMPETENCIES_FILE, PandasEngine, read_competencies
+from ingest import write_canonical
+from percentiles import KLLSketch, leaf_store, percentile_index
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+K = 200
+# Допустимая ошибка ранга в процентных пунктах (ожидаемая для k=200 - меньше 1)
+TOLERANCE = 1.5
+
+
+def exact_percentile(data, values):
+    data = np.sort(data)
+    below = np.searchsorted(data, values, side='left')
+    not_above = np.searchsorted(data, values, side='right')
+    return (below + not_above) / 2 / len(data) * 100
+
+
+def samples():
+    rng = np.random.default_rng(7)
+    return {
+        'normal': rng.normal(60, 15, 100_000),
+        'uniform': rng.uniform(0, 100, 20_000),
+        # Баллы с повторами: пять различных значений
+        'ties': rng.integers(0, 5, 50_000) * 25.0,
+    }
+
+
+def build_single(data):
+    return KLLSketch.from_values(data, K)
+
+
+def build_merged(data):
+    sketch = KLLSketch(K)
+    for part in np.array_split(data, 40):
+        sketch = sketch.merge(KLLSketch.from_values(part, K))
+    return sketch
+
+
+def build_streamed(data):
+    sketch = KLLSketch(K)
+    for part in np.array_split(data, 500):
+        sketch.update(part)
+    return sketch
+
+
+@pytest.mark.parametrize('build', [build_single, build_merged, build_streamed])
+@pytest.mark.parametrize('sample', ['normal', 'uniform', 'ties'])
+def test_rank_error(build, sample):
+    data = samples()[sample]
+    sketch = build(data)
+    assert sketch.n == len(data)
+    # Объем эскиза не растет с числом значений
+    assert len(sketch) < 4 * K
+    values = np.quantile(data, np.linspace(0, 1, 201))
+    assert np.abs(sketch.percentile(values) - exact_percentile(data, values)).max() <= TOLERANCE
+    for q in [0.1, 0.5, 0.9]:
+        assert abs(exact_percentile(data, sketch.quantile(q)) - q * 100) <= TOLERANCE
+
+
+def test_exact_below_k():
+    data = np.random.default_rng(3).normal(60, 15, K)
+    sketch = build_merged(data)
+    assert len(sketch) == K
+    values = np.concatenate([data, [data.min() - 1, data.max() + 1, 60.0]])
+    np.testing.assert_array_equal(sketch.percentile(values), np.round(exact_percentile(data, values), 1))
+    assert sketch.quantile(0.5) == np.sort(data)[K // 2 - 1]
+
+
+def test_ties_counted_half():
+    sketch = KLLSketch.from_values([10, 20, 20, 20, 30, np.nan], K)
+    assert sketch.n == 5
+    np.testing.assert_array_equal(sketch.percentile([5, 10, 20, 25, 30, 35]), [0, 10, 50, 80, 90, 100])
+    assert KLLSketch.from_values([50.0] * 10_000, K).percentile(50.0) == 50.0
+    assert np.isnan(KLLSketch(K).percentile(50.0))
+
+
+def test_deterministic():
+    data = samples()['normal']
+    for build in [build_single, build_merged, build_streamed]:
+        first, second = build(data), build(data.copy())
+        assert len(first.levels) == len(second.levels)
+        for first_items, second_items in zip(first.levels, second.levels):
+            np.testing.assert_array_equal(first_items, second_items)
+
+
+def make_engine(competencies_path, dataset):
+    engine = PandasEngine(competencies_path=str(competencies_path),
+                          attendance_path=os.path.join(ROOT, ATTENDANCE_FILE), prepared_dir=None)
+    engine.dataset = dataset
+    return engine
+
+
+def assert_same_index(actual, expected):
+    assert list(actual.leaves) == list(expected.leaves)
+    assert actual.sketches.keys() == expected.sketches.keys()
+    for key, sketch in expected.sketches.items():
+        assert actual.sketches[key].n == sketch.n
+        for actual_items, expected_items in zip(actual.sketches[key].levels, sketch.levels):
+            np.testing.assert_array_equal(actual_items, expected_items)
+
+
+@pytest.mark.parametrize('changed_group, kept_group', [('404а', '2.210-1'), ('2.210-1', '404а')])
+def test_reload_rebuilds_changed_group(tmp_path, changed_group, kept_group):
+    competencies_path = tmp_path / COMPETENCIES_FILE
+    original = read_competencies(os.path.join(ROOT, COMPETENCIES_FILE))
+    write_canonical(original, str(competencies_path))
+    dataset = f'test-percentiles-{changed_group}'
+    engine = make_engine(competencies_path, dataset)
+    before = percentile_index(engine)
+    kept_leaves = leaf_store.get((dataset, kept_group))[1]
+
+    frame = original.copy()
+    changed = frame.index[(frame['Название'] == changed_group) & (frame['Оценка'] == 'Отл')][0]
+    frame.loc[changed, 'Оценка'] = 'Хор'
+    write_canonical(frame, str(competencies_path))
+    stat = os.stat(competencies_path)
+    os.utime(competencies_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert engine.reload()
+
+    after = percentile_index(engine)
+    assert after is not before
+    assert after.leaves[kept_group] is kept_leaves
+    assert after.leaves[changed_group] is not before.leaves[changed_group]
+    # Слияние в том же порядке групп - как у индекса, построенного с нуля
+    scratch = percentile_index(make_engine(competencies_path, f'{dataset}-scratch'))
+    assert_same_index(after, scratch)
+    student = frame.at[changed, 'Код_Студента']
+    assert after.student(changed_group, student) == scratch.student(changed_group, student)
+    assert after.student(changed_group, student) != before.student(changed_group, student)
@@ -0,0 +1,42 @@
+"""Журнал прогрева: ключи вызовов и общий файл нескольких worker'ов"""
+from prewarm import AccessLog
+
+
+def counts(access_log):
+    return {(entry['callback'], tuple(entry['args'])): entry['count'] for entry in access_log.top()}
+
+
+def test_positional_arguments_keep_their_order(tmp_path):
+    access_log = AccessLog(str(tmp_path / 'prewarm.json'), save_interval=3600)
+    calculate = access_log(lambda years, groups: None)
+    calculate(['2023-2024'], ['404а'])
+    calculate(['404а'], ['2023-2024'])
+    # Порядок значений внутри аргумента не важен
+    calculate(['404а'], ['2024-2025', '2023-2024'])
+    calculate(['404а'], ['2023-2024', '2024-2025'])
+    assert sorted(entry['count'] for entry in access_log.top()) == [1, 1, 2]
+
+
+def test_workers_add_up_counts(tmp_path):
+    path = str(tmp_path / 'prewarm.json')
+    first, second = AccessLog(path, save_interval=3600), AccessLog(path, save_interval=3600)
+
+    def calculate_ratings(group, semester):
+        pass
+
+    first_ratings, second_ratings = first(calculate_ratings), second(calculate_ratings)
+    for _ in range(3):
+        first_ratings('404а', 1)
+    second_ratings('404а', 1)
+    second_ratings('2.210-1', 2)
+    first.save()
+    second.save()
+    # Второй worker сохранялся последним, но счетчики первого не потерялись
+    expected = {('calculate_ratings', ('404а', 1)): 4, ('calculate_ratings', ('2.210-1', 2)): 1}
+    assert counts(AccessLog(path)) == expected
+    assert counts(second) == expected
+    # Повторное сохранение без новых вызовов ничего не удваивает
+    first_ratings('404а', 1)
+    first.save()
+    second.save()
+    assert counts(AccessLog(path))[('calculate_ratings', ('404а', 1))] == 5
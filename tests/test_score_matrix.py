@@ -0,0 +1,123 @@
+"""Накопленные суммы группы после перезагрузки совпадают с построенными заново"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_engine import ATTENDANCE_FILE, COMPETENCIES_FILE, PandasEngine, read_competencies
+from ingest import write_canonical
+from score_matrix import GroupTrajectory, group_trajectory, trajectory_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUP = '404а'
+NEW_STUDENT = 999999
+
+
+def make_engine(competencies_path, dataset):
+    engine = PandasEngine(competencies_path=str(competencies_path),
+                          attendance_path=os.path.join(ROOT, ATTENDANCE_FILE), prepared_dir=None)
+    engine.dataset = dataset
+    return engine
+
+
+def by_competency(trajectory):
+    """Префиксные суммы по коду компетенции: порядок столбцов у пересчитанной группы может отличаться"""
+    present = trajectory.prefix[-1, 0].any(axis=0)
+    return {word: (trajectory.competency_types[i], trajectory.prefix[:, :, :, i])
+            for i, word in enumerate(trajectory.competencies) if present[i]}
+
+
+def assert_same_trajectory(actual, expected):
+    assert list(actual.students) == list(expected.students)
+    assert actual.semesters == expected.semesters
+    assert actual.fingerprints == expected.fingerprints
+    actual_sums, expected_sums = by_competency(actual), by_competency(expected)
+    assert actual_sums.keys() == expected_sums.keys()
+    for word, (competency_type, prefix) in expected_sums.items():
+        assert actual_sums[word][0] == competency_type or pd.isna([actual_sums[word][0], competency_type]).all()
+        np.testing.assert_array_equal(actual_sums[word][1], prefix)
+    for semesters in [None, [1], [2, 3], [1, 4, 8], expected.semesters[2:]]:
+        actual_matrix, expected_matrix = actual.matrix(semesters), expected.matrix(semesters)
+        assert list(actual_matrix.competencies) == list(expected_matrix.competencies)
+        # Тип неизученной компетенции - NaN
+        assert pd.Index(actual_matrix.competency_types).equals(pd.Index(expected_matrix.competency_types))
+        np.testing.assert_array_equal(actual_matrix.real, expected_matrix.real)
+        np.testing.assert_array_equal(actual_matrix.minimum, expected_matrix.minimum)
+        np.testing.assert_array_equal(actual_matrix.studied, expected_matrix.studied)
+
+
+@pytest.fixture
+def competencies_path(tmp_path):
+    path = tmp_path / COMPETENCIES_FILE
+    write_canonical(read_competencies(os.path.join(ROOT, COMPETENCIES_FILE)), str(path))
+    return path
+
+
+def reload_with(engine, competencies_path, frame):
+    write_canonical(frame, str(competencies_path))
+    stat = os.stat(competencies_path)
+    os.utime(competencies_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert engine.reload()
+
+
+def assert_same_as_scratch(engine, competencies_path, trajectory):
+    trajectory_cache.clear()
+    assert_same_trajectory(trajectory, group_trajectory(engine, GROUP))
+    assert_same_trajectory(trajectory, group_trajectory(make_engine(competencies_path, 'test-scratch'), GROUP))
+
+
+def test_incremental_trajectory_after_reload(competencies_path):
+    engine = make_engine(competencies_path, 'test-incremental')
+    before = group_trajectory(engine, GROUP)
+    original = read_competencies(str(competencies_path))
+    in_group = original['Название'] == GROUP
+
+    # Перезагрузка: в 5-м семестре пришел новый студент (его строки - первые в выгрузке),
+    # изменилась оценка в 3-м семестре
+    frame = original.copy()
+    changed = frame.index[in_group & (frame['Семестр'] == 3) & (frame['Оценка'] == 'Отл')][0]
+    frame.loc[changed, 'Оценка'] = 'Хор'
+    newcomer = frame[in_group & (frame['Код_Студента'] == before.students[1]) & (frame['Семестр'] >= 5)].copy()
+    newcomer['Код_Студента'] = NEW_STUDENT
+    reload_with(engine, competencies_path, pd.concat([newcomer, frame], ignore_index=True))
+
+    incremental = group_trajectory(engine, GROUP)
+    # Первые два семестра не изменились - их слои взяты из прежней версии
+    assert incremental.fingerprints[:2] == before.fingerprints[:2]
+    assert incremental.fingerprints[2] != before.fingerprints[2]
+    assert incremental.students[0] == NEW_STUDENT
+    assert list(incremental.students[1:]) == list(before.students)
+    assert_same_as_scratch(engine, competencies_path, incremental)
+
+    # Новый студент отчислен, отличник из 3-го семестра пересдал: ось студентов становится прежней
+    frame.loc[changed, 'Оценка'] = 'Отл'
+    after_newcomer = group_trajectory(engine, GROUP)
+    reload_with(engine, competencies_path, frame)
+    incremental = group_trajectory(engine, GROUP)
+    assert incremental.fingerprints[:2] == after_newcomer.fingerprints[:2]
+    assert incremental.fingerprints == before.fingerprints
+    assert list(incremental.students) == list(before.students)
+    assert_same_as_scratch(engine, competencies_path, incremental)
+
+
+def test_append_takes_type_from_studied_rows():
+    def semester_rows(grades, types):
+        return pd.DataFrame({
+            'Код_Студента': [1] * len(grades),
+            'last_word': ['УК-1'] * len(grades),
+            'Тип_Компетенции': types,
+            'Оценка': ['Не изуч.' if grade == 6 else 'Зачет' for grade in grades],
+            'Числовая_оценка': grades,
+            'ДиффенцированныйЗачет': [0] * len(grades),
+        })
+
+    trajectory = GroupTrajectory.empty([1]).append(1, semester_rows([6], ['Первая']))
+    # Пока компетенция не изучена, ее тип неизвестен
+    assert pd.isna(trajectory.competency_types[0])
+    trajectory = trajectory.append(2, semester_rows([6, 7], ['Первая', 'Изученная']))
+    assert list(trajectory.competency_types) == ['Изученная']
+    assert list(trajectory.matrix().competency_types) == ['Изученная']
+    # Тип уже изученной компетенции не меняется
+    trajectory = trajectory.append(3, semester_rows([7], ['Другая']))
+    assert list(trajectory.competency_types) == ['Изученная']
@@ -0,0 +1,25 @@
+"""Объединение одновременных вызовов coalesce"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import coalesce
+
+
+def test_coalesce_separates_scopes():
+    # Оба вызова ждут друг друга внутри функции - объединенный вызов не дошел бы до барьера
+    barrier = threading.Barrier(2, timeout=5)
+    local = threading.local()
+
+    @coalesce(scope=lambda: local.dataset)
+    def compute(value):
+        barrier.wait()
+        return local.dataset, value
+
+    def call(dataset):
+        local.dataset = dataset
+        return compute(1)
+
+    with ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(call, ['facA', 'facB']))
+    assert results == [('facA', 1), ('facB', 1)]
+    assert compute.flight.shared == 0